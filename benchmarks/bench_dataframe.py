@@ -0,0 +1,62 @@
+"""DataFrame construction: ``Cursor.fetch_dataframe()`` against ``pd.DataFrame(cursor.fetchall())``.
+
+Fetches the same ``--rows`` row result set from a local benchmark server both ways and
+reports wall time and rows/sec.
+
+    python benchmarks/bench_dataframe.py [--rows 200000] [--repeat 3]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import pandas
+
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+def via_fetchall(cursor):
+    rows = cursor.fetchall()
+    return pandas.DataFrame(rows, columns=[c[0] for c in cursor.description])
+
+
+def via_fetch_dataframe(cursor):
+    return cursor.fetch_dataframe()
+
+
+def measure(port, build, repeat):
+    connection = snappydata.connect('127.0.0.1', port)
+    best = None
+    for _ in range(repeat):
+        cursor = connection.cursor()
+        start = time.time()
+        cursor.execute('SELECT * FROM bench')
+        frame = build(cursor)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    connection.close()
+    return best, len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with testing.StubServer(rows=args.rows, process=True) as server:
+        for label, build in (('pd.DataFrame(fetchall())', via_fetchall),
+                             ('fetch_dataframe()', via_fetch_dataframe)):
+            elapsed, rows = measure(server.port, build, args.repeat)
+            print('{:<26} {:>8.3f} s {:>12,.0f} rows/s'.format(label, elapsed, rows / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Row conversion throughput of the compiled row decoder against the old per cell if/elif chain.
+
+Converts synthetic RowSets totalling ``--rows`` rows (1M by default), for a narrow scalar
+schema and one with ARRAY and STRUCT columns. No server is involved.
+
+    python benchmarks/bench_decode.py [--rows 1000000] [--batch 1024]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SDTCLIService import ttypes
+from pysnappydata import converters
+
+T = ttypes.SnappyType
+
+
+def scalar_batch(size):
+    metadata = [
+        ttypes.ColumnDescriptor(type=T.INTEGER, precision=10, name='ID'),
+        ttypes.ColumnDescriptor(type=T.BIGINT, precision=19, name='TS'),
+        ttypes.ColumnDescriptor(type=T.DOUBLE, precision=15, name='PRICE'),
+        ttypes.ColumnDescriptor(type=T.VARCHAR, precision=32, name='NAME'),
+        ttypes.ColumnDescriptor(type=T.BOOLEAN, precision=1, name='FLAG'),
+    ]
+    rows = [ttypes.Row(values=[
+        ttypes.ColumnValue(i32_val=i),
+        ttypes.ColumnValue(i64_val=i * 1000),
+        ttypes.ColumnValue(double_val=i * 0.5),
+        ttypes.ColumnValue(string_val='name-{}'.format(i)) if i % 10 else ttypes.ColumnValue(null_val=True),
+        ttypes.ColumnValue(bool_val=bool(i & 1)),
+    ]) for i in range(size)]
+    return metadata, rows
+
+
+def nested_batch(size):
+    metadata = [
+        ttypes.ColumnDescriptor(type=T.INTEGER, precision=10, name='ID'),
+        ttypes.ColumnDescriptor(type=T.ARRAY, precision=0, name='TAGS', elementTypes=[T.VARCHAR]),
+        ttypes.ColumnDescriptor(type=T.STRUCT, precision=0, name='POINT', elementTypes=[T.DOUBLE, T.DOUBLE]),
+    ]
+    rows = [ttypes.Row(values=[
+        ttypes.ColumnValue(i32_val=i),
+        ttypes.ColumnValue(array_val=[ttypes.ColumnValue(string_val='t{}'.format(j)) for j in range(3)]),
+        ttypes.ColumnValue(struct_val=[ttypes.ColumnValue(double_val=i * 1.0), ttypes.ColumnValue(double_val=-1.0)]),
+    ]) for i in range(size)]
+    return metadata, rows
+
+
+class _Element(object):
+    def __init__(self, type_):
+        self.type = type_
+        self.elementTypes = None
+
+
+def legacy_build_item(column, descriptor):
+    """The per cell dispatch Cursor._build_item used before decoders were compiled"""
+    if column.null_val is not None and column.null_val:
+        return None
+    if descriptor.type == T.BOOLEAN:
+        return column.bool_val
+    elif descriptor.type == T.TINYINT:
+        return column.byte_val
+    elif descriptor.type == T.SMALLINT:
+        return column.i16_val
+    elif descriptor.type == T.INTEGER:
+        return column.i32_val
+    elif descriptor.type == T.BIGINT:
+        return column.i64_val
+    elif descriptor.type == T.FLOAT or descriptor.type == T.DOUBLE:
+        return column.double_val
+    elif descriptor.type == T.CHAR or descriptor.type == T.VARCHAR or descriptor.type == T.LONGVARCHAR:
+        return column.string_val
+    elif descriptor.type == T.DECIMAL:
+        return column.decimal_val
+    elif descriptor.type == T.DATE:
+        return column.date_val
+    elif descriptor.type == T.TIME:
+        return column.time_val
+    elif descriptor.type == T.TIMESTAMP:
+        return column.timestamp_val
+    elif descriptor.type == T.BINARY or descriptor.type == T.VARBINARY or descriptor.type == T.LONGVARBINARY:
+        return column.binary_val
+    elif descriptor.type == T.BLOB:
+        return column.blob_val.chunk
+    elif descriptor.type == T.CLOB or descriptor.type == T.JSON or descriptor.type == T.SQLXML:
+        return column.clob_val.chunk
+    elif descriptor.type == T.ARRAY:
+        return [legacy_build_item(e, _Element(descriptor.elementTypes[0])) for e in column.array_val]
+    elif descriptor.type == T.STRUCT:
+        return [legacy_build_item(f, _Element(t)) for f, t in zip(column.struct_val, descriptor.elementTypes)]
+    return column
+
+
+def legacy_decoder(metadata):
+    return lambda rows: [[legacy_build_item(c, d) for c, d in zip(row.values, metadata)] for row in rows]
+
+
+def compiled_decoder(metadata):
+    # Lists, as the if/elif chain built them
+    decode = converters.compile_row_decoder(metadata, row_type=list)
+    return lambda rows: list(map(decode, rows))
+
+
+def measure(make_decoder, metadata, rows, total):
+    """Decode ``total`` rows as one result set streamed in batches of ``rows``"""
+    batches = max(1, total // len(rows))
+    start = time.time()
+    decode = make_decoder(metadata)
+    for _ in range(batches):
+        decode(rows)
+    return batches * len(rows) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=1024)
+    args = parser.parse_args()
+
+    for label, make in (('scalar x5', scalar_batch), ('nested', nested_batch)):
+        metadata, rows = make(args.batch)
+        assert legacy_decoder(metadata)(rows) == compiled_decoder(metadata)(rows)
+        before = measure(legacy_decoder, metadata, rows, args.rows)
+        after = measure(compiled_decoder, metadata, rows, args.rows)
+        print('{:<10} if/elif {:>12,.0f} rows/s   compiled {:>12,.0f} rows/s   {:.1f}x'.format(
+            label, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Bulk insert: batched ``Cursor.executemany()`` against one escaped ``execute()`` per row.
+
+Inserts ``--rows`` parameter sets (1k, 10k and 100k by default) into a local benchmark server,
+once with the statement cache disabled, which sends every row as its own SQL text, and once
+prepared and sent in ``executePreparedBatch`` chunks of ``--chunksize`` rows.
+
+    python benchmarks/bench_executemany.py [--rows 1000 10000 100000] [--chunksize 1000]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+INSERT = 'INSERT INTO bench VALUES (%s, %s, %s, %s, %s)'
+
+
+def parameters(rows):
+    return [(i, i * 1000, i * 0.5, 'name-{}'.format(i), 'north') for i in range(rows)]
+
+
+def measure(port, rows, statement_cache_size, chunksize):
+    connection = snappydata.connect('127.0.0.1', port, statement_cache_size=statement_cache_size)
+    cursor = connection.cursor(executemany_chunksize=chunksize)
+    params = parameters(rows)
+    start = time.time()
+    cursor.executemany(INSERT, params)
+    elapsed = time.time() - start
+    if statement_cache_size:
+        assert cursor.rowcount == rows, cursor.rowcount
+    connection.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--chunksize', type=int, default=1000)
+    args = parser.parse_args()
+
+    with testing.StubServer(rows=0, process=True) as server:
+        for rows in args.rows:
+            looped = measure(server.port, rows, 0, args.chunksize)
+            batched = measure(server.port, rows, 32, args.chunksize)
+            print('{:>7,} rows  per row {:>8.3f} s {:>10,.0f} rows/s   batched {:>8.3f} s {:>10,.0f} rows/s   '
+                  '{:.1f}x'.format(rows, looped, rows / looped, batched, rows / batched, looped / batched))
+
+
+if __name__ == '__main__':
+    main()
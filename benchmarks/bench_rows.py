@@ -0,0 +1,69 @@
+"""Peak memory and time of ``fetchall()`` on a large result for each cursor ``row_type``.
+
+Fetches the same ``--rows`` row result set (1M by default) from a local benchmark server
+with ``row_type=list`` (the pre-tuple row type), ``tuple`` (the default) and
+:py:class:`~pysnappydata.snappydata.Row`. Every row type runs in a fresh interpreter so that
+the growth of its peak RSS is not hidden by memory an earlier run freed. Unix only.
+
+    python benchmarks/bench_rows.py [--rows 1000000]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+ROW_TYPES = {'list': list, 'tuple': tuple, 'Row': snappydata.Row}
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def child(port, row_type):
+    """Fetch the whole result with ``row_type`` rows; print peak RSS growth and elapsed time"""
+    connection = snappydata.connect('127.0.0.1', port)
+    cursor = connection.cursor(row_type=ROW_TYPES[row_type])
+    cursor.execute('SELECT * FROM bench')
+    before = peak_rss()
+    start = time.time()
+    rows = cursor.fetchall()
+    elapsed = time.time() - start
+    print(peak_rss() - before, elapsed, len(rows))
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--child', nargs=2, metavar=('PORT', 'ROW_TYPE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(int(args.child[0]), args.child[1])
+        return
+
+    with testing.StubServer(rows=args.rows, process=True) as server:
+        for row_type in ('list', 'tuple', 'Row'):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                              '--child', str(server.port), row_type])
+            growth, elapsed, rows = output.split()
+            print('{:<6} peak RSS +{:>8.1f} MiB {:>8.3f} s {:>12,.0f} rows/s'.format(
+                row_type, int(growth) / 1024.0 / 1024, float(elapsed), int(rows) / float(elapsed)))
+
+
+if __name__ == '__main__':
+    main()
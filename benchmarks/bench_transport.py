@@ -0,0 +1,113 @@
+"""Rows/sec of ``scrollCursor`` batches decoded over each client transport stack.
+
+A tiny SnappyDataService server runs in a child process and answers every ``scrollCursor``
+call with the same pre-built RowSet, so the numbers are dominated by client side receive and
+decode cost. ``socket`` with the plain compact protocol is the pre-transport-option behaviour.
+
+    python benchmarks/bench_transport.py [--rows 1024] [--calls 200]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import thrift.protocol.TCompactProtocol
+import thrift.server.TServer
+import thrift.transport.TSocket
+import thrift.transport.TTransport
+
+from SDTCLIService import SnappyDataService
+from SDTCLIService import ttypes
+from pysnappydata import transport as _transport
+
+
+def make_rowset(rows):
+    metadata = [
+        ttypes.ColumnDescriptor(type=ttypes.SnappyType.INTEGER, precision=10, name='ID'),
+        ttypes.ColumnDescriptor(type=ttypes.SnappyType.BIGINT, precision=19, name='TS'),
+        ttypes.ColumnDescriptor(type=ttypes.SnappyType.DOUBLE, precision=15, name='PRICE'),
+        ttypes.ColumnDescriptor(type=ttypes.SnappyType.VARCHAR, precision=32, name='NAME'),
+    ]
+    data = [ttypes.Row(values=[
+        ttypes.ColumnValue(i32_val=i),
+        ttypes.ColumnValue(i64_val=i * 1000),
+        ttypes.ColumnValue(double_val=i * 0.5),
+        ttypes.ColumnValue(string_val='name-{}'.format(i)),
+    ]) for i in range(rows)]
+    return ttypes.RowSet(rows=data, flags=0, cursorId=1, statementId=1, connId=1, metadata=metadata)
+
+
+class _Handler(object):
+    def __init__(self, rowset):
+        self._rowset = rowset
+
+    def scrollCursor(self, cursorId, offset, offsetIsAbsolute, fetchReverse, fetchSize, token):
+        return self._rowset
+
+
+def _serve(port, kind, rows, ready):
+    if kind == _transport.TRANSPORT_FRAMED:
+        tfactory = thrift.transport.TTransport.TFramedTransportFactory()
+    else:
+        tfactory = thrift.transport.TTransport.TBufferedTransportFactory()
+    server = thrift.server.TServer.TSimpleServer(
+        SnappyDataService.Processor(_Handler(make_rowset(rows))),
+        thrift.transport.TSocket.TServerSocket('127.0.0.1', port),
+        tfactory,
+        thrift.protocol.TCompactProtocol.TCompactProtocolAcceleratedFactory())
+    ready.set()
+    server.serve()
+
+
+def run(kind, accelerated, rows, calls, port):
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve, args=(port, kind, rows, ready))
+    server.daemon = True
+    server.start()
+    ready.wait()
+    time.sleep(0.2)
+    try:
+        trans = _transport.open_transport('127.0.0.1', port, kind)
+        if accelerated:
+            protocol = _transport.make_protocol(trans)
+        else:
+            protocol = thrift.protocol.TCompactProtocol.TCompactProtocol(trans)
+        client = SnappyDataService.Client(protocol)
+        client.scrollCursor(1, 0, False, False, rows, None)
+        start = time.time()
+        for _ in range(calls):
+            client.scrollCursor(1, 0, False, False, rows, None)
+        elapsed = time.time() - start
+        trans.close()
+    finally:
+        server.terminate()
+        server.join()
+    return rows * calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1024)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--port', type=int, default=15281)
+    args = parser.parse_args()
+
+    cases = [
+        ('socket, plain protocol (before)', _transport.TRANSPORT_SOCKET, False),
+        ('buffered, accelerated', _transport.TRANSPORT_BUFFERED, True),
+        ('framed, accelerated', _transport.TRANSPORT_FRAMED, True),
+    ]
+    for i, (label, kind, accelerated) in enumerate(cases):
+        rate = run(kind, accelerated, args.rows, args.calls, args.port + i)
+        print('{:<34} {:>12,.0f} rows/s'.format(label, rate))
+
+
+if __name__ == '__main__':
+    main()
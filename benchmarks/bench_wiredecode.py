@@ -0,0 +1,102 @@
+"""Rows/sec of the ``values`` decode mode against the generated ``ttypes`` objects.
+
+Decodes compact-protocol encoded RowSets totalling ``--rows`` rows, for a narrow and a wide
+(``--columns`` columns) scalar schema, both to the RowSet alone and on to Python rows. Then
+fetches ``--rows`` rows from a local benchmark server with ``fetchall()`` and
+``fetch_dataframe()`` over connections using either mode.
+
+    python benchmarks/bench_wiredecode.py [--rows 1000000] [--batch 1024] [--columns 40]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SDTCLIService import ttypes
+from pysnappydata import converters
+from pysnappydata import resultcache
+from pysnappydata import snappydata
+from pysnappydata import testing
+from pysnappydata import wiredecode
+
+T = ttypes.SnappyType
+
+_WIDE_TYPES = [
+    (T.INTEGER, lambda i: ttypes.ColumnValue(i32_val=i)),
+    (T.BIGINT, lambda i: ttypes.ColumnValue(i64_val=i * 1000)),
+    (T.DOUBLE, lambda i: ttypes.ColumnValue(double_val=i * 0.5)),
+    (T.VARCHAR, lambda i: ttypes.ColumnValue(string_val='v{}'.format(i % 100))),
+]
+
+
+def narrow_batch(size):
+    handler = testing.StubHandler(rows=size, null_ratio=0.1)
+    return handler.metadata, handler._rows(size)
+
+
+def wide_batch(size, columns):
+    metadata = [ttypes.ColumnDescriptor(type=_WIDE_TYPES[c % 4][0], precision=10, name='C{}'.format(c))
+                for c in range(columns)]
+    rows = [ttypes.Row(values=[_WIDE_TYPES[c % 4][1](i) if (i + c) % 11 else ttypes.ColumnValue(null_val=True)
+                               for c in range(columns)])
+            for i in range(size)]
+    return metadata, rows
+
+
+def measure(data, metadata, total, decode, to_rows):
+    """Decode the encoded batch ``data`` until ``total`` rows are done; return rows/sec"""
+    batches = max(1, total // len(data[1]))
+    decoder = converters.compile_row_decoder(metadata, values=decode == wiredecode.VALUES)
+    start = time.time()
+    for _ in range(batches):
+        rowset = resultcache.decode_batch(data[0], decode)
+        if to_rows:
+            list(map(decoder, rowset.rows))
+    return batches * len(data[1]) / (time.time() - start)
+
+
+def measure_fetch(port, decode, fetch):
+    connection = snappydata.connect('127.0.0.1', port, decode=decode)
+    cursor = connection.cursor()
+    start = time.time()
+    cursor.execute('SELECT * FROM bench')
+    rows = len(fetch(cursor))
+    elapsed = time.time() - start
+    connection.close()
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=1024)
+    parser.add_argument('--columns', type=int, default=40)
+    args = parser.parse_args()
+
+    schemas = (('narrow x5', narrow_batch(args.batch)),
+               ('wide x{}'.format(args.columns), wide_batch(args.batch, args.columns)))
+    for label, (metadata, rows) in schemas:
+        data = (resultcache.encode_batch(ttypes.RowSet(rows=rows, flags=0)), rows)
+        for to_rows, what in ((False, 'RowSet'), (True, 'rows')):
+            before = measure(data, metadata, args.rows, wiredecode.OBJECTS, to_rows)
+            after = measure(data, metadata, args.rows, wiredecode.VALUES, to_rows)
+            print('{:<10} {:<7} objects {:>12,.0f} rows/s   values {:>12,.0f} rows/s   {:.1f}x'.format(
+                label, what, before, after, after / before))
+
+    with testing.StubServer(rows=args.rows, process=True) as server:
+        for label, fetch in (('fetchall()', lambda cursor: cursor.fetchall()),
+                             ('fetch_dataframe()', lambda cursor: cursor.fetch_dataframe())):
+            before = measure_fetch(server.port, wiredecode.OBJECTS, fetch)
+            after = measure_fetch(server.port, wiredecode.VALUES, fetch)
+            print('{:<18} objects {:>12,.0f} rows/s   values {:>12,.0f} rows/s   {:.1f}x'.format(
+                label, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""Benchmark suite of the driver paths against local stub servers, with results saved as JSON.
+
+Times connection setup, directly and through a locator, single row execute latency,
+fetchall/fetchmany/iteration throughput over narrow and wide tables, decoding of ARRAY and
+STRUCT columns, executemany and SQLAlchemy reflection. The servers are
+:py:class:`pysnappydata.testing.StubServer` instances in child processes. Every benchmark is
+called once to warm up, then ``--repeat`` times; the best and median times are reported, with
+rows/s where rows are fetched or sent.
+
+``--output`` saves the results as JSON. ``--baseline`` compares the best times with those of a
+saved run and exits with status 1 if any benchmark is more than ``--threshold`` slower.
+
+    python benchmarks/suite.py [--filter fetch] [--rows 100000] [--repeat 5]
+                               [--output run.json] [--baseline base.json] [--threshold 0.1]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from SDTCLIService import ttypes
+from pysnappydata import locator
+from pysnappydata import snappydata
+from pysnappydata import testing
+from pysnappydata import wiredecode
+
+T = ttypes.SnappyType
+
+HOST = '127.0.0.1'
+
+WIDE_COLUMNS = [(T.INTEGER, T.BIGINT, T.DOUBLE, T.VARCHAR)[c % 4] for c in range(40)]
+
+# MAP columns are left out: the generated ColumnValue map keys cannot be hashed on Python 3
+NESTED_COLUMNS = [
+    ttypes.ColumnDescriptor(type=T.INTEGER, name='ID'),
+    ttypes.ColumnDescriptor(type=T.ARRAY, name='TAGS', elementTypes=[T.VARCHAR]),
+    ttypes.ColumnDescriptor(type=T.ARRAY, name='SCORES', elementTypes=[T.DOUBLE]),
+    ttypes.ColumnDescriptor(type=T.STRUCT, name='ADDRESS', elementTypes=[T.VARCHAR, T.INTEGER, T.BIGINT]),
+]
+
+
+def server_options(args):
+    """StubServer options of each server the benchmarks use, by name"""
+    return {
+        'single': dict(rows=1),
+        'narrow': dict(rows=args.rows, null_ratio=0.1),
+        'wide': dict(rows=args.rows // 10, columns=WIDE_COLUMNS, null_ratio=0.1),
+        'nested': dict(rows=args.rows // 10, columns=NESTED_COLUMNS),
+        # Rows of DESCRIBE: column name, type and comment
+        'describe': dict(rows=20, columns=(T.VARCHAR, T.CHAR, T.VARCHAR)),
+    }
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, server):
+    """Register a benchmark run against the stub server named ``server``.
+
+    The function is a generator called with the running server and the command line arguments.
+    It yields the callable to time and the rows it fetches or sends per call, ``None`` for
+    latency benchmarks, and cleans up when closed.
+    """
+    def register(func):
+        BENCHMARKS.append((name, server, func))
+        return func
+    return register
+
+
+#
+# Connections
+#
+
+@benchmark('connect.direct', 'single')
+def connect_direct(server, args):
+    yield lambda: snappydata.connect(HOST, server.port).close(), None
+
+
+@benchmark('connect.locator', 'single')
+def connect_locator(server, args):
+    # The servers behind the locator are looked up once per process, on the warm-up call
+    yield lambda: snappydata.connect(HOST, server.port, locator=True).close(), None
+
+
+@benchmark('locator.lookup', 'single')
+def locator_lookup(server, args):
+    yield lambda: locator.fetch_servers(HOST, server.port), None
+
+
+#
+# Statements
+#
+
+def _connection(server, **kwargs):
+    return snappydata.connect(HOST, server.port, **kwargs)
+
+
+@benchmark('execute.single_row', 'single')
+def execute_single_row(server, args):
+    connection = _connection(server)
+    cursor = connection.cursor()
+
+    def run():
+        cursor.execute('SELECT * FROM bench WHERE ID = 1')
+        cursor.fetchall()
+    try:
+        yield run, None
+    finally:
+        connection.close()
+
+
+def _execute_params(server, **kwargs):
+    connection = _connection(server, **kwargs)
+    cursor = connection.cursor()
+
+    def run():
+        cursor.execute('SELECT * FROM bench WHERE ID = %(id)s AND TS > %(ts)s', {'id': 1, 'ts': 1000})
+        cursor.fetchall()
+    try:
+        yield run, None
+    finally:
+        connection.close()
+
+
+@benchmark('execute.single_row_prepared', 'single')
+def execute_single_row_prepared(server, args):
+    return _execute_params(server)
+
+
+@benchmark('execute.single_row_escaped', 'single')
+def execute_single_row_escaped(server, args):
+    # Without a statement cache the parameters are escaped into the SQL text
+    return _execute_params(server, statement_cache_size=0)
+
+
+def _fetch(server, rows, fetch, **kwargs):
+    connection = _connection(server, **kwargs)
+    cursor = connection.cursor()
+
+    def run():
+        cursor.execute('SELECT * FROM bench')
+        fetch(cursor)
+    try:
+        yield run, rows
+    finally:
+        connection.close()
+
+
+def _fetchmany(cursor):
+    while cursor.fetchmany(1000):
+        pass
+
+
+def _iterate(cursor):
+    for _ in cursor:
+        pass
+
+
+for _table in ('narrow', 'wide'):
+    for _label, _how in (('fetchall', lambda cursor: cursor.fetchall()), ('fetchmany', _fetchmany),
+                         ('iterate', _iterate)):
+        benchmark('fetch.{}.{}'.format(_table, _label), _table)(
+            lambda server, args, how=_how: _fetch(server, server.handler.rows, how))
+
+for _mode in wiredecode.MODES:
+    benchmark('decode.nested.{}'.format(_mode), 'nested')(
+        lambda server, args, mode=_mode: _fetch(server, server.handler.rows, lambda cursor: cursor.fetchall(),
+                                                decode=mode))
+
+
+@benchmark('executemany', 'narrow')
+def executemany(server, args):
+    connection = _connection(server)
+    cursor = connection.cursor()
+    params = [(i, i * 1000, i * 0.5, 'name-{}'.format(i), 'north') for i in range(args.rows // 10)]
+    try:
+        yield lambda: cursor.executemany('INSERT INTO bench VALUES (%s, %s, %s, %s, %s)', params), len(params)
+    finally:
+        connection.close()
+
+
+#
+# SQLAlchemy
+#
+
+@benchmark('sqlalchemy.reflect', 'describe')
+def sqlalchemy_reflect(server, args):
+    import sqlalchemy
+    from sqlalchemy.dialects import registry
+    registry.register('snappydata', 'pysnappydata.sqlalchemy_snappydata', 'SnappyDataDialect')
+    engine = sqlalchemy.create_engine('snappydata://{}:{}'.format(HOST, server.port))
+
+    def run():
+        metadata = sqlalchemy.MetaData()
+        sqlalchemy.Table('BENCH', metadata, autoload=True, autoload_with=engine)
+        sqlalchemy.inspect(engine).get_table_names()
+    try:
+        yield run, None
+    finally:
+        engine.dispose()
+
+
+#
+# Runner
+#
+
+def measure(run, repeat):
+    """Call ``run`` once to warm up, then ``repeat`` times; return the sorted elapsed seconds"""
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        run()
+        times.append(time.time() - start)
+    return sorted(times)
+
+
+def run_benchmark(func, server, args):
+    """Result dict of one benchmark"""
+    steps = func(server, args)
+    run, rows = next(steps)
+    try:
+        times = measure(run, args.repeat)
+    finally:
+        steps.close()
+    result = {'best': times[0], 'median': times[len(times) // 2], 'repeat': len(times)}
+    if rows:
+        result['rows'] = rows
+        result['rows_per_sec'] = rows / times[0]
+    return result
+
+
+def format_result(name, result):
+    line = '{:<30} best {:>10.3f} ms   median {:>10.3f} ms'.format(
+        name, result['best'] * 1000, result['median'] * 1000)
+    if 'rows_per_sec' in result:
+        line += '   {:>12,.0f} rows/s'.format(result['rows_per_sec'])
+    return line
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every benchmark against ``baseline``; return the names that regressed"""
+    regressed = []
+    for name, result in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = result['best'] / before['best']
+        slower = ratio > 1 + threshold
+        if slower:
+            regressed.append(name)
+        print('{:<30} {:>10.3f} ms -> {:>10.3f} ms   {:+6.1%}{}'.format(
+            name, before['best'] * 1000, result['best'] * 1000, ratio - 1, '   SLOWER' if slower else ''))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--filter', action='append', default=[],
+                        help='only run benchmarks whose name contains this; may be repeated')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results saved in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown against the baseline reported as a regression (default 0.1)')
+    args = parser.parse_args()
+
+    selected = [(name, server, func) for name, server, func in BENCHMARKS
+                if not args.filter or any(f in name for f in args.filter)]
+    options = server_options(args)
+    servers = {}
+    results = {}
+    try:
+        for name, server, func in selected:
+            if server not in servers:
+                servers[server] = testing.StubServer(process=True, **options[server]).start()
+            try:
+                results[name] = run_benchmark(func, servers[server], args)
+            except ImportError as e:
+                print('{:<30} skipped: {}'.format(name, e))
+                continue
+            print(format_result(name, results[name]))
+    finally:
+        for server in servers.values():
+            server.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created': datetime.datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'rows': args.rows,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print('\nagainst {} ({})'.format(args.baseline, baseline.get('created')))
+        if compare(results, baseline['results'], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,679 @@
+"""asyncio interface to SnappyData (Python 3.5+)
+
+Requests are encoded and responses decoded by the generated ``SnappyDataService.Client``
+``send_*``/``recv_*`` methods over in-memory buffers, while the bytes travel over an asyncio
+stream, so waiting for the server never blocks the event loop.
+
+.. code-block:: python
+
+    from pysnappydata import aio
+
+    async def main():
+        connection = await aio.connect('localhost')
+        cursor = connection.cursor()
+        await cursor.execute('SELECT * FROM test WHERE id > %(id)s', {'id': 10})
+        async for row in cursor:
+            print(row)
+        await connection.close()
+
+Each connection runs one request at a time; use several connections, e.g. from an
+:py:class:`AsyncConnectionPool`, for concurrent queries.
+"""
+
+import asyncio
+import collections
+import io
+import logging
+import queue
+import struct
+import threading
+import time
+
+import thrift.transport.TTransport
+from thrift.Thrift import TApplicationException
+
+from SDTCLIService import LocatorService
+from SDTCLIService import SnappyDataService
+from SDTCLIService import constants
+from SDTCLIService import ttypes
+from pysnappydata import converters
+from pysnappydata import exc
+from pysnappydata import snappydata
+from pysnappydata import transport as _transport
+
+_logger = logging.getLogger(__name__)
+
+_FRAME_HEADER = struct.Struct('!i')
+_READ_SIZE = 4 * 1024 * 1024
+_MAX_SEQID = 0x7fffffff
+
+
+class _ReplyStream(thrift.transport.TTransport.TTransportBase,
+                   thrift.transport.TTransport.CReadableTransport):
+    """Readable transport over a reply that is still arriving.
+
+    The event loop feeds it the bytes it reads while a worker thread decodes; reads past the
+    bytes fed so far block until more arrive, and feeding ``b''`` ends the stream.
+    """
+
+    def __init__(self, data):
+        self._chunks = queue.Queue()
+        self._buffer = io.BytesIO(data)
+
+    def feed(self, data):
+        self._chunks.put(data)
+
+    def _next(self):
+        data = self._chunks.get()
+        if not data:
+            raise EOFError("Reply interrupted")
+        return data
+
+    def read(self, sz):
+        data = self._buffer.read(sz)
+        if not data:
+            self._buffer = io.BytesIO(self._next())
+            data = self._buffer.read(sz)
+        return data
+
+    @property
+    def cstringio_buf(self):
+        return self._buffer
+
+    def cstringio_refill(self, partialread, reqlen):
+        data = partialread
+        while len(data) < reqlen:
+            data += self._next()
+        self._buffer = io.BytesIO(data)
+        return self._buffer
+
+
+def _retrieve(future):
+    """Done callback marking the error of a future nobody waits for any more as retrieved"""
+    if not future.cancelled():
+        future.exception()
+
+
+class _AsyncClient(object):
+    """Runs the generated client's ``send_*``/``recv_*`` pairs over an asyncio stream.
+
+    With the framed transport a response is read frame by frame. Unframed responses carry no
+    length: one that does not decode from the first read is decoded on a worker thread, which
+    is fed the rest of the reply as it arrives.
+
+    Every request has its own sequence id, and a reply whose method name or sequence id does not
+    match the request is an error. A request interrupted before its reply is read in full, e.g.
+    by cancellation, leaves the stream out of step: the client is then closed and
+    :py:attr:`broken`.
+    """
+
+    def __init__(self, client_class, reader, writer, transport):
+        if transport not in (_transport.TRANSPORT_BUFFERED, _transport.TRANSPORT_FRAMED):
+            raise exc.ProgrammingError("Unsupported transport for asyncio: {}".format(transport))
+        self._reader = reader
+        self._writer = writer
+        self._framed = transport == _transport.TRANSPORT_FRAMED
+        self._client = client_class(_transport.make_protocol(thrift.transport.TTransport.TMemoryBuffer()))
+        self._lock = asyncio.Lock()
+        self.broken = False
+        self.bytes_received = 0
+
+    def _encode(self, name, args):
+        self._client._seqid = self._client._seqid % _MAX_SEQID + 1
+        buf = thrift.transport.TTransport.TMemoryBuffer()
+        self._client._oprot = _transport.make_protocol(buf)
+        getattr(self._client, 'send_' + name)(*args)
+        data = buf.getvalue()
+        if self._framed:
+            data = _FRAME_HEADER.pack(len(data)) + data
+        return data
+
+    def _check_reply(self, name, data):
+        """Raise unless ``data`` starts a reply to the request just sent"""
+        fname, _, rseqid = _transport.make_protocol(
+            thrift.transport.TTransport.TMemoryBuffer(data)).readMessageBegin()
+        if fname != name or rseqid != self._client._seqid:
+            raise exc.OperationalError("Reply to {} #{} received for request {} #{}".format(
+                fname, rseqid, name, self._client._seqid))
+
+    def _decode(self, name, trans):
+        """Decode the reply to ``name`` from the transport ``trans``"""
+        self._client._iprot = _transport.make_protocol(trans)
+        return getattr(self._client, 'recv_' + name)()
+
+    async def _read(self):
+        data = await self._reader.read(_READ_SIZE)
+        if not data:
+            raise exc.OperationalError("Connection closed by server")
+        self.bytes_received += len(data)
+        return data
+
+    async def _receive(self, name):
+        if self._framed:
+            header = await self._reader.readexactly(_FRAME_HEADER.size)
+            frame = await self._reader.readexactly(_FRAME_HEADER.unpack(header)[0])
+            self.bytes_received += len(header) + len(frame)
+            self._check_reply(name, frame)
+            return self._decode(name, thrift.transport.TTransport.TMemoryBuffer(frame))
+        # Only one request is outstanding at a time, so the reply is all the server sends
+        data = await self._read()
+        while True:
+            try:
+                self._check_reply(name, data)
+                break
+            except EOFError:
+                data += await self._read()
+        try:
+            return self._decode(name, thrift.transport.TTransport.TMemoryBuffer(data))
+        except EOFError:
+            pass
+        stream = _ReplyStream(data)
+        decoding = asyncio.get_event_loop().run_in_executor(None, self._decode, name, stream)
+        reading = None
+        try:
+            while True:
+                reading = asyncio.ensure_future(self._read())
+                await asyncio.wait((decoding, reading), return_when=asyncio.FIRST_COMPLETED)
+                if decoding.done():
+                    return decoding.result()
+                stream.feed(reading.result())
+        finally:
+            if reading is not None and not reading.done():
+                # The stream allows one pending read: let this one end before the next request
+                reading.cancel()
+                await asyncio.wait((reading,))
+            if not decoding.done():
+                # Let the worker run into the end of the stream and drop its error
+                stream.feed(b'')
+                decoding.add_done_callback(_retrieve)
+
+    async def call(self, name, *args):
+        """Send request ``name`` and wait for its reply, or only send it if it is oneway"""
+        async with self._lock:
+            if self.broken:
+                raise exc.OperationalError("Connection is broken by an interrupted request")
+            try:
+                self._writer.write(self._encode(name, args))
+                await self._writer.drain()
+                if not hasattr(self._client, 'recv_' + name):
+                    return None
+                return await self._receive(name)
+            except (ttypes.SnappyException, TApplicationException):
+                # Errors sent by the server come with a reply read in full
+                raise
+            except BaseException:
+                self.broken = True
+                self.close()
+                raise
+
+    def close(self):
+        self._writer.close()
+
+
+async def _open_client(client_class, host, port, transport):
+    reader, writer = await asyncio.open_connection(host, port, limit=_READ_SIZE)
+    return _AsyncClient(client_class, reader, writer, transport)
+
+
+async def connect(*args, **kwargs):
+    """Open a :py:class:`Connection`; takes the arguments of :py:class:`Connection`"""
+    connection = Connection(*args, **kwargs)
+    await connection.open()
+    return connection
+
+
+class Connection(object):
+    """asyncio counterpart of :py:class:`pysnappydata.snappydata.Connection`
+
+    ``transport`` is ``'buffered'`` (the default, plain Thrift over the socket) or ``'framed'``.
+    Use :py:func:`connect` or ``await`` :py:meth:`open` before issuing requests.
+    """
+
+    def __init__(self, host, port=1528, username=None, password=None, locator=False,
+                 transport=_transport.TRANSPORT_BUFFERED):
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self._locator = locator
+        self._transport = transport
+        self._hostname = None
+        self._client = None
+        self._conn_properties = None
+
+    async def open(self):
+        if self._locator:
+            _logger.info("connect to locator %s:%d", self._host, self._port)
+            locator = await _open_client(LocatorService.Client, self._host, self._port, self._transport)
+            try:
+                prefer_server = await locator.call(
+                    'getPreferredServer', set([LocatorService.ServerType.THRIFT_SNAPPY_CP]), None, None)
+            finally:
+                locator.close()
+            self._hostname, port = prefer_server.hostName, prefer_server.port
+        else:
+            self._hostname, port = self._host, self._port
+
+        _logger.info("connect to server %s:%d", self._hostname, port)
+        self._clientid = self._hostname + str(threading.current_thread().ident) + str(time.time())
+        self._client = await _open_client(SnappyDataService.Client, self._hostname, port, self._transport)
+        arguments = ttypes.OpenConnectionArgs(
+            clientHostName=self._hostname,
+            clientID=self._clientid,
+            userName=self._username,
+            password=self._password,
+            security=ttypes.SecurityMechanism.PLAIN
+        )
+        try:
+            self._conn_properties = await self._client.call('openConnection', arguments)
+        except BaseException:
+            self._client.close()
+            raise
+        return self
+
+    async def close(self):
+        if self._client is None or self._client.broken:
+            return
+        try:
+            await self._client.call('closeConnection', self._conn_properties.connId, True,
+                                    self._conn_properties.token)
+        finally:
+            self._client.close()
+
+    async def __aenter__(self):
+        if self._client is None:
+            await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def cursor(self, *args, **kwargs):
+        return Cursor(self, *args, **kwargs)
+
+    @property
+    def connectionid(self):
+        return self._conn_properties.connId or -1
+
+    @property
+    def token(self):
+        return self._conn_properties.token or ""
+
+    @property
+    def hostname(self):
+        return self._hostname
+
+    @property
+    def bytes_received(self):
+        """Total bytes read from the server socket"""
+        return self._client.bytes_received
+
+    @property
+    def broken(self):
+        """Whether a request was interrupted before its reply was read, e.g. by cancellation.
+        The connection is then closed and every further request raises
+        :py:class:`~pysnappydata.exc.OperationalError`.
+        """
+        return self._client is not None and self._client.broken
+
+    async def reset(self):
+        """Cancel whatever runs on the session; raises only if the connection is unusable"""
+        try:
+            await self._client.call('cancelCurrentStatement', self._conn_properties.connId,
+                                    self._conn_properties.token)
+        except ttypes.SnappyException:
+            pass
+
+    async def execute(self, sql, attr=None, outputparams=None):
+        return await self._client.call('execute', self._conn_properties.connId, sql, outputparams, attr,
+                                       self._conn_properties.token)
+
+    async def get_next_result_set(self, cursorid, behaviour=constants.NEXTRS_CLOSE_CURRENT_RESULT):
+        return await self._client.call('getNextResultSet', cursorid, behaviour, self._conn_properties.token)
+
+    async def scroll_cursor(self, cursorid, fetchsize):
+        """Fetch the next batch of an open result set, continuing from the current position"""
+        return await self._client.call('scrollCursor', cursorid, 0, False, False, fetchsize,
+                                       self._conn_properties.token)
+
+    async def close_result_set(self, cursorid):
+        await self._client.call('closeResultSet', cursorid, self._conn_properties.token)
+
+    async def get_blob_chunk(self, lob_id, offset, size, free_at_end=False):
+        """Same as :py:meth:`pysnappydata.snappydata.Connection.get_blob_chunk`"""
+        return await self._client.call('getBlobChunk', self._conn_properties.connId, lob_id, offset, size,
+                                       free_at_end, self._conn_properties.token)
+
+    async def get_clob_chunk(self, lob_id, offset, size, free_at_end=False):
+        """Same as :py:meth:`pysnappydata.snappydata.Connection.get_clob_chunk`"""
+        return await self._client.call('getClobChunk', self._conn_properties.connId, lob_id, offset, size,
+                                       free_at_end, self._conn_properties.token)
+
+
+class Cursor(object):
+    """asyncio counterpart of :py:class:`pysnappydata.snappydata.Cursor`
+
+    The fetch methods are coroutines, and ``async for row in cursor`` iterates over the
+    remaining rows, pulling further batches from the server as needed. Parameters are escaped
+    into the SQL text as with the blocking cursor. LOB values are read in full when their batch
+    is received.
+    """
+
+    def __init__(self, connection, arraysize=1000, batch_size=constants.DEFAULT_RESULTSET_BATCHSIZE):
+        self._connection = connection
+        self.arraysize = arraysize
+        self._batch_size = batch_size
+        self._operationHandle = None
+        self._rowset = None
+        self._last_batch = True
+        self._reset_state()
+
+    def _reset_state(self):
+        self._data = collections.deque()
+        self._metadata = None
+        self._decoder = None
+        self._description = None
+        self._rownumber = 0
+        self._rowcount = -1
+
+    async def _close_result_set(self):
+        if self._rowset is not None and not self._last_batch:
+            # The server side cursor is only released automatically once the last batch is sent
+            await self._connection.close_result_set(self._rowset.cursorId)
+        self._rowset = None
+        self._last_batch = True
+
+    async def close(self):
+        await self._close_result_set()
+        self._reset_state()
+
+    async def execute(self, operation, parameters=None):
+        """Execute a database operation (query or command). Return values are not defined."""
+        if parameters is None:
+            sql = operation
+        else:
+            sql = operation % snappydata._escaper.escape_args(parameters)
+
+        await self.close()
+        _logger.info('%s', sql)
+        self._operationHandle = await self._connection.execute(
+            sql, ttypes.StatementAttrs(batchSize=self._batch_size))
+        if self._operationHandle is not None and self._operationHandle.resultSet is not None:
+            self._rowcount = 0
+            self._set_metadata(self._operationHandle.resultSet.metadata)
+            await self._add_rowset(self._operationHandle.resultSet)
+        elif self._operationHandle is not None and self._operationHandle.updateCount is not None:
+            self._rowcount = self._operationHandle.updateCount
+
+    def _set_metadata(self, metadata):
+        self._metadata = metadata
+        self._decoder = converters.compile_row_decoder(metadata)
+
+    async def _add_rowset(self, rowset):
+        await self._read_lobs(rowset)
+        self._rowset = rowset
+        self._last_batch = bool(rowset.flags & constants.ROWSET_LAST_BATCH) or rowset.cursorId == constants.INVALID_ID
+        self._rowcount += len(rowset.rows)
+        self._data.extend(map(self._decoder, rowset.rows))
+
+    async def _read_lobs(self, rowset):
+        """Complete the LOB values of ``rowset`` of which the row only carries the first chunk,
+        since the row decoder cannot wait for the rest
+        """
+        columns = [i for i, descriptor in enumerate(self._metadata) if descriptor.type in converters.LOB_TYPES]
+        if not columns:
+            return
+        for row in rowset.rows:
+            for i in columns:
+                value = row.values[i]
+                chunk = value.blob_val if value.blob_val is not None else value.clob_val
+                if chunk is not None and not chunk.last and chunk.lobId is not None:
+                    await self._read_lob(chunk, value.blob_val is None)
+
+    async def _read_lob(self, chunk, clob):
+        """Read the rest of the LOB starting with ``chunk`` into it, as the last chunk"""
+        get = self._connection.get_clob_chunk if clob else self._connection.get_blob_chunk
+        parts = [chunk.chunk] if chunk.chunk else []
+        position = (chunk.offset or 0) + len(chunk.chunk or ())
+        while True:
+            want = constants.DEFAULT_LOB_CHUNKSIZE
+            if chunk.totalLength is not None:
+                want = min(want, chunk.totalLength - position)
+            free_at_end = chunk.totalLength is not None and position + want >= chunk.totalLength
+            following = await get(chunk.lobId, position, want, free_at_end)
+            if following.chunk:
+                parts.append(following.chunk)
+                position += len(following.chunk)
+            if following.last or free_at_end or not following.chunk:
+                break
+        chunk.chunk = ('' if clob else b'').join(parts)
+        chunk.last = True
+
+    async def _fetch_more(self):
+        """Pull the next batch; returns ``False`` once the result set is exhausted"""
+        if self._last_batch:
+            return False
+        await self._add_rowset(await self._connection.scroll_cursor(self._rowset.cursorId, self._batch_size))
+        return True
+
+    @property
+    def description(self):
+        """Same as :py:attr:`pysnappydata.snappydata.Cursor.description`"""
+        if self._metadata is None:
+            return None
+        if self._description is None:
+            self._description = [(col.name, ttypes.SnappyType._VALUES_TO_NAMES[col.type], None, None,
+                                  col.precision, col.nullable)
+                                 for col in self._metadata]
+        return self._description
+
+    @property
+    def rowcount(self):
+        """Affected rows for DML. For queries, the number of rows received from the server so far."""
+        return self._rowcount
+
+    @property
+    def rownumber(self):
+        return self._rownumber
+
+    async def fetchone(self):
+        """Fetch the next row, or ``None`` when no more data is available"""
+        if self._metadata is None:
+            raise exc.ProgrammingError("No result set")
+        while not self._data:
+            if not await self._fetch_more():
+                return None
+        self._rownumber += 1
+        return self._data.popleft()
+
+    async def fetchmany(self, size=None):
+        """Fetch up to ``size`` (default: :py:attr:`arraysize`) rows"""
+        if size is None:
+            size = self.arraysize
+        rows = []
+        for _ in range(size):
+            row = await self.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+    async def fetchall(self):
+        """Fetch all remaining rows"""
+        rows = []
+        while True:
+            row = await self.fetchone()
+            if row is None:
+                return rows
+            rows.append(row)
+
+    async def nextset(self):
+        """Skip to the next result set of a multi-result statement, ``None`` if there is none"""
+        if self._rowset is None or not self._rowset.flags & constants.ROWSET_HAS_MORE_ROWSETS:
+            return None
+        rowset = await self._connection.get_next_result_set(self._rowset.cursorId)
+        self._reset_state()
+        self._rowcount = 0
+        self._set_metadata(rowset.metadata)
+        await self._add_rowset(rowset)
+        return True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+    @property
+    def handle(self):
+        return self._operationHandle
+
+
+class AsyncConnectionPool(object):
+    """Bounded pool of asyncio connections, see :py:class:`pysnappydata.pool.ConnectionPool`
+
+    Connections are opened on demand up to ``max_size``; :py:meth:`acquire` waits up to
+    ``timeout`` seconds (forever if ``None``) for a free one. With ``validate``, a connection is
+    checked with :py:meth:`Connection.reset` on checkout. Other keyword arguments are passed on to
+    :py:class:`Connection`.
+    """
+
+    def __init__(self, host, port=1528, max_size=10, idle_timeout=300.0, timeout=None, validate=True,
+                 **kwargs):
+        if max_size < 1:
+            raise exc.ProgrammingError("Invalid pool size {}".format(max_size))
+        self._host = host
+        self._port = port
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._validate = validate
+        self._kwargs = kwargs
+        self._idle = collections.deque()
+        # id() of the connections handed out by acquire and not yet released
+        self._checked_out = set()
+        self._size = 0
+        self._slots = asyncio.Semaphore(max_size)
+        self._closed = False
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._created = 0
+        self._discarded = 0
+        self._expired = 0
+
+    async def _discard(self, connection):
+        self._size -= 1
+        try:
+            await connection.close()
+        except Exception:
+            _logger.debug("error closing pooled connection", exc_info=True)
+
+    async def acquire(self):
+        """Check out a connection, opening one if none is idle. Hand it back with :py:meth:`release`."""
+        if self._closed:
+            raise exc.OperationalError("Connection pool is closed")
+        if self._slots.locked():
+            self._waits += 1
+        start = time.time()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._timeout)
+        except asyncio.TimeoutError:
+            raise exc.OperationalError(
+                "Timed out waiting for a pooled connection after {} s".format(self._timeout))
+        finally:
+            self._wait_time += time.time() - start
+        try:
+            deadline = time.time() - self._idle_timeout
+            while self._idle:
+                connection, since = self._idle.pop()
+                if since < deadline:
+                    self._expired += 1
+                    await self._discard(connection)
+                    continue
+                if not self._validate or await self._healthy(connection):
+                    self._checkouts += 1
+                    self._checked_out.add(id(connection))
+                    return connection
+                self._discarded += 1
+                await self._discard(connection)
+            connection = await connect(self._host, self._port, **self._kwargs)
+            self._size += 1
+            self._created += 1
+            self._checkouts += 1
+            self._checked_out.add(id(connection))
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _healthy(self, connection):
+        try:
+            await connection.reset()
+            return True
+        except Exception:
+            _logger.info("discarding broken pooled connection", exc_info=True)
+            return False
+
+    async def release(self, connection):
+        """Return a connection obtained from :py:meth:`acquire` to the pool; a
+        :py:attr:`~Connection.broken` one is discarded. Releasing it again before the next checkout
+        raises :py:class:`~pysnappydata.exc.ProgrammingError`.
+        """
+        if id(connection) not in self._checked_out:
+            raise exc.ProgrammingError("Connection is not checked out from this pool")
+        self._checked_out.discard(id(connection))
+        try:
+            if connection.broken:
+                self._discarded += 1
+                await self._discard(connection)
+            elif self._closed:
+                await self._discard(connection)
+            else:
+                self._idle.append((connection, time.time()))
+        finally:
+            self._slots.release()
+
+    def connection(self):
+        """Async context manager checking out a connection for the duration of the block"""
+        return _PooledConnection(self)
+
+    async def close(self):
+        """Close all idle connections; connections still checked out are closed on release"""
+        self._closed = True
+        while self._idle:
+            await self._discard(self._idle.popleft()[0])
+
+    @property
+    def stats(self):
+        """Same keys as :py:attr:`pysnappydata.pool.ConnectionPool.stats`, without utilization and
+        servers
+        """
+        return {
+            'size': self._size,
+            'idle': len(self._idle),
+            'in_use': self._size - len(self._idle),
+            'max_size': self._max_size,
+            'checkouts': self._checkouts,
+            'waits': self._waits,
+            'wait_time': self._wait_time,
+            'created': self._created,
+            'discarded': self._discarded,
+            'expired': self._expired,
+        }
+
+
+class _PooledConnection(object):
+    def __init__(self, pool):
+        self._pool = pool
+        self._connection = None
+
+    async def __aenter__(self):
+        self._connection = await self._pool.acquire()
+        return self._connection
+
+    async def __aexit__(self, *exc_info):
+        await self._pool.release(self._connection)
@@ -0,0 +1,366 @@
+"""Columnar fetching of result sets into NumPy arrays, pandas DataFrames and Arrow record batches.
+
+Requires NumPy, plus pandas or pyarrow for the functions producing their types. Numeric, boolean and date/time columns
+are decoded from the Thrift values of each batch straight into preallocated typed arrays; other
+columns become object arrays holding the same values :py:meth:`Cursor.fetchone` would return,
+except that LOBs are always read in full.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import operator
+
+import numpy
+
+from SDTCLIService import ttypes
+from pysnappydata import converters
+
+_T = ttypes.SnappyType
+
+DTYPES = {
+    _T.BOOLEAN: numpy.bool_,
+    _T.TINYINT: numpy.int8,
+    _T.SMALLINT: numpy.int16,
+    _T.INTEGER: numpy.int32,
+    _T.BIGINT: numpy.int64,
+    _T.FLOAT: numpy.float64,
+    _T.DOUBLE: numpy.float64,
+    _T.DATE: numpy.int64,
+    _T.TIMESTAMP: numpy.int64,
+}
+
+# DATE values are seconds and TIMESTAMP values nanoseconds since the epoch
+_DATETIME_SCALE = {
+    _T.DATE: (1000, 1),
+    _T.TIMESTAMP: (1, 1000000),
+}
+
+_INTEGER_TYPES = frozenset([_T.TINYINT, _T.SMALLINT, _T.INTEGER, _T.BIGINT])
+_STRING_TYPES = frozenset([_T.CHAR, _T.VARCHAR, _T.LONGVARCHAR])
+
+_INITIAL_CAPACITY = 1024
+
+# String columns with at most this ratio of distinct values to rows become categoricals
+DEFAULT_CATEGORICAL_THRESHOLD = 0.5
+
+
+class ColumnBuilder(object):
+    """Accumulates the values of one result column in an array that grows geometrically, with
+    NULLs recorded in a parallel mask.
+    """
+
+    def __init__(self, index, descriptor, capacity=_INITIAL_CAPACITY, scale_datetimes=True, lob=None):
+        self.index = index
+        self.descriptor = descriptor
+        self.type = descriptor.type
+        self._scale = _DATETIME_SCALE.get(descriptor.type) if scale_datetimes else None
+        self.dtype = DTYPES.get(descriptor.type, numpy.object_)
+        field = converters.VALUE_FIELDS.get(descriptor.type)
+        if self.dtype is not numpy.object_:
+            self._convert = operator.attrgetter(field)
+            self._convert_value = None
+        else:
+            self._convert = converters.value_converter(descriptor.type, descriptor.elementTypes, lob)
+            self._convert_value = converters.values_converter(descriptor.type, descriptor.elementTypes, lob)
+        self.data = numpy.empty(capacity, self.dtype)
+        self.mask = numpy.zeros(capacity, numpy.bool_)
+        self.size = 0
+
+    def _reserve(self, n):
+        capacity = len(self.data)
+        if self.size + n <= capacity:
+            return
+        while capacity < self.size + n:
+            capacity = max(capacity * 2, 1)
+        data = numpy.empty(capacity, self.dtype)
+        data[:self.size] = self.data[:self.size]
+        mask = numpy.zeros(capacity, numpy.bool_)
+        mask[:self.size] = self.mask[:self.size]
+        self.data, self.mask = data, mask
+
+    def append_rows(self, rows, decoded):
+        """Append this column of ``rows``, either ``ttypes.Row`` or already converted rows"""
+        i = self.index
+        if decoded:
+            values = [row[i] for row in rows]
+        else:
+            convert = self._convert
+            values = [convert(row.values[i]) for row in rows]
+        self.append(values)
+
+    def append_values(self, values):
+        """Append a sequence of bare cell values of this column, as read in the ``values`` decode
+        mode
+        """
+        convert = self._convert_value
+        self.append(values if convert is None else [convert(v) for v in values])
+
+    def append(self, values):
+        n = len(values)
+        self._reserve(n)
+        start, end = self.size, self.size + n
+        if self.dtype is numpy.object_:
+            # Slice assignment would broadcast nested lists (ARRAY/STRUCT values) as dimensions
+            self.mask[start:end] = [v is None for v in values]
+            for i, value in enumerate(values, start):
+                self.data[i] = value
+        else:
+            if None in values:
+                self.mask[start:end] = [v is None for v in values]
+                values = [0 if v is None else v for v in values]
+            self.data[start:end] = values
+        if self._scale is not None:
+            multiply, divide = self._scale
+            if multiply != 1:
+                self.data[start:end] *= multiply
+            if divide != 1:
+                self.data[start:end] //= divide
+        self.size = end
+
+    def finish(self):
+        """Return the column as a ``numpy.ma.MaskedArray`` trimmed to its size"""
+        data = self.data[:self.size]
+        if self.type in _DATETIME_SCALE:
+            data = data.view('datetime64[ms]')
+        return numpy.ma.MaskedArray(data, mask=self.mask[:self.size].copy())
+
+
+def fetch_numpy(cursor, batch_rows=None):
+    """Fetch up to ``batch_rows`` (default: all) remaining rows of ``cursor`` column by column.
+
+    Returns an ordered mapping of column name to ``numpy.ma.MaskedArray``, masked where the
+    value is NULL.
+    """
+    builders = build_columns(cursor, batch_rows)
+    names = [column[0] for column in cursor.description]
+    return collections.OrderedDict((name, builder.finish()) for name, builder in zip(names, builders))
+
+
+def build_columns(cursor, batch_rows=None, scale_datetimes=True):
+    """Feed up to ``batch_rows`` (default: all) remaining rows of ``cursor`` into one
+    :py:class:`ColumnBuilder` per column.
+
+    DATE and TIMESTAMP columns hold milliseconds unless ``scale_datetimes`` is false, in which
+    case they keep the wire units (seconds and nanoseconds respectively).
+    """
+    capacity = batch_rows or _INITIAL_CAPACITY
+    builders = [ColumnBuilder(i, descriptor, capacity, scale_datetimes, cursor._read_lob)
+                for i, descriptor in enumerate(cursor._metadata)]
+    for rows, decoded in cursor._iter_batches(batch_rows):
+        if decoded or not cursor._values:
+            for builder in builders:
+                builder.append_rows(rows, decoded)
+        else:
+            # Value lists are turned into columns in one go
+            for builder, values in zip(builders, zip(*rows)):
+                builder.append_values(values)
+    return builders
+
+
+def _series_data(pandas, builder, categorical_threshold):
+    """Turn a finished column into the array backing its DataFrame column"""
+    data = builder.data[:builder.size]
+    mask = builder.mask[:builder.size]
+    has_nulls = mask.any()
+    if builder.type in _INTEGER_TYPES and (builder.descriptor.nullable or has_nulls):
+        return pandas.arrays.IntegerArray(data, mask.copy())
+    elif builder.type == _T.BOOLEAN and has_nulls:
+        return pandas.arrays.BooleanArray(data, mask.copy())
+    elif builder.type in _DATETIME_SCALE:
+        data = data.view('datetime64[ms]')
+        if has_nulls:
+            data[mask] = numpy.datetime64('NaT')
+        return data
+    elif builder.dtype is numpy.float64:
+        if has_nulls:
+            data[mask] = numpy.nan
+        return data
+    elif builder.type == _T.DECIMAL:
+        decimals = numpy.empty(builder.size, numpy.object_)
+        decimals[:] = [converters.decimal_value(v) for v in data]
+        return decimals
+    elif builder.type in _STRING_TYPES and builder.size and categorical_threshold:
+        uniques = pandas.unique(data)
+        if len(uniques) <= categorical_threshold * builder.size:
+            return pandas.Categorical(data)
+    return data
+
+
+def fetch_dataframe(cursor, batch_rows=None, categorical_threshold=DEFAULT_CATEGORICAL_THRESHOLD):
+    """Fetch up to ``batch_rows`` (default: all) remaining rows of ``cursor`` as a DataFrame.
+
+    Columns are built directly from the typed arrays of :py:func:`build_columns`:
+
+    - nullable TINYINT..BIGINT columns use pandas nullable integer dtypes
+    - NULLs become NaN in float columns and NaT in DATE/TIMESTAMP columns
+    - DECIMAL columns hold ``decimal.Decimal`` values
+    - CHAR/VARCHAR columns whose distinct values are at most ``categorical_threshold`` times the
+      row count become categoricals; pass 0 to disable
+    """
+    import pandas
+
+    builders = build_columns(cursor, batch_rows)
+    arrays = [_series_data(pandas, builder, categorical_threshold) for builder in builders]
+    # Keyed by position so that duplicate column names survive, then labelled in one go
+    frame = pandas.DataFrame(dict(enumerate(arrays)), copy=False)
+    frame.columns = [column[0] for column in cursor.description]
+    return frame
+
+
+def read_sql(sql, con, index_col=None, params=None, chunksize=None,
+             categorical_threshold=DEFAULT_CATEGORICAL_THRESHOLD):
+    """Counterpart of ``pandas.read_sql`` for a :py:class:`~pysnappydata.snappydata.Connection`.
+
+    Returns a DataFrame, or an iterator of DataFrames of ``chunksize`` rows if it is given.
+    """
+    cursor = con.cursor()
+    cursor.execute(sql, params)
+    if chunksize is None:
+        try:
+            return _indexed(fetch_dataframe(cursor, None, categorical_threshold), index_col)
+        finally:
+            cursor.close()
+    return _iter_frames(cursor, chunksize, index_col, categorical_threshold)
+
+
+def _iter_frames(cursor, chunksize, index_col, categorical_threshold):
+    try:
+        while True:
+            frame = fetch_dataframe(cursor, chunksize, categorical_threshold)
+            if frame.empty:
+                break
+            yield _indexed(frame, index_col)
+    finally:
+        cursor.close()
+
+
+def _indexed(frame, index_col):
+    return frame if index_col is None else frame.set_index(index_col)
+
+
+def arrow_type(pa, type_, precision=0, scale=0, element_types=None):
+    """Arrow type for a SnappyType, or ``None`` to let Arrow infer it from the values.
+
+    A DECIMAL without a precision becomes the widest ``decimal128``. Elements of ARRAY, MAP and
+    STRUCT types come from ``element_types``; STRUCT fields are named ``f0``, ``f1``, ... since the
+    server does not send field names.
+    """
+    if type_ == _T.BOOLEAN:
+        return pa.bool_()
+    elif type_ == _T.TINYINT:
+        return pa.int8()
+    elif type_ == _T.SMALLINT:
+        return pa.int16()
+    elif type_ == _T.INTEGER:
+        return pa.int32()
+    elif type_ == _T.BIGINT:
+        return pa.int64()
+    elif type_ == _T.FLOAT or type_ == _T.DOUBLE:
+        return pa.float64()
+    elif type_ == _T.DECIMAL:
+        if not precision or precision <= 38:
+            return pa.decimal128(precision or 38, scale or 0)
+        return pa.decimal256(min(precision, 76), scale or 0)
+    elif type_ in _STRING_TYPES or type_ in (_T.CLOB, _T.JSON, _T.SQLXML):
+        return pa.string()
+    elif type_ == _T.DATE:
+        return pa.date64()
+    elif type_ == _T.TIME:
+        return pa.time32('s')
+    elif type_ == _T.TIMESTAMP:
+        return pa.timestamp('ns')
+    elif type_ in (_T.BINARY, _T.VARBINARY, _T.LONGVARBINARY, _T.BLOB, _T.JAVA_OBJECT):
+        return pa.binary()
+    elif type_ == _T.NULLTYPE:
+        return pa.null()
+    elif type_ in (_T.ARRAY, _T.MAP, _T.STRUCT):
+        children = [arrow_type(pa, t) for t in element_types or ()]
+        if not children or any(child is None for child in children):
+            return None
+        if type_ == _T.ARRAY:
+            return pa.list_(children[0])
+        elif type_ == _T.MAP and len(children) == 2:
+            return pa.map_(children[0], children[1])
+        elif type_ == _T.STRUCT:
+            return pa.struct([pa.field('f{}'.format(i), child) for i, child in enumerate(children)])
+    return None
+
+
+def arrow_schema(pa, cursor):
+    fields = []
+    for (name, _, _, _, _, nullable), descriptor in zip(cursor.description, cursor._metadata):
+        type_ = arrow_type(pa, descriptor.type, descriptor.precision, descriptor.scale, descriptor.elementTypes)
+        fields.append(pa.field(name, pa.null() if type_ is None else type_, nullable is not False))
+    return pa.schema(fields)
+
+
+def _arrow_value(value):
+    """Adapt a Python value of a nested column to what ``pyarrow.array`` accepts"""
+    if isinstance(value, ttypes.Decimal):
+        return converters.decimal_value(value)
+    elif isinstance(value, dict):
+        return [(_arrow_value(k), _arrow_value(v)) for k, v in value.items()]
+    elif isinstance(value, list):
+        return [_arrow_value(v) for v in value]
+    return value
+
+
+def _arrow_array(pa, builder, type_):
+    data = builder.data[:builder.size]
+    mask = builder.mask[:builder.size]
+    if builder.dtype is not numpy.object_:
+        if builder.type == _T.DATE:
+            data = data * 1000
+        return pa.array(data, mask=mask, type=type_)
+    values = data.tolist()
+    if builder.type == _T.DECIMAL:
+        values = [converters.decimal_value(v) for v in values]
+    elif builder.type == _T.TIME:
+        values = [None if v is None else v % 86400 for v in values]
+    elif builder.type == _T.STRUCT:
+        values = [None if v is None else {'f{}'.format(i): _arrow_value(x) for i, x in enumerate(v)}
+                  for v in values]
+    elif builder.type in (_T.ARRAY, _T.MAP):
+        values = [None if v is None else _arrow_value(v) for v in values]
+    return pa.array(values, type=type_)
+
+
+def fetch_arrow_batches(cursor, batch_rows=None):
+    """Yield the remaining rows of ``cursor`` as ``pyarrow.RecordBatch`` objects, one per fetched
+    batch or at most ``batch_rows`` rows each.
+
+    All batches share one schema. Types the metadata leaves open, such as those of ARRAY, MAP and
+    STRUCT columns without element types, are inferred from the first batch.
+    """
+    import pyarrow as pa
+
+    schema = None
+    while True:
+        builders = build_columns(cursor, batch_rows or cursor._batch_size, scale_datetimes=False)
+        if not builders or not builders[0].size:
+            return
+        if schema is None:
+            fields = arrow_schema(pa, cursor)
+            arrays = [_arrow_array(pa, builder, None if _inferred(pa, builder, field) else field.type)
+                      for builder, field in zip(builders, fields)]
+            schema = pa.schema([field.with_type(array.type) for field, array in zip(fields, arrays)])
+        else:
+            arrays = [_arrow_array(pa, builder, field.type) for builder, field in zip(builders, schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _inferred(pa, builder, field):
+    """Whether the type of a column is left to Arrow to infer from its values"""
+    return pa.types.is_null(field.type) and builder.type != _T.NULLTYPE
+
+
+def fetch_arrow_table(cursor, batch_rows=None):
+    """Fetch the remaining rows of ``cursor`` as one ``pyarrow.Table``"""
+    import pyarrow as pa
+
+    batches = list(fetch_arrow_batches(cursor, batch_rows))
+    if not batches:
+        return arrow_schema(pa, cursor).empty_table()
+    return pa.Table.from_batches(batches)
@@ -12,7 +12,6 @@ import collections
 from builtins import bytes
 from builtins import int
 from builtins import object
-from builtins import range
 from builtins import str
 from future.utils import with_metaclass
 from past.builtins import basestring
@@ -23,6 +22,10 @@ from pysnappydata import exc
 class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
     """Base class for some common DB-API logic"""
 
+    _STATE_NONE = 0
+    _STATE_RUNNING = 1
+    _STATE_FINISHED = 2
+
     def __init__(self):
         self._reset_state()
 
@@ -31,10 +34,38 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         # State to return as part of DB-API
         self._rownumber = 0
         self.lastrowid = None
-        self._data = None
 
         # Internal helper state
-        self._data = collections.deque()
+        self._state = self._STATE_NONE
+        # Current batch of rows; the next row to return is self._data[self._rownumber - self._data_start]
+        self._data = []
+        self._data_start = 0
+
+    def _set_data(self, rows):
+        """Make ``rows`` the batch following the row at :py:attr:`rownumber`"""
+        self._data = rows
+        self._data_start = self._rownumber
+
+    def _fetch_more(self):
+        """Replace the consumed batch with the next one using :py:meth:`_set_data`, moving to
+        ``_STATE_FINISHED`` once the result set is exhausted.
+
+        Subclasses that stream results override this. It is only called while the cursor is in
+        ``_STATE_RUNNING`` and all buffered rows have been consumed.
+        """
+        self._state = self._STATE_FINISHED
+
+    def _take(self, size=None):
+        """Up to ``size`` (default: all) of the rows left in the current batch, fetching the next
+        batch first if the current one is consumed. Empty once the result set is exhausted.
+        """
+        while self._rownumber - self._data_start >= len(self._data) and self._state == self._STATE_RUNNING:
+            self._fetch_more()
+        start = self._rownumber - self._data_start
+        end = len(self._data) if size is None else min(start + size, len(self._data))
+        rows = self._data[start:end]
+        self._rownumber += len(rows)
+        return rows
 
     @abc.abstractproperty
     def description(self):
@@ -81,11 +112,13 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         An :py:class:`~pyhive.exc.Error` (or subclass) exception is raised if the previous call to
         :py:meth:`execute` did not produce any result set or no call was issued yet.
         """
-        if not self._data:
+        while self._rownumber - self._data_start >= len(self._data) and self._state == self._STATE_RUNNING:
+            self._fetch_more()
+        index = self._rownumber - self._data_start
+        if index >= len(self._data):
             return None
-        else:
-            self._rownumber += 1
-            return self._data.popleft()
+        self._rownumber += 1
+        return self._data[index]
 
     def fetchmany(self, size=None):
         """Fetch the next set of rows of a query result, returning a sequence of sequences (e.g. a
@@ -102,12 +135,11 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         if size is None:
             size = self.arraysize
         result = []
-        for _ in range(size):
-            one = self.fetchone()
-            if one is None:
+        while len(result) < size:
+            rows = self._take(size - len(result))
+            if not rows:
                 break
-            else:
-                result.append(one)
+            result.extend(rows)
         return result
 
     def fetchall(self):
@@ -119,11 +151,10 @@ class DBAPICursor(with_metaclass(abc.ABCMeta, object)):
         """
         result = []
         while True:
-            one = self.fetchone()
-            if one is None:
+            rows = self._take()
+            if not rows:
                 break
-            else:
-                result.append(one)
+            result.extend(rows)
         return result
 
     @property
@@ -0,0 +1,445 @@
+"""Package private conversion between Thrift and Python values. Do not use directly.
+
+Decoders are compiled once per result set from its ``ColumnDescriptor`` list, and parameter
+encoders once per prepared statement, so converting a row does no per cell type dispatch.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import binascii
+import calendar
+import datetime
+import decimal
+
+from builtins import bytes
+from builtins import int
+from builtins import str
+from past.builtins import basestring
+
+from SDTCLIService import ttypes
+from pysnappydata import exc
+
+_T = ttypes.SnappyType
+
+LOB_TYPES = frozenset([_T.BLOB, _T.CLOB, _T.JSON, _T.SQLXML])
+
+# Field of ttypes.ColumnValue holding each scalar type. The union leaves every other field,
+# including this one for a NULL, set to None.
+VALUE_FIELDS = {
+    _T.BOOLEAN: 'bool_val',
+    _T.TINYINT: 'byte_val',
+    _T.SMALLINT: 'i16_val',
+    _T.INTEGER: 'i32_val',
+    _T.BIGINT: 'i64_val',
+    _T.FLOAT: 'double_val',
+    _T.DOUBLE: 'double_val',
+    _T.CHAR: 'string_val',
+    _T.VARCHAR: 'string_val',
+    _T.LONGVARCHAR: 'string_val',
+    _T.DECIMAL: 'decimal_val',
+    _T.DATE: 'date_val',
+    _T.TIME: 'time_val',
+    _T.TIMESTAMP: 'timestamp_val',
+    _T.BINARY: 'binary_val',
+    _T.VARBINARY: 'binary_val',
+    _T.LONGVARBINARY: 'binary_val',
+    _T.JAVA_OBJECT: 'java_val',
+}
+
+_NESTED_FIELDS = ('array_val', 'map_val', 'struct_val', 'blob_val', 'clob_val')
+
+# Scan order for values whose type is not known up front
+_ANY_FIELDS = tuple(sorted(set(VALUE_FIELDS.values()))) + _NESTED_FIELDS
+
+
+def _null(value):
+    return None
+
+
+def _identity(value):
+    return value
+
+
+def _blob(value):
+    chunk = value.blob_val
+    return None if chunk is None else chunk.chunk
+
+
+def _clob(value):
+    chunk = value.clob_val
+    return None if chunk is None else chunk.chunk
+
+
+def any_value(value):
+    """Convert a ``ColumnValue`` of unknown type by looking at which union field is set"""
+    if value is None or value.null_val:
+        return None
+    for field in _ANY_FIELDS:
+        item = getattr(value, field)
+        if item is None:
+            continue
+        if field == 'array_val' or field == 'struct_val':
+            return [any_value(x) for x in item]
+        elif field == 'map_val':
+            return {any_value(k): any_value(v) for k, v in item.items()}
+        elif field == 'blob_val' or field == 'clob_val':
+            return item.chunk
+        return item
+    return None
+
+
+def value_converter(type_, element_types=None, lob=None):
+    """Return a function converting one ``ColumnValue`` of SnappyType ``type_``.
+
+    ``element_types`` are the ``ColumnDescriptor.elementTypes`` of ARRAY, MAP and STRUCT columns.
+    Elements of nested types carry no element types of their own and are converted with
+    :py:func:`any_value`.
+
+    ``lob(chunk, clob)`` converts the first ``BlobChunk`` or ``ClobChunk`` of a LOB value, e.g.
+    by reading the rest of it from the server. Without it only the first chunk is returned.
+    """
+    field = VALUE_FIELDS.get(type_)
+    if field is not None:
+        return _getter(field)
+    if type_ == _T.BLOB:
+        return _blob if lob is None else _lob_converter('blob_val', lob, False)
+    elif type_ == _T.CLOB or type_ == _T.JSON or type_ == _T.SQLXML:
+        return _clob if lob is None else _lob_converter('clob_val', lob, True)
+    elif type_ == _T.NULLTYPE:
+        return _null
+    elif type_ == _T.ARRAY:
+        return _array_converter(_element_converter(element_types, 0))
+    elif type_ == _T.MAP:
+        return _map_converter(_element_converter(element_types, 0), _element_converter(element_types, 1))
+    elif type_ == _T.STRUCT:
+        return _struct_converter([value_converter(t) for t in element_types or ()])
+    else:
+        return _identity
+
+
+def _lob_converter(field, lob, clob):
+    def convert(value):
+        chunk = getattr(value, field)
+        return None if chunk is None else lob(chunk, clob)
+    return convert
+
+
+def _getter(field):
+    # Nested elements may be missing altogether, unlike top level cells
+    def get(value):
+        return None if value is None else getattr(value, field)
+    return get
+
+
+def _element_converter(element_types, index):
+    if element_types and len(element_types) > index:
+        return value_converter(element_types[index])
+    return any_value
+
+
+def _array_converter(convert):
+    def array(value):
+        items = value.array_val
+        return None if items is None else [convert(x) for x in items]
+    return array
+
+
+def _map_converter(convert_key, convert_value):
+    def map_(value):
+        items = value.map_val
+        return None if items is None else {convert_key(k): convert_value(v) for k, v in items.items()}
+    return map_
+
+
+def _struct_converter(converters):
+    def struct(value):
+        items = value.struct_val
+        if items is None:
+            return None
+        if not converters:
+            return [any_value(x) for x in items]
+        return [convert(x) for convert, x in zip(converters, items)]
+    return struct
+
+
+def values_converter(type_, element_types=None, lob=None):
+    """Like :py:func:`value_converter`, but for the bare cell values read in the ``values`` decode
+    mode (see :py:mod:`pysnappydata.wiredecode`). Returns ``None`` when the value needs no
+    conversion, as for all scalar types.
+    """
+    if type_ == _T.BLOB:
+        return _chunk if lob is None else _lob_value(lob, False)
+    elif type_ == _T.CLOB or type_ == _T.JSON or type_ == _T.SQLXML:
+        return _chunk if lob is None else _lob_value(lob, True)
+    elif type_ in (_T.ARRAY, _T.MAP, _T.STRUCT):
+        # Nested values are read as lists and dicts of bare values already, LOB chunks aside
+        if element_types and all(t in VALUE_FIELDS for t in element_types):
+            return None
+        return _nested_value
+    return None
+
+
+def _chunk(value):
+    return None if value is None else value.chunk
+
+
+def _lob_value(lob, clob):
+    def convert(value):
+        return None if value is None else lob(value, clob)
+    return convert
+
+
+def _nested_value(value):
+    if isinstance(value, list):
+        return [_nested_value(x) for x in value]
+    elif isinstance(value, dict):
+        return {_nested_value(k): _nested_value(v) for k, v in value.items()}
+    elif isinstance(value, (ttypes.BlobChunk, ttypes.ClobChunk)):
+        return value.chunk
+    return value
+
+
+def decimal_value(value):
+    """Convert a ``ttypes.Decimal`` (signum, scale and big-endian unsigned magnitude) exactly to a
+    ``decimal.Decimal``
+    """
+    if value is None:
+        return None
+    magnitude = value.magnitude
+    unscaled = int(binascii.hexlify(magnitude), 16) if magnitude else 0
+    digits = tuple(int(d) for d in str(unscaled))
+    return decimal.Decimal((1 if value.signum < 0 else 0, digits, -value.scale))
+
+
+def compile_row_decoder(metadata, lob=None, row_type=tuple, values=False):
+    """Return a function turning a ``ttypes.Row`` of a result set described by ``metadata`` into a
+    ``row_type`` of Python values: ``tuple``, ``list`` or a callable taking the values as a tuple.
+
+    Scalar columns become plain attribute lookups in a generated function; other columns call
+    their precomputed converter. ``lob`` is passed on to :py:func:`value_converter`.
+
+    With ``values``, rows are the lists of bare cell values of the ``values`` decode mode and
+    only the columns with a :py:func:`values_converter` are converted; if there are none, the
+    decoder is ``tuple`` or ``list`` itself.
+    """
+    namespace = {}
+    items = []
+    for i, descriptor in enumerate(metadata):
+        if values:
+            convert = values_converter(descriptor.type, descriptor.elementTypes, lob)
+            if convert is None:
+                items.append('v[{}]'.format(i))
+                continue
+        else:
+            field = VALUE_FIELDS.get(descriptor.type)
+            if field is not None:
+                items.append('v[{}].{}'.format(i, field))
+                continue
+            convert = value_converter(descriptor.type, descriptor.elementTypes, lob)
+        name = '_convert{}'.format(i)
+        namespace[name] = convert
+        items.append('{}(v[{}])'.format(name, i))
+    if values and not namespace and row_type in (tuple, list):
+        return row_type
+    body = '({})'.format(''.join(item + ', ' for item in items).rstrip(' '))
+    if row_type is list:
+        body = '[{}]'.format(', '.join(items))
+    elif row_type is not tuple:
+        namespace['_row'] = row_type
+        body = '_row({})'.format(body)
+    source = 'def decode(row):\n    v = {}\n    return {}\n'.format('row' if values else 'row.values', body)
+    exec(compile(source, '<snappydata row decoder>', 'exec'), namespace)
+    return namespace['decode']
+
+
+#
+# Python parameter values to ColumnValue
+#
+
+_NULL = ttypes.ColumnValue(null_val=True)
+
+_EPOCH_DATE = datetime.date(1970, 1, 1)
+
+
+def _to_decimal(value):
+    """Encode a number as ``ttypes.Decimal`` without going through float"""
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(str(value))
+    sign, digits, exponent = value.as_tuple()
+    unscaled = int(''.join(str(d) for d in digits) or '0')
+    if exponent > 0:
+        unscaled *= 10 ** exponent
+        exponent = 0
+    hexed = '{:x}'.format(unscaled)
+    magnitude = binascii.unhexlify(('0' if len(hexed) % 2 else '') + hexed)
+    signum = 0 if unscaled == 0 else (-1 if sign else 1)
+    return ttypes.Decimal(signum=signum, scale=-exponent, magnitude=magnitude)
+
+
+def _to_date(value):
+    """DATE as seconds since the epoch"""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return (value - _EPOCH_DATE).days * 86400
+    return int(value)
+
+
+def _to_time(value):
+    """TIME as seconds since midnight"""
+    if isinstance(value, datetime.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    return int(value)
+
+
+def _to_timestamp(value):
+    """TIMESTAMP as nanoseconds since the epoch; naive datetimes are taken as UTC"""
+    if isinstance(value, datetime.datetime):
+        seconds = calendar.timegm(value.utctimetuple())
+        return seconds * 1000000000 + value.microsecond * 1000
+    if isinstance(value, datetime.date):
+        return _to_date(value) * 1000000000
+    return int(value)
+
+
+def _to_string(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value if isinstance(value, basestring) else str(value)
+
+
+def _to_blob_chunk(value):
+    """A whole BLOB in one chunk, or a ``BlobChunk`` naming a LOB already sent to the server"""
+    return value if isinstance(value, ttypes.BlobChunk) else ttypes.BlobChunk(chunk=bytes(value), last=True)
+
+
+def _to_clob_chunk(value):
+    return value if isinstance(value, ttypes.ClobChunk) else ttypes.ClobChunk(chunk=_to_string(value), last=True)
+
+
+def _scalar_encoder(field, coerce):
+    def encode(value):
+        if value is None:
+            return _NULL
+        return ttypes.ColumnValue(**{field: coerce(value)})
+    return encode
+
+
+_SCALAR_ENCODERS = {
+    _T.BOOLEAN: _scalar_encoder('bool_val', bool),
+    _T.TINYINT: _scalar_encoder('byte_val', int),
+    _T.SMALLINT: _scalar_encoder('i16_val', int),
+    _T.INTEGER: _scalar_encoder('i32_val', int),
+    _T.BIGINT: _scalar_encoder('i64_val', int),
+    _T.FLOAT: _scalar_encoder('double_val', float),
+    _T.DOUBLE: _scalar_encoder('double_val', float),
+    _T.CHAR: _scalar_encoder('string_val', _to_string),
+    _T.VARCHAR: _scalar_encoder('string_val', _to_string),
+    _T.LONGVARCHAR: _scalar_encoder('string_val', _to_string),
+    _T.DECIMAL: _scalar_encoder('decimal_val', _to_decimal),
+    _T.DATE: _scalar_encoder('date_val', _to_date),
+    _T.TIME: _scalar_encoder('time_val', _to_time),
+    _T.TIMESTAMP: _scalar_encoder('timestamp_val', _to_timestamp),
+    _T.BINARY: _scalar_encoder('binary_val', bytes),
+    _T.VARBINARY: _scalar_encoder('binary_val', bytes),
+    _T.LONGVARBINARY: _scalar_encoder('binary_val', bytes),
+    _T.BLOB: _scalar_encoder('blob_val', _to_blob_chunk),
+    _T.CLOB: _scalar_encoder('clob_val', _to_clob_chunk),
+    _T.JSON: _scalar_encoder('clob_val', _to_clob_chunk),
+    _T.SQLXML: _scalar_encoder('clob_val', _to_clob_chunk),
+    _T.JAVA_OBJECT: _scalar_encoder('java_val', bytes),
+}
+
+
+class _MapKey(ttypes.ColumnValue):
+    """``ColumnValue`` usable as a ``map_val`` key. The generated class defines ``__eq__`` but
+    not ``__hash__``, which leaves it unhashable on Python 3.
+    """
+
+    def __hash__(self):
+        return hash(repr(sorted(self.__dict__.items())))
+
+
+def _map_key(value):
+    key = _MapKey()
+    key.__dict__.update(value.__dict__)
+    return key
+
+
+def any_encoder(value):
+    """Encode a value whose SQL type is unknown from its Python type"""
+    if value is None:
+        return _NULL
+    elif isinstance(value, bool):
+        return ttypes.ColumnValue(bool_val=value)
+    elif isinstance(value, int):
+        if -2 ** 31 <= value < 2 ** 31:
+            return ttypes.ColumnValue(i32_val=value)
+        return ttypes.ColumnValue(i64_val=value)
+    elif isinstance(value, float):
+        return ttypes.ColumnValue(double_val=value)
+    elif isinstance(value, decimal.Decimal):
+        return ttypes.ColumnValue(decimal_val=_to_decimal(value))
+    elif isinstance(value, basestring):
+        return ttypes.ColumnValue(string_val=_to_string(value))
+    elif isinstance(value, (bytes, bytearray)):
+        return ttypes.ColumnValue(binary_val=bytes(value))
+    elif isinstance(value, datetime.datetime):
+        return ttypes.ColumnValue(timestamp_val=_to_timestamp(value))
+    elif isinstance(value, datetime.date):
+        return ttypes.ColumnValue(date_val=_to_date(value))
+    elif isinstance(value, datetime.time):
+        return ttypes.ColumnValue(time_val=_to_time(value))
+    elif isinstance(value, dict):
+        return ttypes.ColumnValue(map_val={_map_key(any_encoder(k)): any_encoder(v) for k, v in value.items()})
+    elif isinstance(value, (list, tuple)):
+        return ttypes.ColumnValue(array_val=[any_encoder(v) for v in value])
+    raise exc.ProgrammingError("Unsupported parameter {!r}".format(value))
+
+
+def value_encoder(type_, element_types=None):
+    """Return a function encoding a Python value as a ``ColumnValue`` of SnappyType ``type_``"""
+    encode = _SCALAR_ENCODERS.get(type_)
+    if encode is not None:
+        return encode
+    elif type_ == _T.ARRAY:
+        element = value_encoder(element_types[0]) if element_types else any_encoder
+
+        def array(value):
+            return _NULL if value is None else ttypes.ColumnValue(array_val=[element(v) for v in value])
+        return array
+    elif type_ == _T.MAP:
+        key = value_encoder(element_types[0]) if element_types else any_encoder
+        item = value_encoder(element_types[1]) if element_types and len(element_types) > 1 else any_encoder
+
+        def map_(value):
+            if value is None:
+                return _NULL
+            return ttypes.ColumnValue(map_val={_map_key(key(k)): item(v) for k, v in value.items()})
+        return map_
+    elif type_ == _T.STRUCT:
+        fields = [value_encoder(t) for t in element_types or ()]
+
+        def struct(value):
+            if value is None:
+                return _NULL
+            if not fields:
+                return ttypes.ColumnValue(struct_val=[any_encoder(v) for v in value])
+            return ttypes.ColumnValue(struct_val=[encode(v) for encode, v in zip(fields, value)])
+        return struct
+    return any_encoder
+
+
+def compile_param_encoder(parameter_metadata):
+    """Return a function turning a sequence of Python parameter values into the ``ttypes.Row``
+    bound to a statement prepared with ``parameter_metadata``.
+    """
+    encoders = [value_encoder(d.type, d.elementTypes) for d in parameter_metadata or ()]
+
+    def encode(values):
+        if len(values) != len(encoders):
+            raise exc.ProgrammingError("Statement takes {} parameters, {} given".format(
+                len(encoders), len(values)))
+        return ttypes.Row(values=[encode_value(v) for encode_value, v in zip(encoders, values)])
+    return encode
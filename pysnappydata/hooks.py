@@ -0,0 +1,94 @@
+"""Instrumentation hooks called around the statements of
+:py:class:`~pysnappydata.snappydata.Cursor`, e.g. to feed a metrics system.
+
+A hook is any object with some of the callbacks of :py:class:`QueryHook`. Hooks registered
+with :py:func:`register` apply to every connection, those given to
+``Connection(hooks=[...])`` or :py:meth:`~pysnappydata.snappydata.Connection.add_hook` to one.
+
+Callbacks run on the thread executing or fetching, so they should be quick. An exception
+raised by a hook is logged and otherwise ignored.
+
+The ``stats`` passed to :py:meth:`QueryHook.after_execute` are the
+:py:attr:`~pysnappydata.snappydata.Cursor.last_query_stats` of the cursor at that point:
+
+- operation: the operation passed to ``execute``
+- prepared: whether parameters were bound to a prepared statement rather than escaped
+- cached: whether the result came from the result cache
+- escape_time: seconds spent escaping or encoding parameters
+- send_time: seconds spent sending requests
+- wait_time: seconds spent waiting for the first byte of replies
+- receive_time: seconds spent reading and decoding replies
+- build_time: seconds spent turning received rows into Python rows
+- elapsed: seconds ``execute`` took
+- bytes_received: bytes of the replies read
+- rows: rows received so far
+- batches: batches received so far
+
+The request times and bytes cover the statement's requests on the cursor's connection, and
+grow as further batches are fetched, as do the rows, batches and build time.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from builtins import object
+
+_logger = logging.getLogger(__name__)
+
+# Registered hooks, replaced rather than changed so that they are read without locking
+_registered = ()
+_registered_lock = threading.Lock()
+
+
+class QueryHook(object):
+    """Base class of hooks, whose callbacks do nothing. Override those of interest."""
+
+    def before_execute(self, cursor, operation, parameters):
+        """Called before ``cursor`` executes ``operation`` with ``parameters``, the sequence of
+        parameter sets for ``executemany``.
+        """
+
+    def after_execute(self, cursor, stats, error):
+        """Called once ``cursor`` has executed a statement and received its first batch, with
+        the query ``stats`` so far and the exception raised, ``None`` on success.
+        """
+
+    def on_batch(self, cursor, rows, nbytes):
+        """Called for every batch of ``rows`` rows a cursor receives, ``nbytes`` bytes on the
+        wire; ``0`` for batches not read from the cursor's connection.
+        """
+
+
+def register(hook):
+    """Call ``hook`` for the statements of every connection"""
+    global _registered
+    with _registered_lock:
+        if hook not in _registered:
+            _registered = _registered + (hook,)
+
+
+def unregister(hook):
+    """Stop calling a hook added with :py:func:`register`"""
+    global _registered
+    with _registered_lock:
+        _registered = tuple(h for h in _registered if h is not hook)
+
+
+def registered():
+    """Hooks added with :py:func:`register`"""
+    return _registered
+
+
+def notify(hooks, name, *args):
+    """Call the ``name`` callback of each of ``hooks`` that has one, logging errors"""
+    for hook in hooks:
+        callback = getattr(hook, name, None)
+        if callback is None:
+            continue
+        try:
+            callback(*args)
+        except Exception:
+            _logger.exception("%s hook %r failed", name, hook)
@@ -0,0 +1,298 @@
+"""File-like access to BLOB and CLOB values
+
+A result row only carries the first chunk of a large object, at most
+``constants.DEFAULT_LOB_CHUNKSIZE`` bytes or characters. :py:class:`Blob` and :py:class:`Clob`
+read the rest on demand with ``getBlobChunk``/``getClobChunk`` and so never hold more than
+one chunk in memory. Cursors created with ``lazy_lobs=True`` return them for LOB columns:
+
+.. code-block:: python
+
+    cursor = connection.cursor(lazy_lobs=True)
+    cursor.execute('SELECT doc FROM documents WHERE id = 1')
+    with cursor.fetchone()[0] as blob, open('doc.pdf', 'wb') as f:
+        shutil.copyfileobj(blob, f)
+
+Reading is forward only. The server frees the LOB once its last chunk is read; closing the
+object before that frees it with ``freeLob``. A LOB belongs to the server session it was read
+in and cannot be read after a failover.
+
+In the other direction, a file object, ``memoryview`` or ``mmap`` bound to a BLOB or CLOB
+parameter of a prepared statement (and any value longer than one chunk) is uploaded with
+``sendBlobChunk``/``sendClobChunk`` one chunk at a time and then bound by its LOB id:
+
+.. code-block:: python
+
+    with open('doc.pdf', 'rb') as f:
+        cursor.execute('INSERT INTO documents VALUES (%s, %s)', (1, f))
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import codecs
+import io
+import mmap
+
+from builtins import bytes
+from builtins import str
+
+from SDTCLIService import constants
+
+
+def streamable(value, chunk_size=constants.DEFAULT_LOB_CHUNKSIZE):
+    """Whether a LOB parameter value should be uploaded in chunks rather than bound inline"""
+    if hasattr(value, 'read') or isinstance(value, (memoryview, mmap.mmap)):
+        return True
+    return isinstance(value, (bytes, bytearray, str)) and len(value) > chunk_size
+
+
+def chunks(source, clob=False, chunk_size=constants.DEFAULT_LOB_CHUNKSIZE):
+    """Split ``source`` into ``(data, last)`` pieces of at most ``chunk_size`` bytes, or
+    characters for a CLOB, holding only about one piece in memory at a time.
+
+    ``source`` is a file object, anything supporting the buffer protocol (bytes,
+    ``memoryview``, ``mmap``) or, for a CLOB, a string. Binary data bound to a CLOB is decoded
+    as UTF-8.
+    """
+    if isinstance(source, _BUFFERS):
+        if clob:
+            return _file_chunks(io.BytesIO(source), clob, chunk_size)
+        view = memoryview(source)
+        if view.itemsize != 1:
+            view = view.cast('B')
+        return ((view[start:end].tobytes(), last) for start, end, last in _ranges(len(view), chunk_size))
+    if hasattr(source, 'read'):
+        if not clob and _seekable(source):
+            return _sized_file_chunks(source, chunk_size)
+        return _file_chunks(source, clob, chunk_size)
+    return ((source[start:end], last) for start, end, last in _ranges(len(source), chunk_size))
+
+
+_BUFFERS = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+def _ranges(length, chunk_size):
+    if length == 0:
+        yield 0, 0, True
+    for start in range(0, length, chunk_size):
+        end = min(start + chunk_size, length)
+        yield start, end, end >= length
+
+
+def _seekable(source):
+    try:
+        return source.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def _sized_file_chunks(source, chunk_size):
+    """Chunks of a seekable binary file, whose remaining size tells which chunk is the last"""
+    position = source.tell()
+    source.seek(0, io.SEEK_END)
+    remaining = source.tell() - position
+    source.seek(position)
+    for start, end, last in _ranges(remaining, chunk_size):
+        yield source.read(end - start), last
+
+
+def _file_chunks(source, clob, chunk_size):
+    """Chunks of a stream of unknown length, reading one chunk ahead to find the last"""
+    decoder = codecs.getincrementaldecoder('utf-8')() if clob else None
+
+    def read():
+        data = source.read(chunk_size)
+        if decoder is not None and not isinstance(data, str):
+            data = decoder.decode(data, final=not data)
+        return data
+
+    data = read()
+    while True:
+        following = read() if data else data
+        yield data, not following
+        if not following:
+            return
+        data = following
+
+
+class _LobReader(object):
+    """Chunked forward reading shared by :py:class:`Blob` and :py:class:`Clob`"""
+
+    _clob = False
+
+    def _init(self, connection, chunk, chunk_size):
+        self._connection = connection
+        self._session = connection.session
+        self._chunk_size = chunk_size or constants.DEFAULT_LOB_CHUNKSIZE
+        self._lob_id = chunk.lobId
+        self._buffer = chunk.chunk if chunk.chunk is not None else ('' if self._clob else b'')
+        self._buffer_pos = 0
+        self._position = chunk.offset or 0
+        # Whether the server has sent the last chunk, and with it freed the LOB
+        self._last = bool(chunk.last) or chunk.lobId is None
+        if chunk.totalLength is not None:
+            self._length = chunk.totalLength
+        elif self._last:
+            self._length = self._position + len(self._buffer)
+        else:
+            self._length = None
+
+    @property
+    def length(self):
+        """Total length in bytes (BLOB) or characters (CLOB), ``None`` if the server did not say"""
+        return self._length
+
+    def _take(self, size):
+        """Up to ``size`` (all remaining if negative) bytes or characters from the current
+        position, fetching the next chunk if the buffered one is used up; empty at the end.
+        """
+        if self._buffer_pos >= len(self._buffer):
+            if self._last or self.closed:
+                return self._buffer[:0]
+            self._fetch(size)
+        end = len(self._buffer) if size < 0 else self._buffer_pos + size
+        data = self._buffer[self._buffer_pos:end]
+        self._buffer_pos += len(data)
+        self._position += len(data)
+        return data
+
+    def _fetch(self, size):
+        want = max(size, self._chunk_size)
+        if self._length is not None:
+            want = min(want, self._length - self._position)
+        free_at_end = self._length is not None and self._position + want >= self._length
+        get = self._connection.get_clob_chunk if self._clob else self._connection.get_blob_chunk
+        chunk = get(self._lob_id, self._position, want, free_at_end, self._session)
+        self._buffer = chunk.chunk or self._buffer[:0]
+        self._buffer_pos = 0
+        self._last = bool(chunk.last) or free_at_end or not chunk.chunk
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed LOB")
+
+    def _read(self, size):
+        self._check_open()
+        if size is None or size < 0:
+            parts = []
+            while True:
+                data = self._take(-1)
+                if not data:
+                    return self._buffer[:0].join(parts)
+                parts.append(data)
+        return self._take(size)
+
+    def _free(self):
+        if not self._last:
+            self._last = True
+            self._connection.free_lob(self._lob_id, wait=False, session=self._session)
+        self._buffer = self._buffer[:0]
+        self._buffer_pos = 0
+
+    def __del__(self):
+        # No request from a finalizer, which may run in the middle of another one; the server
+        # frees the LOB with the session
+        pass
+
+
+class Blob(_LobReader, io.RawIOBase):
+    """Read-only binary file over a BLOB value. Supports ``read``, ``readinto`` and iteration
+    by line like any ``RawIOBase``; wrap it in ``io.BufferedReader`` for small reads.
+    """
+
+    def __init__(self, connection, chunk, chunk_size=None):
+        io.RawIOBase.__init__(self)
+        self._init(connection, chunk, chunk_size)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        """Read up to ``len(b)`` bytes into the writable buffer ``b``; return the count"""
+        self._check_open()
+        view = memoryview(b)
+        if view.itemsize != 1:
+            view = view.cast('B')
+        total = 0
+        while total < len(view):
+            data = self._take(len(view) - total)
+            if not data:
+                break
+            view[total:total + len(data)] = data
+            total += len(data)
+        return total
+
+    def read(self, size=-1):
+        return self._read(size)
+
+    def readall(self):
+        return self._read(-1)
+
+    def close(self):
+        """Free the LOB on the server if it was not read to the end"""
+        if not self.closed:
+            self._free()
+        io.RawIOBase.close(self)
+
+    def __bytes__(self):
+        return self.read()
+
+
+class Clob(_LobReader, io.TextIOBase):
+    """Read-only text file over a CLOB, JSON or SQLXML value"""
+
+    _clob = True
+
+    def __init__(self, connection, chunk, chunk_size=None):
+        io.TextIOBase.__init__(self)
+        self._init(connection, chunk, chunk_size)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        """Read ``size`` characters, fewer only at the end, or all remaining if negative"""
+        if size is None or size < 0:
+            return self._read(size)
+        self._check_open()
+        parts = []
+        count = 0
+        while count < size:
+            data = self._take(size - count)
+            if not data:
+                break
+            parts.append(data)
+            count += len(data)
+        return ''.join(parts)
+
+    def readline(self, size=-1):
+        self._check_open()
+        parts = []
+        count = 0
+        while size < 0 or count < size:
+            data = self._peek_line(size - count if size >= 0 else -1)
+            if not data:
+                break
+            parts.append(data)
+            count += len(data)
+            if data.endswith('\n'):
+                break
+        return ''.join(parts)
+
+    def _peek_line(self, size):
+        """Like :py:meth:`_take` but stops after a newline"""
+        if self._buffer_pos >= len(self._buffer):
+            if self._last or self.closed:
+                return ''
+            self._fetch(size)
+        newline = self._buffer.find('\n', self._buffer_pos)
+        end = len(self._buffer) if newline < 0 else newline + 1
+        if size >= 0:
+            end = min(end, self._buffer_pos + size)
+        return self._take(end - self._buffer_pos)
+
+    def close(self):
+        """Free the LOB on the server if it was not read to the end"""
+        if not self.closed:
+            self._free()
+        io.TextIOBase.close(self)
@@ -0,0 +1,251 @@
+"""Process-wide cache of the servers behind a locator
+
+Instead of asking the locator for a server on every connect, :py:class:`ServerList` fetches all
+servers with ``getAllServersWithPreferredServer`` once and refreshes the list in a background
+thread every ``refresh_interval`` seconds. Connections then pick a server locally with one of
+the :py:data:`POLICIES`; the locator is only contacted again on refresh or when a server fails.
+
+.. code-block:: python
+
+    from pysnappydata import locator
+    servers = locator.server_list('localhost', 1527)
+    host, port = servers.choose(locator.LEAST_CONNECTIONS)
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import itertools
+import logging
+import random
+import threading
+import time
+
+from builtins import object
+from thrift.transport.TTransport import TTransportException
+
+from SDTCLIService import LocatorService
+from pysnappydata import exc
+from pysnappydata import metrics
+from pysnappydata import transport as _transport
+
+_logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = 'round_robin'
+LEAST_CONNECTIONS = 'least_connections'
+POWER_OF_TWO = 'power_of_two'
+POLICIES = (ROUND_ROBIN, LEAST_CONNECTIONS, POWER_OF_TWO)
+
+DEFAULT_REFRESH_INTERVAL = 30.0
+
+_lists = {}
+_lists_lock = threading.Lock()
+
+
+def fetch_servers(host, port, transport=_transport.TRANSPORT_BUFFERED,
+                  buffer_size=_transport.DEFAULT_BUFFER_SIZE):
+    """Ask the locator at ``host:port`` for all servers, preferred server first.
+
+    Returns a list of ``(host, port)`` tuples.
+    """
+    _logger.info("connect to locator %s:%d", host, port)
+    start = time.time()
+    try:
+        locator_transport = _transport.open_transport(host, port, transport, buffer_size)
+        try:
+            locator = LocatorService.Client(_transport.make_protocol(locator_transport))
+            servers = locator.getAllServersWithPreferredServer(
+                serverTypes=set([LocatorService.ServerType.THRIFT_SNAPPY_CP]),
+                serverGroups=None,
+                failedServers=None)
+        finally:
+            locator_transport.close()
+    except Exception:
+        metrics.locator_lookup(time.time() - start, False)
+        raise
+    metrics.locator_lookup(time.time() - start, True)
+    return [(server.hostName, server.port) for server in servers]
+
+
+def server_list(host, port, transport=_transport.TRANSPORT_BUFFERED,
+                buffer_size=_transport.DEFAULT_BUFFER_SIZE, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+    """The process-wide :py:class:`ServerList` of the locator at ``host:port``.
+
+    ``refresh_interval`` only applies when the list is created by this call.
+    """
+    key = (host, port, transport, buffer_size)
+    with _lists_lock:
+        servers = _lists.get(key)
+        if servers is None or servers.closed:
+            servers = _lists[key] = ServerList(host, port, transport, buffer_size, refresh_interval)
+        return servers
+
+
+class ServerList(object):
+    """Servers behind one locator, kept fresh by a background thread
+
+    The first call to :py:meth:`servers` or :py:meth:`choose` fetches the list and starts the
+    refresh thread. A server reported with :py:meth:`failed` is skipped for ``refresh_interval``
+    seconds, while other servers are left, and the list is refreshed right away. Use
+    :py:func:`server_list` to share one instance per locator.
+    """
+
+    def __init__(self, host, port, transport=_transport.TRANSPORT_BUFFERED,
+                 buffer_size=_transport.DEFAULT_BUFFER_SIZE, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self._host = host
+        self._port = port
+        self._transport = transport
+        self._buffer_size = buffer_size
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        # Serializes locator calls so that concurrent connects do not all refresh at once
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._servers = None
+        # Time each failed server was reported, by server
+        self._failed = {}
+        # Open connections per server, from connected() and disconnected()
+        self._connections = collections.Counter()
+        self._next = itertools.count()
+        self._refreshes = 0
+        self._refresh_errors = 0
+        self._refreshed_at = None
+        self._choices = 0
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _refresh(self, generation=None):
+        """Fetch the server list unless another refresh completed since ``generation``"""
+        with self._refresh_lock:
+            if generation is not None and self._refreshes != generation:
+                return
+            with self._lock:
+                # Failures are forgotten after a refresh interval in case the server came back
+                expired = time.time() - (self._refresh_interval or 0)
+                self._failed = dict((server, at) for server, at in self._failed.items() if at > expired)
+            try:
+                servers = fetch_servers(self._host, self._port, self._transport, self._buffer_size)
+            except Exception:
+                with self._lock:
+                    self._refresh_errors += 1
+                raise
+            with self._lock:
+                if servers:
+                    self._servers = servers
+                self._refreshes += 1
+                self._refreshed_at = time.time()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._refresh_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self._refresh()
+            except Exception:
+                _logger.warning("refreshing servers from locator %s:%d failed", self._host, self._port,
+                                exc_info=True)
+
+    def _ensure(self):
+        if self._servers is None:
+            self._refresh(self._refreshes)
+        if self._thread is None and self._refresh_interval:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run,
+                                                    name='locator-{}:{}'.format(self._host, self._port))
+                    self._thread.daemon = True
+                    self._thread.start()
+
+    def servers(self):
+        """All known servers as ``(host, port)`` tuples, preferred server first"""
+        self._ensure()
+        with self._lock:
+            return list(self._servers or ())
+
+    def refresh(self):
+        """Fetch the server list from the locator now"""
+        self._refresh()
+
+    def choose(self, policy=ROUND_ROBIN, exclude=()):
+        """Pick a server with ``policy`` from :py:data:`POLICIES`, avoiding the ``(host, port)``
+        in ``exclude`` and servers reported failed.
+
+        When no server is left the locator is asked again, and servers reported failed are tried
+        after all if it still has no other. ``TTransportException`` is raised if no server remains.
+        """
+        if policy not in POLICIES:
+            raise exc.ProgrammingError("Unknown load balancing policy {!r}".format(policy))
+        self._ensure()
+        candidates = self._candidates(exclude)
+        if not candidates:
+            self._refresh(self._refreshes)
+            candidates = self._candidates(exclude) or self._candidates(exclude, skip_failed=False)
+        if not candidates:
+            raise TTransportException(TTransportException.NOT_OPEN,
+                                      "No server available from locator {}:{}".format(self._host, self._port))
+        with self._lock:
+            self._choices += 1
+            if policy == ROUND_ROBIN:
+                return candidates[next(self._next) % len(candidates)]
+            if len(candidates) > 1 and policy == POWER_OF_TWO:
+                candidates = random.sample(candidates, 2)
+            # Ties go to the locator's preferred order
+            return min(candidates, key=lambda server: self._connections[server])
+
+    def _candidates(self, exclude, skip_failed=True):
+        with self._lock:
+            return [server for server in self._servers or ()
+                    if not (skip_failed and server in self._failed) and server not in exclude]
+
+    def connected(self, server):
+        """Count a connection opened to ``server``"""
+        with self._lock:
+            self._connections[server] += 1
+
+    def disconnected(self, server):
+        """Count a connection to ``server`` closed"""
+        with self._lock:
+            self._connections[server] -= 1
+            if self._connections[server] <= 0:
+                del self._connections[server]
+
+    def failed(self, server):
+        """Skip ``server`` for a while and refresh the list in the background"""
+        with self._lock:
+            self._failed[server] = time.time()
+        self._wakeup.set()
+
+    def close(self):
+        """Stop the refresh thread; :py:func:`server_list` creates a new list afterwards"""
+        self._closed = True
+        self._wakeup.set()
+
+    @property
+    def stats(self):
+        """Statistics of the server list.
+
+        - servers: known servers, preferred first
+        - failed: servers skipped because they failed
+        - connections: open connections per server, as reported to :py:meth:`connected`
+        - refreshes: successful locator calls
+        - refresh_errors: failed locator calls
+        - age: seconds since the last successful refresh, ``None`` before the first
+        - choices: servers picked by :py:meth:`choose`
+        """
+        with self._lock:
+            return {
+                'servers': list(self._servers or ()),
+                'failed': sorted(self._failed),
+                'connections': dict(self._connections),
+                'refreshes': self._refreshes,
+                'refresh_errors': self._refresh_errors,
+                'age': time.time() - self._refreshed_at if self._refreshed_at is not None else None,
+                'choices': self._choices,
+            }
@@ -0,0 +1,321 @@
+"""Process-wide driver metrics, exposed in the Prometheus text format
+
+Metrics are off until :py:func:`enable` is called. While off, statements run without any
+instrumentation hook and the other update sites return at once, so the cost is a function call
+on connect, locator lookups, pool waits and failovers.
+
+.. code-block:: python
+
+    from pysnappydata import metrics
+    metrics.enable()
+    ...
+    print(metrics.render_prometheus())
+
+Counters:
+
+- ``snappydata_connections_opened_total``, ``snappydata_connections_failed_total``: server
+  sessions opened and failed to open, failovers included
+- ``snappydata_locator_lookups_total{outcome}``: server list requests to locators
+- ``snappydata_queries_total{type,outcome}``: statements executed by cursors, by the first
+  keyword of the statement (``select``, ``insert``, ``update``, ``delete``, ``put``, ``ddl``,
+  ``call`` or ``other``) and ``outcome`` ``ok`` or ``error``
+- ``snappydata_rows_fetched_total``, ``snappydata_bytes_received_total``: result rows and their
+  bytes on the wire, as batches arrive
+- ``snappydata_retries_total{kind}``: attempts to fail over to another server (``failover``),
+  requests repeated on it (``replay``) and servers tried on connect after the first could not be
+  reached (``connect``)
+
+Histograms, in seconds:
+
+- ``snappydata_connect_seconds``: opening a server session
+- ``snappydata_locator_lookup_seconds``: locator requests
+- ``snappydata_query_seconds{type}``: executing a statement up to its first batch
+- ``snappydata_pool_wait_seconds``: waiting for a pooled connection, for checkouts that waited
+
+Histograms keep HDR-style log-linear buckets: every power of two of microseconds is split into
+16 buckets, so any recorded time is known within 1/16 of its value whatever its magnitude.
+:py:func:`snapshot` derives percentiles from them; the Prometheus ``le`` buckets are
+:py:data:`PROMETHEUS_BUCKETS`, counted to within the same precision.
+
+Each update takes one short lock. Metrics are global to the process: connections, pools and
+threads all add to the same values.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import re
+import threading
+
+from builtins import object
+
+from pysnappydata import hooks
+
+PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_COUNTER = 'counter'
+_HISTOGRAM = 'histogram'
+
+# Type and help text of every metric, in exposition order
+_METRICS = (
+    ('snappydata_connections_opened_total', _COUNTER, "Server sessions opened"),
+    ('snappydata_connections_failed_total', _COUNTER, "Server sessions that failed to open"),
+    ('snappydata_connect_seconds', _HISTOGRAM, "Time to open a server session"),
+    ('snappydata_locator_lookups_total', _COUNTER, "Server list requests to locators"),
+    ('snappydata_locator_lookup_seconds', _HISTOGRAM, "Time of server list requests to locators"),
+    ('snappydata_queries_total', _COUNTER, "Statements executed by cursors"),
+    ('snappydata_query_seconds', _HISTOGRAM, "Time to execute a statement and receive its first batch"),
+    ('snappydata_rows_fetched_total', _COUNTER, "Result rows received"),
+    ('snappydata_bytes_received_total', _COUNTER, "Bytes of result batches received"),
+    ('snappydata_pool_wait_seconds', _HISTOGRAM, "Time spent waiting for a pooled connection"),
+    ('snappydata_retries_total', _COUNTER, "Failover attempts, replayed requests and connect retries"),
+)
+
+# Counters without labels, shown as 0 before their first update
+_UNLABELLED = frozenset(['snappydata_connections_opened_total', 'snappydata_connections_failed_total',
+                         'snappydata_rows_fetched_total', 'snappydata_bytes_received_total'])
+
+# Histogram bucket layout: values below 2 * _SUB microseconds get a bucket each, then each
+# power of two is split into _SUB buckets
+_SUB_BITS = 4
+_SUB = 1 << _SUB_BITS
+
+_STATEMENT = re.compile(r'\s*\(*\s*(\w+)')
+_STATEMENT_TYPES = {
+    'select': 'select', 'with': 'select', 'values': 'select',
+    'insert': 'insert', 'update': 'update', 'delete': 'delete', 'put': 'put',
+    'create': 'ddl', 'drop': 'ddl', 'alter': 'ddl', 'truncate': 'ddl',
+    'call': 'call',
+}
+
+enabled = False
+
+_lock = threading.Lock()
+# Values by (name, labels), labels being a sorted tuple of (label, value) pairs
+_counters = {}
+_histograms = {}
+
+
+def _bucket(micros):
+    """Index of the histogram bucket of a value in whole microseconds"""
+    if micros < 2 * _SUB:
+        return micros
+    shift = micros.bit_length() - _SUB_BITS - 1
+    return (shift + 1) * _SUB + (micros >> shift) - _SUB
+
+
+def _bucket_bounds(index):
+    """``[lower, upper)`` microseconds of a histogram bucket"""
+    if index < 2 * _SUB:
+        return index, index + 1
+    shift = index // _SUB - 1
+    top = index % _SUB + _SUB
+    return top << shift, (top + 1) << shift
+
+
+class _Histogram(object):
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        # Sparse: most buckets stay empty
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = _bucket(int(seconds * 1e6))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Midpoint of the bucket holding the ``fraction`` quantile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lower, upper = _bucket_bounds(index)
+                return min((lower + upper) / 2e6, self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Number of values up to each of ``bounds`` seconds, judged by their bucket midpoint"""
+        midpoints = sorted((sum(_bucket_bounds(index)) / 2e6, count) for index, count in self.counts.items())
+        result = []
+        seen = 0
+        i = 0
+        for bound in bounds:
+            while i < len(midpoints) and midpoints[i][0] <= bound:
+                seen += midpoints[i][1]
+                i += 1
+            result.append(seen)
+        return result
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def _inc(key, value):
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(key, seconds):
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = _Histogram()
+    histogram.observe(seconds)
+
+
+def inc(name, value=1, **labels):
+    """Add ``value`` to counter ``name`` with ``labels``, if metrics are enabled"""
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _inc(key, value)
+
+
+def observe(name, seconds, **labels):
+    """Record ``seconds`` in histogram ``name`` with ``labels``, if metrics are enabled"""
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _observe(key, seconds)
+
+
+def connection_opened(seconds, ok):
+    """Record an attempt to open a server session that took ``seconds``"""
+    if not enabled:
+        return
+    with _lock:
+        if ok:
+            _inc(('snappydata_connections_opened_total', ()), 1)
+            _observe(('snappydata_connect_seconds', ()), seconds)
+        else:
+            _inc(('snappydata_connections_failed_total', ()), 1)
+
+
+def locator_lookup(seconds, ok):
+    """Record a server list request to a locator that took ``seconds``"""
+    if not enabled:
+        return
+    with _lock:
+        _inc(('snappydata_locator_lookups_total', (('outcome', 'ok' if ok else 'error'),)), 1)
+        _observe(('snappydata_locator_lookup_seconds', ()), seconds)
+
+
+def statement_type(operation):
+    """Label of the kind of statement ``operation`` is, from its first keyword"""
+    match = _STATEMENT.match(operation or '')
+    return _STATEMENT_TYPES.get(match.group(1).lower(), 'other') if match else 'other'
+
+
+class _MetricsHook(hooks.QueryHook):
+    """Records the statements of all cursors while metrics are enabled"""
+
+    def after_execute(self, cursor, stats, error):
+        type_ = statement_type(stats['operation'])
+        outcome = (('outcome', 'error' if error is not None else 'ok'), ('type', type_))
+        with _lock:
+            _inc(('snappydata_queries_total', outcome), 1)
+            _observe(('snappydata_query_seconds', (('type', type_),)), stats['elapsed'])
+
+    def on_batch(self, cursor, rows, nbytes):
+        with _lock:
+            _inc(('snappydata_rows_fetched_total', ()), rows)
+            _inc(('snappydata_bytes_received_total', ()), nbytes)
+
+
+_hook = _MetricsHook()
+
+
+def enable():
+    """Start recording metrics"""
+    global enabled
+    enabled = True
+    hooks.register(_hook)
+
+
+def disable():
+    """Stop recording metrics; the values recorded so far are kept"""
+    global enabled
+    enabled = False
+    hooks.unregister(_hook)
+
+
+def reset():
+    """Forget all recorded values"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _series(name, labels, extra=()):
+    pairs = labels + extra
+    if not pairs:
+        return name
+    return '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs))
+
+
+def _escape(value):
+    return '{}'.format(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def snapshot():
+    """Current values, as a dict of counter values and one of histogram summaries (``count``,
+    ``sum``, ``max``, ``p50``, ``p90``, ``p99``), keyed by series as written by
+    :py:func:`render_prometheus`, e.g. ``snappydata_queries_total{outcome="ok",type="select"}``.
+    """
+    with _lock:
+        counters = dict((_series(name, labels), value) for (name, labels), value in _counters.items())
+        histograms = {}
+        for (name, labels), histogram in _histograms.items():
+            histograms[_series(name, labels)] = {
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'max': histogram.max,
+                'p50': histogram.percentile(0.5),
+                'p90': histogram.percentile(0.9),
+                'p99': histogram.percentile(0.99),
+            }
+    return {'counters': counters, 'histograms': histograms}
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else '{}'.format(value)
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format, version 0.0.4"""
+    lines = []
+    with _lock:
+        for name, kind, help_text in _METRICS:
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            if kind == _COUNTER:
+                samples = sorted((labels, value) for (n, labels), value in _counters.items() if n == name)
+                if not samples and name in _UNLABELLED:
+                    samples = [((), 0)]
+                for labels, value in samples:
+                    lines.append('{} {}'.format(_series(name, labels), _number(value)))
+            else:
+                for labels, histogram in sorted((labels, h) for (n, labels), h in _histograms.items()
+                                                if n == name):
+                    for bound, count in zip(PROMETHEUS_BUCKETS, histogram.cumulative(PROMETHEUS_BUCKETS)):
+                        lines.append('{} {}'.format(_series(name + '_bucket', labels, (('le', repr(bound)),)),
+                                                    count))
+                    lines.append('{} {}'.format(_series(name + '_bucket', labels, (('le', '+Inf'),)),
+                                                histogram.count))
+                    lines.append('{} {}'.format(_series(name + '_sum', labels), repr(histogram.sum)))
+                    lines.append('{} {}'.format(_series(name + '_count', labels), histogram.count))
+    return '\n'.join(lines) + '\n'
+
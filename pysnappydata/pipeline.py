@@ -0,0 +1,148 @@
+"""Package private pipelined Thrift client. Do not use directly.
+
+The generated ``SnappyDataService.Client`` sends a request and then blocks reading its reply,
+always with sequence id 0. :py:class:`PipelinedClient` instead tags every request with its
+own sequence id so that several can be in flight on one socket. Replies are read in whatever
+order they arrive and matched to their requests by sequence id.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import logging
+import time
+
+from thrift.Thrift import TApplicationException
+from thrift.Thrift import TMessageType
+
+from SDTCLIService import SnappyDataService
+from pysnappydata import wiredecode
+
+_logger = logging.getLogger(__name__)
+
+_MAX_SEQID = 0x7fffffff
+
+
+class RequestTimes(object):
+    """Running totals of the seconds spent sending requests, waiting for the first byte of their
+    replies and reading the rest of the replies.
+    """
+
+    __slots__ = ('send', 'wait', 'receive')
+
+    def __init__(self):
+        self.send = 0.0
+        self.wait = 0.0
+        self.receive = 0.0
+
+
+class PipelinedClient(SnappyDataService.Client):
+    """``SnappyDataService.Client`` that can keep several requests in flight
+
+    :py:meth:`submit` sends a request and returns its sequence id without waiting; :py:meth:`wait`
+    returns its result, reading and setting aside replies to earlier requests on the way. The
+    plain generated methods (``client.execute(...)`` etc.) must not be used while requests are
+    in flight, since they read the next reply whatever it belongs to.
+
+    Replies are decoded in the ``decode`` mode of :py:mod:`~pysnappydata.wiredecode`. The time
+    spent on requests is added to ``times``, a :py:class:`RequestTimes` that may outlive the client.
+
+    Not thread safe; callers serialize access, e.g. with ``Connection._lock``.
+    """
+
+    def __init__(self, iprot, oprot=None, decode=wiredecode.OBJECTS, times=None):
+        SnappyDataService.Client.__init__(self, iprot, oprot)
+        self._decode = decode
+        self.times = times if times is not None else RequestTimes()
+        # Method name of every request whose reply has not been read yet, by sequence id
+        self._in_flight = {}
+        # Replies read while waiting for another one, as (result, error), by sequence id
+        self._replies = {}
+        # Requests whose reply is read and dropped
+        self._ignored = set()
+
+    @property
+    def in_flight(self):
+        """Number of requests whose reply has not been read yet"""
+        return len(self._in_flight)
+
+    def submit(self, name, *args):
+        """Send request ``name`` and return its sequence id, or ``None`` for a oneway request"""
+        self._seqid = self._seqid % _MAX_SEQID + 1
+        start = time.time()
+        getattr(self, 'send_' + name)(*args)
+        self.times.send += time.time() - start
+        if not hasattr(self, 'recv_' + name):
+            return None
+        self._in_flight[self._seqid] = name
+        return self._seqid
+
+    def wait(self, seqid):
+        """Return the result of request ``seqid`` or raise its error"""
+        if seqid is None:
+            return None
+        while seqid not in self._replies:
+            if seqid not in self._in_flight:
+                raise TApplicationException(TApplicationException.BAD_SEQUENCE_ID,
+                                            "No request with sequence id {}".format(seqid))
+            self._read_reply()
+        result, error = self._replies.pop(seqid)
+        if error is not None:
+            raise error
+        return result
+
+    def call(self, name, *args):
+        """Send request ``name`` and wait for its result"""
+        return self.wait(self.submit(name, *args))
+
+    def ignore(self, seqid):
+        """Drop the reply of request ``seqid`` when it arrives; errors are only logged"""
+        if seqid is None:
+            return
+        if self._replies.pop(seqid, None) is None:
+            self._ignored.add(seqid)
+
+    def drain(self):
+        """Read the replies of all requests in flight"""
+        while self._in_flight:
+            self._read_reply()
+
+    def _read_reply(self):
+        iprot = self._iprot
+        start = time.time()
+        fname, mtype, rseqid = iprot.readMessageBegin()
+        received = time.time()
+        self.times.wait += received - start
+        name = self._in_flight.pop(rseqid, None)
+        if name is None:
+            raise TApplicationException(TApplicationException.BAD_SEQUENCE_ID,
+                                        "{} reply with unexpected sequence id {}".format(fname, rseqid))
+        if mtype == TMessageType.EXCEPTION:
+            error = TApplicationException()
+            error.read(iprot)
+            iprot.readMessageEnd()
+            reply = (None, error)
+        else:
+            reply = self._read_result(name, iprot)
+        self.times.receive += time.time() - received
+        if rseqid in self._ignored:
+            self._ignored.discard(rseqid)
+            if reply[1] is not None:
+                _logger.info("ignored error in reply to %s: %s", name, reply[1])
+        else:
+            self._replies[rseqid] = reply
+
+    def _read_result(self, name, iprot):
+        """Decode the generated ``<name>_result`` struct into a (result, error) pair"""
+        result = wiredecode.read_result(name, iprot, self._decode)
+        iprot.readMessageEnd()
+        for spec in result.thrift_spec[1:]:
+            error = getattr(result, spec[2]) if spec is not None else None
+            if error is not None:
+                return None, error
+        if result.thrift_spec[0] is None:
+            return None, None
+        if result.success is not None:
+            return result.success, None
+        return None, TApplicationException(TApplicationException.MISSING_RESULT,
+                                           "{} failed: unknown result".format(name))
@@ -0,0 +1,272 @@
+"""Thread-safe pool of :py:class:`~pysnappydata.snappydata.Connection` objects
+
+Reusing connections saves the ``openConnection`` round trip and authentication for every unit of
+work. With a locator, new connections are spread over all servers it reports.
+
+.. code-block:: python
+
+    from pysnappydata import pool
+    connections = pool.ConnectionPool('localhost', 1527, locator=True, max_size=8)
+    with connections.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM test')
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from builtins import object
+
+from pysnappydata import exc
+from pysnappydata import metrics
+from pysnappydata import snappydata
+
+_logger = logging.getLogger(__name__)
+
+_Idle = collections.namedtuple('_Idle', ['connection', 'since'])
+
+
+class ConnectionPool(object):
+    """Bounded pool of connections to one server, or to the servers behind a locator
+
+    - ``min_size`` connections are opened up front and kept even when idle.
+    - At most ``max_size`` connections are open at once. :py:meth:`acquire` waits up to
+      ``timeout`` seconds (forever if ``None``) for one to be released, then raises
+      :py:class:`~pysnappydata.exc.OperationalError`.
+    - Connections idle for more than ``idle_timeout`` seconds beyond ``min_size`` are closed.
+    - With ``validate``, a connection is checked with :py:meth:`Connection.reset` on checkout and
+      replaced if it turns out to be broken.
+    - With ``locator``, ``host:port`` is a locator and connections are opened as with
+      ``Connection(locator=True)``: each picks a server from the process-wide cached server list
+      of :py:mod:`pysnappydata.locator` with the ``load_balance`` policy, by default the server
+      with the fewest connections from this process, and fails over to another server when its
+      own is lost.
+
+    Other keyword arguments are passed on to :py:class:`~pysnappydata.snappydata.Connection`.
+    """
+
+    def __init__(self, host, port=1528, min_size=0, max_size=10, idle_timeout=300.0, timeout=None,
+                 validate=True, locator=False, **kwargs):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise exc.ProgrammingError("Invalid pool size {}..{}".format(min_size, max_size))
+        self._host = host
+        self._port = port
+        self._min_size = min_size
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._validate = validate
+        self._locator = locator
+        self._kwargs = kwargs
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        # id() of the connections handed out by acquire and not yet released
+        self._checked_out = set()
+        # Every open connection, by id(connection)
+        self._connections = {}
+        self._opening = 0
+        self._closed = False
+        self._created = 0
+        self._discarded = 0
+        self._expired = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._busy_time = 0.0
+        self._busy_since = time.time()
+        self._started = self._busy_since
+        for _ in range(min_size):
+            connection = self._open()
+            with self._cond:
+                self._idle.append(_Idle(connection, time.time()))
+
+    def _open(self):
+        """Open a new connection; the caller must have reserved a slot in ``self._opening``"""
+        connection = snappydata.Connection(self._host, self._port, locator=self._locator, **self._kwargs)
+        with self._cond:
+            self._connections[id(connection)] = connection
+            self._created += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._cond:
+            self._connections.pop(id(connection), None)
+            self._cond.notify()
+        try:
+            connection.close()
+        except Exception:
+            _logger.debug("error closing pooled connection", exc_info=True)
+
+    def _account_busy(self):
+        """Integrate the number of checked out connections over time, under ``self._cond``"""
+        now = time.time()
+        self._busy_time += self._in_use() * (now - self._busy_since)
+        self._busy_since = now
+
+    def _in_use(self):
+        return len(self._connections) - len(self._idle)
+
+    def _expire_idle(self):
+        """Close connections idle for longer than ``idle_timeout``, under ``self._cond``"""
+        expired = []
+        deadline = time.time() - self._idle_timeout
+        while self._idle and len(self._connections) > self._min_size and self._idle[0].since < deadline:
+            expired.append(self._idle.popleft().connection)
+            self._connections.pop(id(expired[-1]), None)
+            self._expired += 1
+        return expired
+
+    def _healthy(self, connection):
+        if not self._validate:
+            return True
+        try:
+            connection.reset()
+            return True
+        except Exception:
+            _logger.info("discarding broken pooled connection", exc_info=True)
+            return False
+
+    def acquire(self, timeout=-1):
+        """Check out a connection, opening one if none is idle and the pool is not full.
+
+        ``timeout`` overrides the pool's wait timeout. Hand the connection back with
+        :py:meth:`release`.
+        """
+        timeout = self._timeout if timeout == -1 else timeout
+        while True:
+            connection = self._checkout(timeout)
+            if connection is None:
+                try:
+                    connection = self._open()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                with self._cond:
+                    self._checked_out.add(id(connection))
+                return connection
+            if self._healthy(connection):
+                with self._cond:
+                    self._checked_out.add(id(connection))
+                return connection
+            with self._cond:
+                self._discarded += 1
+            self._discard(connection)
+
+    def _checkout(self, timeout):
+        """Take an idle connection, or reserve a slot to open one and return ``None``"""
+        with self._cond:
+            started = None
+            while True:
+                if self._closed:
+                    raise exc.OperationalError("Connection pool is closed")
+                for expired in self._expire_idle():
+                    self._cond.release()
+                    try:
+                        self._discard(expired)
+                    finally:
+                        self._cond.acquire()
+                self._account_busy()
+                if self._idle:
+                    connection = self._idle.pop().connection
+                    break
+                if len(self._connections) + self._opening < self._max_size:
+                    self._opening += 1
+                    connection = None
+                    break
+                if started is None:
+                    started = time.time()
+                    self._waits += 1
+                remaining = None if timeout is None else started + timeout - time.time()
+                if remaining is not None and remaining <= 0:
+                    waited = time.time() - started
+                    self._wait_time += waited
+                    metrics.observe('snappydata_pool_wait_seconds', waited)
+                    raise exc.OperationalError(
+                        "Timed out waiting for a pooled connection after {} s".format(timeout))
+                self._cond.wait(remaining)
+            if started is not None:
+                waited = time.time() - started
+                self._wait_time += waited
+                metrics.observe('snappydata_pool_wait_seconds', waited)
+            self._checkouts += 1
+            return connection
+
+    def release(self, connection):
+        """Return a connection obtained from :py:meth:`acquire` to the pool. Releasing it again
+        before the next checkout raises :py:class:`~pysnappydata.exc.ProgrammingError`.
+        """
+        with self._cond:
+            if id(connection) not in self._connections:
+                raise exc.ProgrammingError("Connection does not belong to this pool")
+            if id(connection) not in self._checked_out:
+                raise exc.ProgrammingError("Connection is not checked out from this pool")
+            self._checked_out.discard(id(connection))
+            self._account_busy()
+            if not self._closed:
+                # Most recently used last: checkout takes from the right, expiry from the left
+                self._idle.append(_Idle(connection, time.time()))
+                self._cond.notify()
+                return
+        self._discard(connection)
+
+    @contextlib.contextmanager
+    def connection(self, timeout=-1):
+        """Context manager checking out a connection for the duration of the block"""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        """Close all idle connections; connections still checked out are closed on release"""
+        with self._cond:
+            self._closed = True
+            idle = [entry.connection for entry in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for connection in idle:
+            self._discard(connection)
+
+    @property
+    def stats(self):
+        """Statistics of the pool.
+
+        - size: open connections
+        - idle: connections waiting in the pool
+        - in_use: connections checked out
+        - max_size: configured maximum
+        - utilization: average fraction of ``max_size`` checked out since the pool was created
+        - checkouts: successful :py:meth:`acquire` calls
+        - waits: checkouts that had to wait for a connection to be released
+        - wait_time: total seconds spent waiting
+        - created: connections opened
+        - discarded: connections that failed validation
+        - expired: connections closed by the idle timeout
+        - servers: open connections per ``(host, port)`` of their current server
+        """
+        with self._cond:
+            self._account_busy()
+            elapsed = self._busy_since - self._started
+            return {
+                'size': len(self._connections),
+                'idle': len(self._idle),
+                'in_use': self._in_use(),
+                'max_size': self._max_size,
+                'utilization': self._busy_time / (elapsed * self._max_size) if elapsed > 0 else 0.0,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+                'created': self._created,
+                'discarded': self._discarded,
+                'expired': self._expired,
+                'servers': dict(collections.Counter((connection.hostname, connection.port)
+                                                    for connection in self._connections.values())),
+            }
@@ -0,0 +1,253 @@
+"""Client-side cache of query results
+
+A :py:class:`ResultCache` passed as ``result_cache`` to
+:py:class:`~pysnappydata.snappydata.Connection` (or to a
+:py:class:`~pysnappydata.pool.ConnectionPool`, which hands it to all its connections) keeps the
+results of read-only queries for ``ttl`` seconds. Repeating a query with the same SQL, up to
+whitespace, and the same parameters then returns the cached rows without contacting the server.
+Results are only shared by connections to the same server or locator, as the same user and
+with the same current schema, so that unqualified names resolve to the same tables.
+
+Results are stored as the compact-protocol encoding of the batches received from the server,
+so an entry takes about as many bytes as the result did on the wire and is decoded again by
+the accelerated Thrift codec on every hit. Entries are evicted least recently used first once
+``max_bytes`` is exceeded. Statements other than ``SELECT``/``VALUES``/``WITH`` executed
+through a cursor of a connection using the cache invalidate the entries that read the tables
+they modify, or the whole cache if the table cannot be determined. Changes made by other
+clients are only picked up when entries expire.
+
+.. code-block:: python
+
+    from pysnappydata import resultcache, snappydata
+    cache = resultcache.ResultCache(max_bytes=64 * 1024 * 1024, ttl=30)
+    connection = snappydata.connect('localhost', 1528, result_cache=cache)
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import re
+import threading
+import time
+
+from builtins import object
+from thrift.transport.TTransport import TMemoryBuffer
+
+from pysnappydata import transport as _transport
+from pysnappydata import wiredecode
+
+_Entry = collections.namedtuple('_Entry', ['batches', 'nbytes', 'tables', 'expires'])
+
+# Whitespace outside of string literals and quoted identifiers
+_WHITESPACE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+
+_IDENT = r'(?:"(?:[^"]|"")+"|[\w$]+)'
+_NAME = r'{0}(?:\s*\.\s*{0})*'.format(_IDENT)
+_KEYWORDS = (r'(?:WHERE|JOIN|INNER|LEFT|RIGHT|FULL|OUTER|CROSS|NATURAL|ON|USING|GROUP|ORDER|HAVING|'
+             r'LIMIT|UNION|EXCEPT|INTERSECT|MINUS|FETCH|OFFSET|WINDOW|FOR|SET|VALUES|SELECT)\b')
+_TABLE_REF = r'{0}(?:\s+(?:AS\s+)?(?!{2}){1})?'.format(_NAME, _IDENT, _KEYWORDS)
+# Tables read by a query: the references after every FROM and JOIN
+_TABLE_LIST = re.compile(r'\b(?:FROM|JOIN)\s+({0}(?:\s*,\s*{0})*)'.format(_TABLE_REF), re.IGNORECASE)
+_TABLE_NAME = re.compile(_NAME)
+# Table modified by a statement
+_DML_TARGET = re.compile(r'\s*(?:INSERT\s+INTO|PUT\s+INTO|UPDATE|DELETE\s+FROM|DELETE|MERGE\s+INTO|'
+                         r'TRUNCATE\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE)\s+'
+                         r'(' + _NAME + r')', re.IGNORECASE)
+_SET_SCHEMA = re.compile(r'\s*SET\s+(?:CURRENT\s+)?SCHEMA\s*(?:=\s*)?(' + _IDENT + r')\s*;?\s*$',
+                         re.IGNORECASE)
+
+
+def normalize(sql):
+    """``sql`` with runs of whitespace outside of quotes collapsed to one space"""
+    return _WHITESPACE.sub(lambda match: match.group(1) or ' ', sql).strip()
+
+
+def _table_name(reference):
+    """Unqualified table name of ``reference``, upper case unless quoted"""
+    name = re.findall(_IDENT, _TABLE_NAME.match(reference.strip()).group(0))[-1]
+    if name.startswith('"'):
+        return name[1:-1].replace('""', '"')
+    return name.upper()
+
+
+def tables_read(sql):
+    """Names of the tables a query reads, see :py:func:`_table_name`"""
+    tables = set()
+    for match in _TABLE_LIST.finditer(sql):
+        for reference in re.split(r'\s*,\s*', match.group(1)):
+            tables.add(_table_name(reference))
+    return frozenset(tables)
+
+
+def table_modified(sql):
+    """Name of the table a DML or DDL statement modifies, ``None`` if it cannot be told"""
+    match = _DML_TARGET.match(sql)
+    return _table_name(match.group(1)) if match else None
+
+
+def schema_set(sql):
+    """Schema a ``SET SCHEMA`` statement switches to, ``None`` for other statements"""
+    match = _SET_SCHEMA.match(sql)
+    return _table_name(match.group(1)) if match else None
+
+
+def _freeze(value):
+    """Hashable form of a parameter value that tells apart values of different types"""
+    if isinstance(value, dict):
+        return dict, tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value) if isinstance(value, (set, frozenset)) else value
+        return type(value), tuple(_freeze(item) for item in items)
+    return type(value), value
+
+
+def encode_batch(rowset):
+    """Compact-protocol encoding of a ``ttypes.RowSet``"""
+    buf = TMemoryBuffer()
+    rowset.write(_transport.make_protocol(buf))
+    return buf.getvalue()
+
+
+def decode_batch(data, decode=wiredecode.OBJECTS):
+    """``ttypes.RowSet`` from :py:func:`encode_batch` output, its rows decoded in the ``decode``
+    mode of :py:mod:`~pysnappydata.wiredecode`
+    """
+    return wiredecode.read_rowset(_transport.make_protocol(TMemoryBuffer(data)), decode)
+
+
+class ResultCache(object):
+    """Thread-safe LRU cache of query results, bounded to ``max_bytes``
+
+    Entries expire ``ttl`` seconds after they are stored. A single result larger than
+    ``max_entry_bytes`` (default a quarter of ``max_bytes``) is not cached. One instance may be
+    shared by any number of connections.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=60.0, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        # Incremented by every invalidation, so that results read before it are not stored after it
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._rejected = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def key(sql, parameters=None, scope=None):
+        """Cache key of a query, ``None`` if its parameters cannot be used in a key.
+
+        ``scope`` tells apart connections that may get different results for the same query,
+        see :py:attr:`Connection.cache_scope <pysnappydata.snappydata.Connection.cache_scope>`.
+        """
+        try:
+            key = scope, normalize(sql), _freeze(parameters)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @property
+    def generation(self):
+        """Token to pass to :py:meth:`put` for a result whose query is about to run"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """The encoded batches of a cached result, or ``None``"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry.expires <= time.time():
+                self._drop(entry)
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            # Most recently used last
+            self._entries[key] = entry
+            self._hits += 1
+            return entry.batches
+
+    def put(self, key, batches, tables, generation):
+        """Store the encoded batches of a result of a query reading ``tables``, unless the cache
+        was invalidated since ``generation`` was taken.
+        """
+        nbytes = sum(len(batch) for batch in batches)
+        with self._lock:
+            if generation != self._generation or nbytes > self.max_entry_bytes:
+                self._rejected += 1
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._drop(old)
+            self._entries[key] = _Entry(batches, nbytes, frozenset(tables), time.time() + self.ttl)
+            self._bytes += nbytes
+            self._stores += 1
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._drop(evicted)
+                self._evictions += 1
+            return True
+
+    def _drop(self, entry):
+        self._bytes -= entry.nbytes
+
+    def invalidate(self, tables=None):
+        """Drop the entries of queries reading any of ``tables``, or all entries if ``None``"""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            if tables is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            tables = frozenset(tables)
+            for key, entry in list(self._entries.items()):
+                if entry.tables & tables:
+                    del self._entries[key]
+                    self._drop(entry)
+
+    def clear(self):
+        """Drop all entries"""
+        self.invalidate()
+
+    @property
+    def stats(self):
+        """Statistics of the cache.
+
+        - entries: results currently cached
+        - bytes: encoded size of the cached results
+        - max_bytes: configured byte budget
+        - hits: lookups answered from the cache
+        - misses: lookups that had to run the query
+        - hit_rate: ``hits / (hits + misses)``, ``0.0`` before the first lookup
+        - stores: results added
+        - rejected: results not added because they were too big or stale
+        - evictions: entries dropped to stay within ``max_bytes``
+        - expirations: entries found expired
+        - invalidations: calls to :py:meth:`invalidate`
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': float(self._hits) / lookups if lookups else 0.0,
+                'stores': self._stores,
+                'rejected': self._rejected,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
@@ -4,19 +4,35 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 # Make all exceptions visible in this module per DB-API
+import collections
+import contextlib
+import itertools
 import logging
+import mmap
+import random
+import re
 import sys
 import socket
+import threading
 import time
-import thread
 
-from SDTCLIService import SnappyDataService
+from future.moves import queue
+from thrift.transport.TTransport import TTransportException
+
+from SDTCLIService import constants
 from SDTCLIService import ttypes
 from SDTCLIService import LocatorService
 from pysnappydata import common
+from pysnappydata import converters
+from pysnappydata import hooks as _hooks
+from pysnappydata import lob
+from pysnappydata import locator as _locator
+from pysnappydata import metrics
+from pysnappydata import pipeline
+from pysnappydata import resultcache
+from pysnappydata import transport as _transport
+from pysnappydata import wiredecode
 
-import thrift.protocol.TCompactProtocol
-import thrift.transport.TSocket
 from pysnappydata.exc import *
 
 # PEP 249 module globals
@@ -48,51 +64,375 @@ class SnappyDataParamEscaper(common.ParamEscaper):
 
 _escaper = SnappyDataParamEscaper()
 
+# Errors meaning the connection to the server is gone
+_CONNECTION_ERRORS = (TTransportException, socket.error, EOFError)
+
+_MAX_FAILOVER_BACKOFF = 2.0
+
+# Statements that can safely run again on another server after a failover
+_READ_ONLY = re.compile(r'\s*(SELECT|VALUES|WITH)\b', re.IGNORECASE)
+
+_PYFORMAT = re.compile(r'%\((\w+)\)s|%s|%%')
+
+
+def _to_qmark(operation):
+    """Rewrite a pyformat operation with ``?`` markers.
+
+    Returns the rewritten SQL and the name of each marker, ``None`` for ``%s``.
+    """
+    names = []
+
+    def marker(match):
+        if match.group(0) == '%%':
+            return '%'
+        names.append(match.group(1))
+        return '?'
+    return _PYFORMAT.sub(marker, operation), names
+
+
+def _marker_values(names, parameters):
+    """Parameter values in the order of the markers returned by :py:func:`_to_qmark`"""
+    if isinstance(parameters, dict):
+        if None in names:
+            raise ProgrammingError("Positional parameter marker used with a parameter mapping")
+        return [parameters[name] for name in names]
+    if any(name is not None for name in names):
+        raise ProgrammingError("Named parameter marker used with a parameter sequence")
+    return list(parameters)
+
+
+def _bindable(parameters):
+    """Sequence values expand to IN lists when escaped, so they cannot be bound to one marker"""
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    return not any(isinstance(v, (list, tuple, set, frozenset)) for v in values)
+
+
+def _streams(parameters):
+    """Whether any parameter is a file object or buffer that can only be bound, not escaped"""
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    return any(hasattr(v, 'read') or isinstance(v, (memoryview, mmap.mmap)) for v in values)
+
 
 def connect(*args, **kwargs):
     return Connection(*args, **kwargs)
 
 
+class Row(tuple):
+    """Result row that is a plain tuple with access by column name, ``row['ID']`` or ``row.ID``.
+
+    Pass ``row_type=Row`` to :py:meth:`Connection.cursor`; a subclass knowing the column names
+    is made once per result set, so a row takes no more memory than a tuple.
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    @classmethod
+    def for_description(cls, description):
+        """Subclass for rows of a result set with the given cursor ``description``"""
+        fields = tuple(column[0] for column in description)
+        # The first of duplicate names wins, as in most DB-API row classes
+        index = {}
+        for i, name in enumerate(fields):
+            index.setdefault(name, i)
+        return type(str('Row'), (cls,), {'__slots__': (), '_fields': fields, '_index': index})
+
+    def __getitem__(self, key):
+        if isinstance(key, (str, type(u''))):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def keys(self):
+        return list(self._fields)
+
+    def _asdict(self):
+        return collections.OrderedDict(zip(self._fields, self))
+
+    def __repr__(self):
+        return 'Row({})'.format(', '.join('{}={!r}'.format(name, value) for name, value in zip(self._fields, self)))
+
+
+class PreparedStatement(object):
+    """A statement prepared on the server, see :py:meth:`Connection.prepare`"""
+
+    def __init__(self, sql, result, session):
+        self.sql = sql
+        self.result = result
+        # Connection session the statement was prepared in
+        self.session = session
+        self.encode = converters.compile_param_encoder(result.parameterMetaData)
+
+    @property
+    def statement_id(self):
+        return self.result.statementId
+
+
 class Connection(object):
-    """Wraps a Thrift session"""
+    """Wraps a Thrift session
+
+    ``transport`` selects the Thrift transport stacked on the server and locator sockets:
+    ``'buffered'`` (default, wire compatible with a plain socket), ``'framed'`` (the server must
+    run with framed transport) or ``'socket'`` (unbuffered, only useful for debugging). Buffered
+    and framed transports let the accelerated Thrift decoder parse whole result batches in C.
+    ``buffer_size`` sets the read buffer of the buffered transport; raise it for wide rows or
+    large batch sizes.
+
+    Statements executed with parameters are prepared on the server once and kept in a per
+    connection LRU cache of up to ``statement_cache_size`` statements keyed by SQL text; the
+    parameters are then bound instead of escaped into the text. ``0`` disables the cache.
 
-    def __init__(self, host, port=1528, username=None, password=None, locator=False):
+    Up to ``pipeline_depth`` requests may be in flight on the socket at once: requests whose
+    outcome does not matter to the caller, such as closing a result set or an evicted
+    statement, are sent without waiting for their reply, and :py:meth:`Cursor.executemany`
+    keeps several batches in flight. ``1`` waits for every reply before sending the next request.
+
+    With ``locator``, ``host:port`` is a locator. Its servers are cached process-wide and
+    refreshed in the background (see :py:mod:`pysnappydata.locator`), and each connection picks
+    one locally with the ``load_balance`` policy: ``'round_robin'``, ``'least_connections'``
+    (default) or ``'power_of_two'``. Losing the connection to the server makes the connection
+    pick another server, excluding the failed ones, and open a new session there. This is tried
+    up to ``failover_retries`` times with jittered exponential backoff starting at
+    ``failover_backoff`` seconds. A read-only statement (``SELECT``, ``VALUES``, ``WITH``) that
+    was being executed is then repeated; anything else raises ``OperationalError``, as do
+    result sets and transactions of the lost session. See :py:attr:`failover_stats`. Opening the
+    connection likewise moves on to other servers, up to ``failover_retries`` more times, when
+    the server picked cannot be reached.
+
+    ``result_cache``, a :py:class:`~pysnappydata.resultcache.ResultCache` that may be shared
+    with other connections, caches the results of read-only queries run by this connection's
+    cursors.
+
+    ``decode`` selects how result rows are read off the wire: ``'objects'`` (default) builds the
+    generated ``ttypes.Row`` and ``ttypes.ColumnValue`` objects for every row and cell, while
+    ``'values'`` reads each row straight into a list of cell values, see
+    :py:mod:`pysnappydata.wiredecode`. Cursors return the same rows either way. Results read
+    with ``'values'`` are not stored in the result cache.
+
+    ``hooks`` are :py:class:`~pysnappydata.hooks.QueryHook` objects called around the statements
+    of this connection's cursors, in addition to those registered for all connections; see
+    :py:mod:`pysnappydata.hooks` and :py:attr:`Cursor.last_query_stats`.
+    """
+
+    def __init__(self, host, port=1528, username=None, password=None, locator=False,
+                 transport=_transport.TRANSPORT_BUFFERED, buffer_size=_transport.DEFAULT_BUFFER_SIZE,
+                 statement_cache_size=32, pipeline_depth=4, failover_retries=3, failover_backoff=0.1,
+                 load_balance=_locator.LEAST_CONNECTIONS, result_cache=None, decode=wiredecode.OBJECTS,
+                 hooks=()):
+        if decode not in wiredecode.MODES:
+            raise ProgrammingError("Unknown decode mode {!r}".format(decode))
+        self._username = username
+        self._password = password
+        self._transport_type = transport
+        self._buffer_size = buffer_size
+        # For opening further sessions to other servers on behalf of this one
+        self._session_kwargs = dict(username=username, password=password, transport=transport,
+                                    buffer_size=buffer_size, pipeline_depth=pipeline_depth,
+                                    decode=decode)
+        # Serializes request/response pairs on the shared Thrift client, e.g. between a cursor's
+        # prefetch thread and other cursors of this connection
+        self._lock = threading.RLock()
+        self._statement_cache_size = statement_cache_size
+        self._result_cache = result_cache
+        # Server or locator given, which identifies the cluster
+        self._address = (host, port)
+        self._schema = None
+        self._decode = decode
+        self._hooks = tuple(hooks)
+        # Kept across sessions, like the bytes read on the sockets of earlier sessions
+        self._request_times = pipeline.RequestTimes()
+        self._bytes_base = 0
+        self._socket = None
+        self._statements = collections.OrderedDict()
+        self._statement_hits = 0
+        self._statement_misses = 0
+        self._statement_evictions = 0
+        self._pipeline_depth = pipeline_depth
+        self._failover_retries = failover_retries
+        self._failover_backoff = failover_backoff
+        self._failed_servers = []
+        self._failovers = 0
+        self._failover_attempts = 0
+        self._replays = 0
+        self._last_failover_time = None
+        self._total_failover_time = 0.0
+        # Incremented whenever a new server session replaces the previous one
+        self._session = 0
+        self._transport = None
+        self._load_balance = load_balance
+        self._servers = _locator.server_list(host, port, transport, buffer_size) if locator else None
+        # Server counted as connected in self._servers
+        self._located = None
         if locator:
-            _logger.info("connect to locator %s:%d", host, port)
-            tsocket = thrift.transport.TSocket.TSocket(host, port)
-            iprot = thrift.protocol.TCompactProtocol.TCompactProtocol(tsocket)
-            oprot = thrift.protocol.TCompactProtocol.TCompactProtocol(tsocket)
-            self._locator = LocatorService.Client(iprot, oprot)
-            tsocket.open()
-            prefer_server = \
-                self._locator.getPreferredServer(
-                    serverTypes=set([LocatorService.ServerType.THRIFT_SNAPPY_CP]),
-                    serverGroups=None,
-                    failedServers=None)
-            self._hostname = prefer_server.hostName
-            self._port = prefer_server.port
+            self._connect_located()
         else:
-            self._hostname = host
-            self._port = port
+            self._open_session(host, port)
+
+    def _connect_located(self):
+        """Open the first session on a server behind the locator, trying other servers when one
+        cannot be reached, as :py:meth:`_failover` does
+        """
+        failed = []
+        for attempt in range(self._failover_retries + 1):
+            if attempt:
+                self._backoff(attempt)
+                metrics.inc('snappydata_retries_total', kind='connect')
+            try:
+                self._open_located(failed)
+                return
+            except _CONNECTION_ERRORS as e:
+                error = e
+        self._failed_servers = failed
+        raise error
+
+    def _locate(self, failed=()):
+        """Pick a server behind the locator, avoiding the ``(host, port)`` in ``failed``"""
+        return self._servers.choose(self._load_balance, failed)
 
+    def _open_located(self, failed):
+        """Open a session on a server behind the locator, avoiding the ``(host, port)`` in
+        ``failed``. A server that cannot be reached is reported to the server list and added to
+        ``failed`` before the error is raised.
+        """
+        server = None
+        try:
+            server = self._locate(failed)
+            self._open_session(*server)
+        except _CONNECTION_ERRORS:
+            if server is not None and server not in failed:
+                failed.append(server)
+                self._servers.failed(server)
+            raise
+
+    def _backoff(self, attempt):
+        """Sleep before retry ``attempt``, with jittered exponential backoff"""
+        delay = min(self._failover_backoff * 2 ** (attempt - 1), _MAX_FAILOVER_BACKOFF)
+        time.sleep(delay * random.uniform(0.5, 1.5))
+
+    def _release_server(self):
+        if self._located is not None:
+            self._servers.disconnected(self._located)
+            self._located = None
+
+    def _open_session(self, host, port):
+        start = time.time()
+        try:
+            self._connect(host, port)
+        except Exception:
+            metrics.connection_opened(time.time() - start, False)
+            raise
+        metrics.connection_opened(time.time() - start, True)
+
+    def _connect(self, host, port):
+        self._hostname = host
+        self._port = port
         _logger.info("connect to server %s:%d", self._hostname, self._port)
-        self._clientid = self._hostname + str(thread.get_ident()) + str(time.time())
-        tsocket = thrift.transport.TSocket.TSocket(self._hostname, self._port)
-        iprot = thrift.protocol.TCompactProtocol.TCompactProtocol(tsocket)
-        oprot = thrift.protocol.TCompactProtocol.TCompactProtocol(tsocket)
-        tsocket.open()
+        self._clientid = self._hostname + str(threading.current_thread().ident) + str(time.time())
+        if self._socket is not None:
+            self._bytes_base += self._socket.bytes_read
+        self._socket = _transport.CountingSocket(self._hostname, self._port)
+        self._transport = _transport.wrap_transport(self._socket, self._transport_type, self._buffer_size)
+        self._transport.open()
         arguments = ttypes.OpenConnectionArgs(
             clientHostName=self._hostname,
             clientID=self._clientid,
-            userName=username,
-            password=password,
+            userName=self._username,
+            password=self._password,
             security=ttypes.SecurityMechanism.PLAIN
         )
-        self._client = SnappyDataService.Client(iprot, oprot)
-        self._conn_properties = self._client.openConnection(arguments)
+        self._client = pipeline.PipelinedClient(_transport.make_protocol(self._transport), decode=self._decode,
+                                                times=self._request_times)
+        try:
+            self._conn_properties = self._client.call('openConnection', arguments)
+        except Exception:
+            self._transport.close()
+            raise
+        # A new session starts in the default schema
+        self._schema = self._conn_properties.defaultSchema
+        self._session += 1
+        if self._servers is not None:
+            self._located = (host, port)
+            self._servers.connected(self._located)
+
+    def _failover(self, error):
+        """Replace the session on a failed server by one on another server from the locator.
+
+        Retries with jittered exponential backoff and raises ``OperationalError`` when no
+        server can be reached.
+        """
+        start = time.time()
+        _logger.warning("lost connection to %s:%d: %s", self._hostname, self._port, error)
+        failed = [(self._hostname, self._port)]
+        try:
+            self._transport.close()
+        except Exception:
+            pass
+        self._release_server()
+        self._servers.failed(failed[0])
+        # Statements and result sets died with the session
+        self._statements.clear()
+        for attempt in range(self._failover_retries):
+            if attempt:
+                self._backoff(attempt)
+            self._failover_attempts += 1
+            metrics.inc('snappydata_retries_total', kind='failover')
+            try:
+                self._open_located(failed)
+            except _CONNECTION_ERRORS as e:
+                error = e
+                continue
+            self._failed_servers = failed
+            self._failovers += 1
+            self._last_failover_time = time.time() - start
+            self._total_failover_time += self._last_failover_time
+            _logger.warning("failed over to %s:%d in %.3f s", self._hostname, self._port,
+                            self._last_failover_time)
+            return
+        self._failed_servers = failed
+        raise OperationalError("Failover from {} failed: {}".format(
+            ', '.join('{}:{}'.format(*server) for server in failed), error))
+
+    def _rpc(self, request, replay=False, discard=False):
+        """Run ``request()`` under the lock, failing over to another server if the connection
+        is lost and a locator is known.
+
+        ``request`` must read the session state (``self._client``, ``self._conn_properties``) when
+        it runs. After a failover it is run again on the new session if ``replay`` is set, the
+        lost request is dropped if ``discard`` is set, and ``OperationalError`` is raised
+        otherwise.
+        """
+        with self._lock:
+            for attempt in range(self._failover_retries + 1):
+                try:
+                    return request()
+                except _CONNECTION_ERRORS as e:
+                    if self._servers is None:
+                        raise
+                    self._failover(e)
+                    if discard:
+                        return None
+                    if not replay:
+                        raise OperationalError("Connection lost, failed over to {}:{}; the request "
+                                               "cannot be repeated: {}".format(self._hostname, self._port, e))
+                    self._replays += 1
+                    metrics.inc('snappydata_retries_total', kind='replay')
+            raise OperationalError("Connection lost repeatedly, giving up")
 
     def close(self):
-        self._client.closeConnection(self._conn_properties.connId, True, self._conn_properties.token)
+        try:
+            with self._lock:
+                self.clear_statement_cache()
+                self._client.call('closeConnection', self._conn_properties.connId, True,
+                                  self._conn_properties.token)
+        finally:
+            self._transport.close()
+            self._release_server()
 
     def commit(self):
         """By default, autocommit is on"""
@@ -117,19 +457,85 @@ class Connection(object):
     def hostname(self):
         return self._hostname
 
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def schema(self):
+        """Current schema of the session: the default one reported when the session was opened,
+        then the last one set with ``SET SCHEMA`` through a cursor
+        """
+        return self._schema
+
+    @property
+    def cache_scope(self):
+        """Part of the :py:attr:`result_cache` keys of this connection's queries: the server or
+        locator address it was opened with, the user and the current :py:attr:`schema`
+        """
+        return self._address, self._username, self._schema
+
     @property
     def clientid(self):
         return self._clientid
 
     @property
     def client(self):
+        """The :py:class:`~pysnappydata.pipeline.PipelinedClient`. Call its ``drain()`` under
+        the connection's lock before using the generated blocking methods directly.
+        """
         return self._client
 
+    @property
+    def session(self):
+        """Number of the current server session, incremented by every failover"""
+        return self._session
+
+    @property
+    def bytes_received(self):
+        """Total bytes read from the server sockets of all sessions"""
+        return self._bytes_base + self._socket.bytes_read
+
+    def _request_totals(self):
+        """Running totals of the request times and bytes received, for :py:func:`_since`"""
+        times = self._request_times
+        return times.send, times.wait, times.receive, self.bytes_received
+
+    @property
+    def hooks(self):
+        """Hooks called for this connection's statements: its own, then the registered ones"""
+        return self._hooks + _hooks.registered()
+
+    def add_hook(self, hook):
+        """Call ``hook`` for the statements of this connection's cursors"""
+        with self._lock:
+            if hook not in self._hooks:
+                self._hooks = self._hooks + (hook,)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks = tuple(h for h in self._hooks if h is not hook)
+
+    def get_servers(self):
+        """All servers of the cluster as ``(host, port)`` tuples, this connection's server first"""
+        servers = self._rpc(lambda: self._client.call(
+            'getAllServersWithPreferredServer', set([LocatorService.ServerType.THRIFT_SNAPPY_CP]), None, None),
+            replay=True)
+        addresses = [(server.hostName, server.port) for server in servers or ()]
+        current = (self._hostname, self._port)
+        return [current] + [address for address in addresses if address != current]
+
+    def connect_to(self, host, port):
+        """Open another session with this connection's credentials and transport on ``host:port``"""
+        return Connection(host, port, statement_cache_size=0, **self._session_kwargs)
+
     def reset_state(self):
-        self._client.closeResultSet(self._conn_properties.connId, self._conn_properties.token)
+        self._rpc(lambda: self._client.call('closeResultSet', self._conn_properties.connId,
+                                            self._conn_properties.token), discard=True)
 
     def cancel_current_statement(self):
-        self._client.cancelCurrentStatement(self._conn_properties.connId, self._conn_properties.token)
+        self._rpc(lambda: self._client.call('cancelCurrentStatement', self._conn_properties.connId,
+                                            self._conn_properties.token), discard=True)
 
     def reset(self):
         try:
@@ -140,30 +546,630 @@ class Connection(object):
                 pass
 
     def execute(self, sql, attr=None, outputparams=None):
-        return self._client.execute(self._conn_properties.connId, sql, outputparams, attr, self._conn_properties.token)
+        """Execute ``sql``. Read-only statements are repeated on another server if the
+        connection fails over.
+        """
+        return self._rpc(lambda: self._client.call('execute', self._conn_properties.connId, sql, outputparams,
+                                                   attr, self._conn_properties.token),
+                         replay=bool(_READ_ONLY.match(sql)))
+
+    def get_next_result_set(self, cursorid, behaviour=constants.NEXTRS_CLOSE_CURRENT_RESULT):
+        return self._rpc(lambda: self._client.call('getNextResultSet', cursorid, behaviour,
+                                                   self._conn_properties.token))
+
+    def scroll_cursor(self, cursorid, fetchsize):
+        """Fetch the next batch of an open result set, continuing from the current position"""
+        return self._rpc(lambda: self._client.call('scrollCursor', cursorid, 0, False, False, fetchsize,
+                                                   self._conn_properties.token))
+
+    def close_result_set(self, cursorid, wait=True, session=None):
+        """Close an open server cursor. With ``wait`` false the reply is not waited for, if
+        pipelining is enabled, and errors are only logged. Nothing is sent if ``session`` is given
+        and is no longer the current :py:attr:`session`.
+        """
+        session = self._session if session is None else session
+        if wait:
+            self._rpc(lambda: self._client.call('closeResultSet', cursorid, self._conn_properties.token)
+                      if self._session == session else None, discard=True)
+        else:
+            self._send_and_forget(session, 'closeResultSet', cursorid)
+
+    def _send_and_forget(self, session, name, *args):
+        """Send a request releasing something of ``session`` whose reply is read and dropped
+        along with the reply to a later one. The token is appended to ``args``. Nothing is sent
+        if the session was replaced.
+        """
+        def request():
+            if self._session != session:
+                return
+            if self._pipeline_depth <= 1:
+                self._client.call(name, *(args + (self._conn_properties.token,)))
+                return
+            if self._client.in_flight >= self._pipeline_depth - 1:
+                self._client.drain()
+            self._client.ignore(self._client.submit(name, *(args + (self._conn_properties.token,))))
+        self._rpc(request, discard=True)
+
+    def _lob_chunk(self, name, lob_id, offset, size, free_at_end, session):
+        if session != self._session:
+            raise OperationalError("LOB {} belongs to a session lost in a failover".format(lob_id))
+        return self._rpc(lambda: self._client.call(name, self._conn_properties.connId, lob_id, offset, size,
+                                                   free_at_end, self._conn_properties.token))
+
+    def get_blob_chunk(self, lob_id, offset, size, free_at_end=False, session=None):
+        """Read ``size`` bytes of BLOB ``lob_id`` from ``offset``; see :py:class:`pysnappydata.lob.Blob`.
+        With ``free_at_end`` the server frees the LOB once the chunk reaches its end.
+        """
+        return self._lob_chunk('getBlobChunk', lob_id, offset, size, free_at_end,
+                               self._session if session is None else session)
+
+    def get_clob_chunk(self, lob_id, offset, size, free_at_end=False, session=None):
+        """Read ``size`` characters of CLOB ``lob_id`` from ``offset``; see :py:class:`pysnappydata.lob.Clob`"""
+        return self._lob_chunk('getClobChunk', lob_id, offset, size, free_at_end,
+                               self._session if session is None else session)
+
+    def upload_lob(self, source, clob=False, chunk_size=constants.DEFAULT_LOB_CHUNKSIZE):
+        """Send ``source`` to the server as a new LOB in chunks of ``chunk_size`` bytes (or
+        characters for a CLOB), keeping up to ``pipeline_depth`` chunks in flight. See
+        :py:func:`pysnappydata.lob.chunks` for the accepted sources.
+
+        Returns the ``BlobChunk`` or ``ClobChunk`` to bind to a parameter of a prepared statement
+        of this session.
+        """
+        name, make = ('sendClobChunk', ttypes.ClobChunk) if clob else ('sendBlobChunk', ttypes.BlobChunk)
+        lob_id = None
+        offset = 0
+        in_flight = collections.deque()
+        session = self._session
+        try:
+            for data, last in lob.chunks(source, clob, chunk_size):
+                chunk = make(chunk=data, last=last, lobId=lob_id, offset=offset)
+                if lob_id is None:
+                    # The first chunk creates the LOB and returns its id for the others
+                    lob_id = self._rpc(lambda: self._client.call(name, chunk, self._conn_properties.connId,
+                                                                 self._conn_properties.token))
+                else:
+                    in_flight.append(self._rpc(lambda: self._client.submit(
+                        name, chunk, self._conn_properties.connId, self._conn_properties.token)))
+                    if len(in_flight) >= max(1, self._pipeline_depth):
+                        seqid = in_flight.popleft()
+                        self._rpc(lambda: self._client.wait(seqid))
+                offset += len(data)
+            while in_flight:
+                seqid = in_flight.popleft()
+                self._rpc(lambda: self._client.wait(seqid))
+        finally:
+            with self._lock:
+                if self._session == session:
+                    for seqid in in_flight:
+                        self._client.ignore(seqid)
+        return make(chunk=data[:0], last=True, lobId=lob_id, offset=0, totalLength=offset)
+
+    def free_lob(self, lob_id, wait=True, session=None):
+        """Release LOB ``lob_id`` on the server, like :py:meth:`close_result_set`"""
+        session = self._session if session is None else session
+        if wait:
+            self._rpc(lambda: self._client.call('freeLob', self._conn_properties.connId, lob_id,
+                                                self._conn_properties.token)
+                      if self._session == session else None, discard=True)
+        else:
+            self._send_and_forget(session, 'freeLob', self._conn_properties.connId, lob_id)
+
+    def prepare(self, sql):
+        """Return a :py:class:`PreparedStatement` for ``sql``, from the statement cache if possible.
 
-    def get_next_result_set(self, cursorid):
-        return self._client.getNextResultSet(cursorid, None, self._conn_properties.token)
+        The statement is taken out of the cache until it is handed back with :py:meth:`release`,
+        so that two cursors never share the open result set of one server statement.
+        """
+        with self._lock:
+            statement = self._statements.pop(sql, None)
+            if statement is not None:
+                self._statement_hits += 1
+                return statement
+            self._statement_misses += 1
+            return self._prepare(sql)
+
+    def _prepare(self, sql):
+        result = self._rpc(lambda: self._client.call('prepareStatement', self._conn_properties.connId, sql,
+                                                     None, None, self._conn_properties.token), replay=True)
+        return PreparedStatement(sql, result, self._session)
+
+    def _current(self, statement):
+        """``statement``, prepared again if it belongs to a session lost in a failover"""
+        if statement.session != self._session:
+            fresh = self._prepare(statement.sql)
+            statement.result, statement.session = fresh.result, fresh.session
+        return statement
+
+    def release(self, statement):
+        """Return a statement obtained from :py:meth:`prepare` to the cache, closing the least
+        recently used statement if the cache is full.
+        """
+        with self._lock:
+            if statement.session != self._session:
+                return
+            if self._statement_cache_size <= 0 or statement.sql in self._statements:
+                self.close_statement(statement, wait=False)
+                return
+            self._statements[statement.sql] = statement
+            while len(self._statements) > self._statement_cache_size:
+                _, evicted = self._statements.popitem(last=False)
+                self._statement_evictions += 1
+                self.close_statement(evicted, wait=False)
+
+    def close_statement(self, statement, wait=True):
+        """Close a prepared statement; ``wait`` is as for :py:meth:`close_result_set`"""
+        session = statement.session
+        if wait:
+            self._rpc(lambda: self._client.call('closeStatement', statement.statement_id,
+                                                self._conn_properties.token)
+                      if self._session == session else None, discard=True)
+        else:
+            self._send_and_forget(session, 'closeStatement', statement.statement_id)
+
+    def clear_statement_cache(self):
+        """Close all cached statements on the server with a single ``bulkClose``"""
+        with self._lock:
+            if not self._statements:
+                return
+            entities = [ttypes.EntityId(id=s.statement_id, type=constants.BULK_CLOSE_STATEMENT,
+                                        connId=self._conn_properties.connId, token=self._conn_properties.token)
+                        for s in self._statements.values()]
+            self._statements.clear()
+            self._rpc(lambda: self._client.call('bulkClose', entities), discard=True)
+
+    def execute_prepared(self, statement, params, attr=None, outputparams=None):
+        """Execute ``statement`` with ``params``, a ``ttypes.Row`` of bound values. Read-only
+        statements are prepared again and repeated on another server if the connection fails over.
+        """
+        return self._rpc(lambda: self._client.call('executePrepared', self._current(statement).statement_id,
+                                                   params, outputparams, attr, self._conn_properties.token),
+                         replay=bool(_READ_ONLY.match(statement.sql)))
+
+    def execute_prepared_batch(self, statement, params_batch, attr=None):
+        """Execute ``statement`` once per ``ttypes.Row`` in ``params_batch`` in a single request"""
+        return self._rpc(lambda: self._client.call('executePreparedBatch', self._current(statement).statement_id,
+                                                   params_batch, attr, self._conn_properties.token))
+
+    def execute_prepared_batches(self, statement, params_batches, attr=None):
+        """Execute ``statement`` for every batch in the iterable ``params_batches``, keeping up to
+        ``pipeline_depth`` batches in flight. Yields each batch's ``UpdateResult`` in order.
+        """
+        in_flight = collections.deque()
+        session = self._session
+        try:
+            for params_batch in params_batches:
+                in_flight.append(self._rpc(lambda: self._client.submit(
+                    'executePreparedBatch', self._current(statement).statement_id, params_batch, attr,
+                    self._conn_properties.token)))
+                if len(in_flight) >= max(1, self._pipeline_depth):
+                    seqid = in_flight.popleft()
+                    yield self._rpc(lambda: self._client.wait(seqid))
+            while in_flight:
+                seqid = in_flight.popleft()
+                yield self._rpc(lambda: self._client.wait(seqid))
+        finally:
+            with self._lock:
+                if self._session == session:
+                    for seqid in in_flight:
+                        self._client.ignore(seqid)
+
+    @property
+    def failover_stats(self):
+        """Statistics of failovers to another server, only done for locator connections.
+
+        - failovers: sessions successfully reopened on another server
+        - attempts: reconnection attempts, including failed ones
+        - replays: read-only requests repeated after a failover
+        - last_failover_time: seconds the last failover took, ``None`` if there was none
+        - total_failover_time: seconds spent in all failovers
+        - failed_servers: ``(host, port)`` of the servers that failed in the last failover
+        """
+        with self._lock:
+            return {
+                'failovers': self._failovers,
+                'attempts': self._failover_attempts,
+                'replays': self._replays,
+                'last_failover_time': self._last_failover_time,
+                'total_failover_time': self._total_failover_time,
+                'failed_servers': list(self._failed_servers),
+            }
+
+    @property
+    def result_cache(self):
+        """The :py:class:`~pysnappydata.resultcache.ResultCache`, or ``None``"""
+        return self._result_cache
+
+    @property
+    def decode(self):
+        """How result rows are decoded, ``'objects'`` or ``'values'``"""
+        return self._decode
+
+    @property
+    def statement_cache_enabled(self):
+        return self._statement_cache_size > 0
+
+    @property
+    def statement_cache_stats(self):
+        """Statistics of the prepared statement cache.
+
+        - size: statements currently cached
+        - capacity: configured ``statement_cache_size``
+        - hits: executions that reused a cached statement
+        - misses: executions that had to prepare a statement
+        - evictions: statements closed to make room for others
+        """
+        with self._lock:
+            return {
+                'size': len(self._statements),
+                'capacity': self._statement_cache_size,
+                'hits': self._statement_hits,
+                'misses': self._statement_misses,
+                'evictions': self._statement_evictions,
+            }
+
+
+class _BatchPrefetcher(object):
+    """Keeps up to ``depth`` upcoming batches of an open server cursor decoded and queued.
+
+    A daemon thread issues the ``scrollCursor`` calls so that the network round trip overlaps
+    with the application processing the current batch.
+    """
+
+    _POLL_INTERVAL = 0.1
+
+    def __init__(self, connection, cursorid, fetchsize, depth):
+        self._connection = connection
+        self._cursorid = cursorid
+        self._fetchsize = fetchsize
+        self._queue = queue.Queue(depth)
+        self._closed = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.depth = depth
+        self.exhausted = False
+        self.batches = 0
+        self.bytes_buffered = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self._thread = threading.Thread(target=self._run, name='snappydata-prefetch-{}'.format(cursorid))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._closed.is_set():
+                with self._connection._lock:
+                    before = self._connection._request_totals()
+                    rowset = self._connection.scroll_cursor(self._cursorid, self._fetchsize)
+                    requests = _since(before, self._connection._request_totals())
+                last = bool(rowset.flags & constants.ROWSET_LAST_BATCH) or rowset.cursorId == constants.INVALID_ID
+                self.exhausted = last
+                with self._stats_lock:
+                    self.batches += 1
+                    self.bytes_buffered += requests[3]
+                self._put((rowset, requests, None))
+                if last:
+                    break
+        except Exception as e:
+            self._put((None, None, e))
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=self._POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def get(self):
+        """Return the next batch and the request times and bytes it took (see :py:func:`_since`),
+        waiting for the background fetch if none is queued yet.
+        """
+        try:
+            rowset, requests, error = self._queue.get_nowait()
+        except queue.Empty:
+            start = time.time()
+            rowset, requests, error = self._queue.get()
+            with self._stats_lock:
+                self.stalls += 1
+                self.stall_time += time.time() - start
+        if error is not None:
+            raise error
+        with self._stats_lock:
+            self.bytes_buffered -= requests[3]
+        return rowset, requests
+
+    def close(self):
+        """Stop fetching and wait for an in flight request to complete"""
+        self._closed.set()
+        self._thread.join()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'depth': self.depth,
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'bytes_buffered': self.bytes_buffered,
+                'stalls': self.stalls,
+                'stall_time': self.stall_time,
+            }
+
+
+class _ParallelScan(object):
+    """Runs one query over disjoint bucket subsets on several connections at once and merges
+    the batches into a single stream, in the order they arrive.
+
+    Offers the same ``get``/``close``/``stats`` interface as :py:class:`_BatchPrefetcher`. The
+    merged stream ends with an empty batch flagged ``ROWSET_LAST_BATCH``.
+    """
+
+    _POLL_INTERVAL = 0.1
+    _DONE = object()
+    # Cursor id of the merged batches. Any id but INVALID_ID, which marks the end of a result;
+    # the cursor using the scan never sends it to a server.
+    _CURSOR_ID = -1
+
+    def __init__(self, connection, sql, table, bucket_sets, batch_size, depth):
+        self._sql = sql
+        self._table = table
+        self._batch_size = batch_size
+        self._queue = queue.Queue(depth * len(bucket_sets))
+        self._closed = threading.Event()
+        self._stats_lock = threading.Lock()
+        # The workers own their server cursors, the cursor using the scan has none to close
+        self.exhausted = True
+        self.depth = depth
+        self.batches = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self._running = len(bucket_sets)
+        servers = connection.get_servers()
+        self.servers = collections.Counter()
+        self._threads = []
+        for i, buckets in enumerate(bucket_sets):
+            server = servers[i % len(servers)]
+            self.servers[server] += 1
+            thread = threading.Thread(target=self._run, args=(connection, server, buckets),
+                                      name='snappydata-scan-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self, connection, server, buckets):
+        session = None
+        rowset = None
+        try:
+            session = connection.connect_to(*server)
+            attrs = ttypes.StatementAttrs(batchSize=self._batch_size, bucketIds=set(buckets),
+                                          bucketIdsTable=self._table, retainBucketIds=False)
+            result = session.execute(self._sql, attrs)
+            rowset = result.resultSet
+            if rowset is None:
+                raise ProgrammingError("Parallel execution requires a query")
+            while self._put((rowset, None)):
+                if rowset.flags & constants.ROWSET_LAST_BATCH or rowset.cursorId == constants.INVALID_ID:
+                    rowset = None
+                    break
+                rowset = session.scroll_cursor(rowset.cursorId, self._batch_size)
+        except Exception as e:
+            self._put((None, e))
+        finally:
+            self._put((self._DONE, None))
+            if session is not None:
+                try:
+                    if rowset is not None:
+                        session.close_result_set(rowset.cursorId)
+                    session.close()
+                except Exception:
+                    _logger.debug("error closing parallel scan session", exc_info=True)
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=self._POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self):
+        """Return the next batch from any worker, waiting if none is queued yet. The requests
+        of the workers' sessions are not accounted, their times are ``None``.
+        """
+        while True:
+            try:
+                rowset, error = self._queue.get_nowait()
+            except queue.Empty:
+                start = time.time()
+                rowset, error = self._queue.get()
+                with self._stats_lock:
+                    self.stalls += 1
+                    self.stall_time += time.time() - start
+            if error is not None:
+                raise error
+            if rowset is self._DONE:
+                self._running -= 1
+                if self._running == 0:
+                    return ttypes.RowSet(rows=[], flags=constants.ROWSET_LAST_BATCH,
+                                         cursorId=constants.INVALID_ID), None
+                continue
+            with self._stats_lock:
+                self.batches += 1
+            # The merged stream only ends once every worker is done, with the batch above
+            return ttypes.RowSet(rows=rowset.rows, flags=0, cursorId=self._CURSOR_ID,
+                                 metadata=rowset.metadata), None
+
+    def close(self):
+        """Stop the workers and wait for them to close their sessions"""
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'depth': self.depth,
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'workers': len(self._threads),
+                'running': self._running,
+                'servers': dict(self.servers),
+                'stalls': self.stalls,
+                'stall_time': self.stall_time,
+            }
+
+
+class _CachedResult(object):
+    """Replays the batches of a result from the :py:class:`~pysnappydata.resultcache.ResultCache`.
+
+    Offers the ``get``/``close`` interface of :py:class:`_BatchPrefetcher`; there is no server
+    cursor to release.
+    """
+
+    exhausted = True
+
+    def __init__(self, batches, decode=wiredecode.OBJECTS):
+        self._batches = iter(batches)
+        self._decode = decode
+
+    def get(self):
+        return resultcache.decode_batch(next(self._batches), self._decode), None
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return None
+
+
+class _Recording(object):
+    """Encoded batches of a result being read, to be stored in the result cache once complete"""
+
+    def __init__(self, cache, key, tables, generation):
+        self.cache = cache
+        self.key = key
+        self.tables = tables
+        self.generation = generation
+        self.batches = []
+        self.nbytes = 0
+
+
+def _since(before, after):
+    """``(send, wait, receive, bytes)`` between two :py:meth:`Connection._request_totals`"""
+    return tuple(a - b for a, b in zip(after, before))
+
+
+class _QueryStats(object):
+    """Timing breakdown and counts of a cursor's last statement, see :py:mod:`pysnappydata.hooks`"""
+
+    __slots__ = ('operation', 'prepared', 'cached', 'escape_time', 'send_time', 'wait_time', 'receive_time',
+                 'build_time', 'elapsed', 'bytes_received', 'rows', 'batches')
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.prepared = False
+        self.cached = False
+        self.escape_time = 0.0
+        self.send_time = 0.0
+        self.wait_time = 0.0
+        self.receive_time = 0.0
+        self.build_time = 0.0
+        self.elapsed = 0.0
+        self.bytes_received = 0
+        self.rows = 0
+        self.batches = 0
+
+    def add_requests(self, requests):
+        """Add request times and bytes from :py:func:`_since`"""
+        self.send_time += requests[0]
+        self.wait_time += requests[1]
+        self.receive_time += requests[2]
+        self.bytes_received += requests[3]
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+_TOTAL_NUM_BUCKETS = re.compile(r'totalNumBuckets=(\d+)')
 
 
 class Cursor(common.DBAPICursor):
-    def __init__(self, connection, arraysize=1000):
+    """Streaming cursor
+
+    Only one batch of at most ``batch_size`` rows is held at a time. Further batches are pulled
+    from the server with ``scrollCursor`` as the caller consumes rows.
+
+    With ``prefetch`` set to N > 0, a background thread keeps up to N further batches queued
+    while the current one is consumed; see :py:attr:`prefetch_stats`.
+
+    :py:meth:`executemany` sends its parameter sets in chunks of ``executemany_chunksize`` rows.
+
+    BLOB, CLOB, JSON and SQLXML values larger than one chunk are read in full when fetched. With
+    ``lazy_lobs`` they are returned as :py:class:`~pysnappydata.lob.Blob` and
+    :py:class:`~pysnappydata.lob.Clob` file objects that read on demand instead. Parameters of
+    these types given as file objects, ``memoryview``, ``mmap`` or longer than one chunk are
+    uploaded in chunks of ``lob_chunk_size``, see :py:mod:`pysnappydata.lob`.
+
+    Rows are tuples. ``row_type=Row`` returns :py:class:`Row` objects that can also be indexed by
+    column name, and ``row_type=list`` returns lists as in earlier versions.
+
+    Each statement records a breakdown of where its time went, see :py:attr:`last_query_stats`,
+    and calls the connection's :py:attr:`~Connection.hooks`.
+    """
+
+    def __init__(self, connection, arraysize=1000, batch_size=constants.DEFAULT_RESULTSET_BATCHSIZE,
+                 prefetch=0, executemany_chunksize=1000, lazy_lobs=False,
+                 lob_chunk_size=constants.DEFAULT_LOB_CHUNKSIZE, row_type=tuple):
         self._operationHandle = None
         self._description = None
+        self._rowset = None
+        self._pending = None
+        self._last_batch = True
+        self._prefetcher = None
+        self._statement = None
+        self._session = None
+        self._recording = None
+        self._stats = None
+        self._hooks = ()
         super(Cursor, self).__init__()
         self.arraysize = arraysize
+        self._batch_size = batch_size
+        self._prefetch = prefetch
+        self._executemany_chunksize = executemany_chunksize
+        self._lazy_lobs = lazy_lobs
+        self._lob_chunk_size = lob_chunk_size
+        self._row_type = row_type
+        self._values = False
         self._connection = connection
         self._rowcount = 0;
 
     def _reset_state(self):
         """Reset state about the previous query in preparation for running another query"""
+        cursorid = self._rowset.cursorId if self._rowset is not None and not self._last_batch else None
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            if self._prefetcher.exhausted:
+                cursorid = None
+            self._prefetcher = None
         super(Cursor, self)._reset_state()
         self._description = None
-        if self._operationHandle is not None:
-            try:
-                self._connection.reset()
-            finally:
-                self._operationHandle = None
+        self._operationHandle = None
+        self._rowset = None
+        self._pending = None
+        self._last_batch = True
+        self._metadata = None
+        self._decoder = None
+        self._recording = None
+        if cursorid:
+            # The server side cursor is only released automatically once the last batch is sent
+            self._connection.close_result_set(cursorid, wait=False, session=self._session)
+        self._release_statement()
+
+    def _release_statement(self):
+        if self._statement is not None:
+            statement, self._statement = self._statement, None
+            self._connection.release(statement)
 
     @property
     def description(self):
@@ -185,10 +1191,10 @@ class Cursor(common.DBAPICursor):
         The ``type_code`` can be interpreted by comparing it to the Type Objects specified in the
         section below.
         """
-        if self._operationHandle is None or self._operationHandle.resultSet is None:
+        if self._metadata is None:
             return None
         if self._description is None:
-            meta = self._operationHandle.resultSet.metadata
+            meta = self._metadata
             self._description = []
             for col in meta:
                 name = col.name.decode('utf-8') if sys.version_info[0] == 2 else col.name
@@ -205,121 +1211,459 @@ class Cursor(common.DBAPICursor):
     def execute(self, operation, parameters=None):
         """Prepare and execute a database operation (query or command).
 
+        With parameters, the operation is prepared on the server through the connection's
+        statement cache and the parameters are bound, unless the cache is disabled or a parameter
+        is a sequence to be expanded into an ``IN`` list.
+
+        With a result cache on the connection, a read-only query is answered from the cache if
+        possible, and its result is cached once all of it has been fetched. Other statements
+        invalidate the cached results of the table they modify.
+
         Return values are not defined.
         """
-        # Prepare statement
-        if parameters is None:
-            sql = operation
+        self._reset_state()
+        with self._instrument(operation, parameters):
+            self._execute_cached(operation, parameters)
+
+    def _execute_cached(self, operation, parameters):
+        """Answer a read-only query from the result cache, or execute it and record its result"""
+        cache = self._connection.result_cache
+        key = None
+        if cache is not None and _READ_ONLY.match(operation):
+            key = cache.key(operation, parameters, self._connection.cache_scope)
+            batches = cache.get(key) if key is not None else None
+            if batches is not None:
+                _logger.info('%s [cached]', operation)
+                self._rowcount = 0
+                self._stats.cached = True
+                self._prefetcher = _CachedResult(batches, self._connection.decode)
+                rowset, _ = self._prefetcher.get()
+                self._set_metadata(rowset.metadata)
+                self._add_rowset(rowset)
+                return
+            generation = cache.generation
+        # Results of other schemas are kept apart by the cache key, not invalidated
+        schema = resultcache.schema_set(operation)
+        try:
+            self._execute(operation, parameters)
+        finally:
+            if cache is not None and not _READ_ONLY.match(operation) and schema is None:
+                self._invalidate(cache, operation)
+        if schema is not None:
+            self._connection._schema = schema
+        # LOBs past their first chunk are read from the server, so cached rows could not hold them.
+        # Value lists cannot be encoded again.
+        if key is not None and self._metadata is not None and self._connection.decode == wiredecode.OBJECTS and \
+                not any(column.type in converters.LOB_TYPES for column in self._metadata):
+            self._recording = _Recording(cache, key, resultcache.tables_read(operation), generation)
+            self._record(self._rowset)
+
+    @contextlib.contextmanager
+    def _instrument(self, operation, parameters):
+        """Start fresh query stats for ``operation`` and call the hooks around running it"""
+        self._stats = _QueryStats(operation)
+        self._hooks = self._connection.hooks
+        if self._hooks:
+            _hooks.notify(self._hooks, 'before_execute', self, operation, parameters)
+        start = time.time()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._stats.elapsed = time.time() - start
+            if self._hooks:
+                _hooks.notify(self._hooks, 'after_execute', self, self._stats.as_dict(), error)
+
+    def _request(self, call, *args):
+        """Run ``call(*args)`` on the connection, adding the request times and bytes received to
+        the query stats. Returns its result and the bytes received.
+        """
+        connection = self._connection
+        with connection._lock:
+            before = connection._request_totals()
+            try:
+                result = call(*args)
+            finally:
+                requests = _since(before, connection._request_totals())
+                self._stats.add_requests(requests)
+        return result, requests[3]
+
+    def _execute(self, operation, parameters):
+        attrs = ttypes.StatementAttrs(batchSize=self._batch_size)
+        stats = self._stats
+        start = time.time()
+        if parameters and _bindable(parameters) and \
+                (self._connection.statement_cache_enabled or _streams(parameters)):
+            sql, names = _to_qmark(operation)
+            stats.escape_time += time.time() - start
+            stats.prepared = True
+            _logger.info('%s', sql)
+            self._statement, _ = self._request(self._connection.prepare, sql)
+            # Binding may upload LOBs, whose requests count with the statement's
+            self._operationHandle, nbytes = self._request(lambda: self._connection.execute_prepared(
+                self._statement, self._bind(self._statement, _marker_values(names, parameters)), attrs))
         else:
-            sql = operation % _escaper.escape_args(parameters)
+            if parameters is None:
+                sql = operation
+            else:
+                sql = operation % _escaper.escape_args(parameters)
+                stats.escape_time += time.time() - start
+            _logger.info('%s', sql)
+            self._operationHandle, nbytes = self._request(self._connection.execute, sql, attrs)
+        self._rowcount = 0
+        if self._operationHandle is not None and self._operationHandle.resultSet is not None:
+            self._set_metadata(self._operationHandle.resultSet.metadata)
+            self._add_rowset(self._operationHandle.resultSet, nbytes)
+            self._start_prefetch()
+        else:
+            self._update_rowcount()
+            self._release_statement()
+
+    @staticmethod
+    def _invalidate(cache, operation):
+        """Drop the cached results a statement may have changed"""
+        table = resultcache.table_modified(operation)
+        cache.invalidate([table] if table is not None else None)
+
+    def _record(self, rowset):
+        """Add a batch to the result being recorded for the cache, storing it after the last one"""
+        recording = self._recording
+        batch = resultcache.encode_batch(rowset)
+        recording.batches.append(batch)
+        recording.nbytes += len(batch)
+        # Offered to the cache as soon as it is too big, for the cache to count it as rejected
+        if self._last_batch or recording.nbytes > recording.cache.max_entry_bytes:
+            recording.cache.put(recording.key, recording.batches, recording.tables, recording.generation)
+            self._recording = None
+
+    def executemany(self, operation, seq_of_parameters):
+        """Prepare a DML operation once and execute it for every parameter set in
+        ``seq_of_parameters``, sending them to the server in chunks with ``executePreparedBatch``.
+
+        :py:attr:`rowcount` is the total of the update counts of all parameter sets. Falls back to
+        one :py:meth:`execute` per parameter set when the statement cache is disabled or the
+        parameters cannot be bound.
+        """
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        if not seq_of_parameters or not self._connection.statement_cache_enabled or \
+                not all(parameters and _bindable(parameters) for parameters in seq_of_parameters):
+            return super(Cursor, self).executemany(operation, seq_of_parameters)
 
         self._reset_state()
+        with self._instrument(operation, seq_of_parameters):
+            self._executemany(operation, seq_of_parameters)
 
-        _logger.info('%s', sql)
-        self._operationHandle = self._connection.execute(sql)
-        if self._operationHandle is not None and self._operationHandle.resultSet is not None:
-            self._data += self._build_data()
-        self._update_rowcount()
-
-    def _build_data(self):
-        data = []
-        for row in self._operationHandle.resultSet.rows:
-            item = []
-            for column, descriptor in zip(row.values, self._operationHandle.resultSet.metadata):
-                item.append(self._build_item(column, descriptor))
-            data.append(item)
-        return data
+    def _executemany(self, operation, seq_of_parameters):
+        start = time.time()
+        sql, names = _to_qmark(operation)
+        self._stats.escape_time += time.time() - start
+        self._stats.prepared = True
+        _logger.info('%s [%d parameter sets]', sql, len(seq_of_parameters))
+        self._statement, _ = self._request(self._connection.prepare, sql)
+        statement = self._statement
+        attrs = ttypes.StatementAttrs(batchSize=self._batch_size)
+        self._rowcount = 0
+        parameters = iter(seq_of_parameters)
+        chunks = iter(lambda: [self._bind(statement, _marker_values(names, p))
+                               for p in itertools.islice(parameters, self._executemany_chunksize)], [])
+        # Not under the lock throughout, so that other cursors can go on between batches
+        before = self._connection._request_totals()
+        try:
+            for result in self._connection.execute_prepared_batches(self._statement, chunks, attrs):
+                if result.batchUpdateCounts is not None:
+                    count = sum(count for count in result.batchUpdateCounts if count > 0)
+                else:
+                    count = result.updateCount
+                # Unknown for the whole batch as soon as one chunk reports no count
+                if count is None or count < 0 or self._rowcount < 0:
+                    self._rowcount = -1
+                else:
+                    self._rowcount += count
+        finally:
+            self._stats.add_requests(_since(before, self._connection._request_totals()))
+            if self._connection.result_cache is not None:
+                self._invalidate(self._connection.result_cache, operation)
+        self._release_statement()
+
+    def execute_parallel(self, operation, table, workers=4, parameters=None, buckets=None):
+        """Execute a query over a partitioned ``table`` on ``workers`` connections in parallel.
+
+        The table's buckets (or the bucket ids in ``buckets``) are split into ``workers``
+        disjoint sets, and each set is scanned on its own connection. Connections are spread
+        round-robin over the cluster's servers. The batches of all scans are merged, in arrival
+        order, into this cursor's result, which is read with the usual fetch methods. Row order
+        across buckets is not defined.
+
+        The query should only read ``table``, since the bucket restriction applies to it alone.
+        """
+        if parameters is not None:
+            operation = operation % _escaper.escape_args(parameters)
+        if buckets is None:
+            buckets = range(self._total_buckets(table))
+        buckets = sorted(buckets)
+        if not buckets:
+            raise ProgrammingError("No buckets to scan")
+        workers = max(1, min(workers, len(buckets)))
+
+        self._reset_state()
+        _logger.info('%s [%d workers]', operation, workers)
+        with self._instrument(operation, parameters):
+            self._rowcount = 0
+            self._prefetcher = _ParallelScan(self._connection, operation, table,
+                                             [buckets[i::workers] for i in range(workers)],
+                                             self._batch_size, max(1, self._prefetch))
+            rowset, _ = self._prefetcher.get()
+            self._set_metadata(rowset.metadata)
+            self._add_rowset(rowset)
+
+    def _total_buckets(self, table):
+        """Number of buckets of a partitioned table, from the catalog"""
+        schema, _, name = table.upper().rpartition('.')
+        cursor = Cursor(self._connection)
+        try:
+            if schema:
+                cursor.execute("SELECT PARTITIONATTRS FROM SYS.SYSTABLES "
+                               "WHERE TABLESCHEMANAME = %s AND TABLENAME = %s", (schema, name))
+            else:
+                cursor.execute("SELECT PARTITIONATTRS FROM SYS.SYSTABLES "
+                               "WHERE TABLESCHEMANAME = CURRENT SCHEMA AND TABLENAME = %s", (name,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        match = _TOTAL_NUM_BUCKETS.search(row[0] or '') if row else None
+        if match is None:
+            raise ProgrammingError("{} is not a partitioned table".format(table))
+        return int(match.group(1))
+
+    def _start_prefetch(self):
+        if self._prefetch > 0 and not self._last_batch:
+            self._prefetcher = _BatchPrefetcher(self._connection, self._rowset.cursorId, self._batch_size,
+                                                self._prefetch)
+
+    def _set_metadata(self, metadata):
+        self._metadata = metadata
+        self._description = None
+        self._row = self._row_type
+        if hasattr(self._row, 'for_description'):
+            self._row = self._row.for_description(self.description)
+        self._values = self._connection.decode == wiredecode.VALUES
+        self._decoder = converters.compile_row_decoder(metadata, self._open_lob, self._row, self._values)
+
+    def _open_lob(self, chunk, clob):
+        if self._lazy_lobs:
+            return (lob.Clob if clob else lob.Blob)(self._connection, chunk, self._lob_chunk_size)
+        return self._read_lob(chunk, clob)
+
+    def _read_lob(self, chunk, clob):
+        """The whole value of a LOB starting with ``chunk``"""
+        if chunk.last or chunk.lobId is None:
+            return chunk.chunk
+        with (lob.Clob if clob else lob.Blob)(self._connection, chunk, self._lob_chunk_size) as reader:
+            return reader.read()
+
+    def _bind(self, statement, values):
+        """Encode parameter values, first uploading those of LOB parameters that are streamed"""
+        for i, descriptor in enumerate(statement.result.parameterMetaData or ()):
+            if i < len(values) and descriptor.type in converters.LOB_TYPES and \
+                    lob.streamable(values[i], self._lob_chunk_size):
+                values[i] = self._connection.upload_lob(values[i], descriptor.type != ttypes.SnappyType.BLOB,
+                                                        self._lob_chunk_size)
+        start = time.time()
+        row = statement.encode(values)
+        self._stats.escape_time += time.time() - start
+        return row
+
+    def _add_rowset(self, rowset, nbytes=0):
+        """Make ``rowset``, received in ``nbytes`` bytes, the current batch and track whether the
+        server has more.
 
-    def _build_item(self, column, descriptor):
-        if column.null_val is not None and column.null_val:
+        Its rows stay undecoded in ``self._pending`` until they are fetched.
+        """
+        self._rowset = rowset
+        self._session = self._connection.session
+        self._pending = rowset.rows
+        self._last_batch = bool(rowset.flags & constants.ROWSET_LAST_BATCH) or rowset.cursorId == constants.INVALID_ID
+        self._rowcount += len(rowset.rows)
+        self._stats.rows += len(rowset.rows)
+        self._stats.batches += 1
+        if self._hooks:
+            _hooks.notify(self._hooks, 'on_batch', self, len(rowset.rows), nbytes)
+        self._update_state()
+        if self._recording is not None:
+            self._record(rowset)
+
+    def _update_state(self):
+        if self._pending or not self._last_batch:
+            self._state = self._STATE_RUNNING
+        else:
+            self._state = self._STATE_FINISHED
+
+    def _receive_rowset(self):
+        """Next batch of the open server cursor, from the prefetch queue if there is one, and the
+        bytes it took
+        """
+        if self._prefetcher is not None:
+            rowset, requests = self._prefetcher.get()
+            if requests is None:
+                return rowset, 0
+            self._stats.add_requests(requests)
+            return rowset, requests[3]
+        return self._request(self._connection.scroll_cursor, self._rowset.cursorId, self._batch_size)
+
+    def _fetch_more(self):
+        if self._pending:
+            self._set_data(self._build_data(self._pending))
+            self._pending = None
+            self._update_state()
+        else:
+            self._add_rowset(*self._receive_rowset())
+
+    def _iter_batches(self, max_rows=None):
+        """Consume up to ``max_rows`` (default: all) of the remaining rows in chunks.
+
+        Yields ``(rows, decoded)`` pairs. Rows already converted for :py:meth:`fetchone` come first
+        with ``decoded`` true; after that each chunk is a list of undecoded rows straight from a
+        batch, ``ttypes.Row`` or value lists depending on the connection's ``decode`` mode, so
+        columnar consumers can skip row conversion altogether.
+        """
+        remaining = max_rows
+        rows = self._data[self._rownumber - self._data_start:]
+        if rows:
+            rows = rows[:remaining]
+            self._rownumber += len(rows)
+            if remaining is not None:
+                remaining -= len(rows)
+            yield rows, True
+        while remaining is None or remaining > 0:
+            if not self._pending:
+                if self._last_batch:
+                    break
+                self._add_rowset(*self._receive_rowset())
+                continue
+            rows = self._pending
+            if remaining is not None and len(rows) > remaining:
+                rows, self._pending = rows[:remaining], rows[remaining:]
+            else:
+                self._pending = None
+            self._update_state()
+            self._rownumber += len(rows)
+            if remaining is not None:
+                remaining -= len(rows)
+            yield rows, False
+
+    @property
+    def prefetch_stats(self):
+        """Statistics of the background prefetch of the current result set, or ``None`` if
+        prefetching is off or the result set fit in one batch.
+
+        - depth: configured maximum number of queued batches
+        - queued: batches currently decoded and waiting
+        - batches: batches fetched in the background so far
+        - bytes_buffered: wire bytes of the queued batches
+        - stalls: fetches that had to wait for the background thread
+        - stall_time: total seconds spent waiting
+
+        After :py:meth:`execute_parallel`, ``bytes_buffered`` is replaced by ``workers``,
+        ``running`` (workers not done yet) and ``servers`` (workers per ``(host, port)``).
+        """
+        if self._prefetcher is None:
             return None
-        if column is None or descriptor is None:
+        return self._prefetcher.stats()
+
+    @property
+    def last_query_stats(self):
+        """Where the time of the last statement went, as a dict of the keys described in
+        :py:mod:`pysnappydata.hooks`, or ``None`` before the first statement. Fetching the rest of
+        a result adds its requests, rows, batches and build time.
+        """
+        if self._stats is None:
             return None
-        if descriptor.type == ttypes.SnappyType.BOOLEAN:
-            return column.bool_val
-        elif descriptor.type == ttypes.SnappyType.TINYINT:
-            return column.byte_val
-        elif descriptor.type == ttypes.SnappyType.SMALLINT:
-            return column.i16_val
-        elif descriptor.type == ttypes.SnappyType.INTEGER:
-            return column.i32_val
-        elif descriptor.type == ttypes.SnappyType.BIGINT:
-            return column.i64_val
-        elif descriptor.type == ttypes.SnappyType.FLOAT or descriptor.type == ttypes.SnappyType.DOUBLE:
-            return column.double_val
-        elif descriptor.type == ttypes.SnappyType.CHAR or descriptor.type == ttypes.SnappyType.VARCHAR or descriptor.type == ttypes.SnappyType.LONGVARCHAR:
-            return column.string_val
-        elif descriptor.type == ttypes.SnappyType.DECIMAL:
-            return column.decimal_val
-        elif descriptor.type == ttypes.SnappyType.DATE:
-            return column.date_val
-        elif descriptor.type == ttypes.SnappyType.TIME:
-            return column.time_val
-        elif descriptor.type == ttypes.SnappyType.TIMESTAMP:
-            return column.timestamp_val
-        elif descriptor.type == ttypes.SnappyType.BINARY or descriptor.type == ttypes.SnappyType.VARBINARY or descriptor.type == ttypes.SnappyType.LONGVARBINARY:
-            return column.binary_val
-        elif descriptor.type == ttypes.SnappyType.BLOB:
-            return column.blob_val.chunk
-        elif descriptor.type == ttypes.SnappyType.CLOB or descriptor.type == ttypes.SnappyType.JSON or descriptor.type == ttypes.SnappyType.SQLXML:
-            return column.clob_val.chunk
-        elif descriptor.type == ttypes.SnappyType.ARRAY:
-            return self._build_array(column.array_val, descriptor.elementTypes[0])
-        elif descriptor.type == ttypes.SnappyType.MAP:
-            return self._build_map(column.map_val, descriptor.elementTypes[0], descriptor.elementTypes[1])
-        elif descriptor.type == ttypes.SnappyType.STRUCT:
-            return self._build_struct(column.struct_val, descriptor.elementTypes)
-        elif descriptor.type == ttypes.SnappyType.NULLTYPE:
-            return column.null_val
-        elif descriptor.type == ttypes.SnappyType.JAVA_OBJECT:
-            return column.java_val
-        else:
-            return column
+        return self._stats.as_dict()
+
+    def _build_data(self, rows):
+        start = time.time()
+        data = list(map(self._decoder, rows))
+        self._stats.build_time += time.time() - start
+        return data
+
+    def fetch_numpy(self, batch_rows=None):
+        """Fetch up to ``batch_rows`` (default: all) remaining rows as one NumPy array per column.
+
+        Returns an ordered mapping of column name to ``numpy.ma.MaskedArray`` whose mask marks
+        NULLs. TINYINT..BIGINT map to int8..int64, FLOAT/DOUBLE to float64, BOOLEAN to bool and
+        DATE/TIMESTAMP to datetime64[ms]; other types become object arrays. Requires NumPy.
+        """
+        if self._metadata is None:
+            raise ProgrammingError("No result set")
+        from pysnappydata import columnar
+        return columnar.fetch_numpy(self, batch_rows)
 
+    def fetch_dataframe(self, batch_rows=None, **kwargs):
+        """Fetch up to ``batch_rows`` (default: all) remaining rows as a pandas DataFrame built
+        column by column, see :py:func:`pysnappydata.columnar.fetch_dataframe`. Requires pandas.
+        """
+        if self._metadata is None:
+            raise ProgrammingError("No result set")
+        from pysnappydata import columnar
+        return columnar.fetch_dataframe(self, batch_rows, **kwargs)
 
-    def _build_array(self, elems, descriptor):
-        ret = []
-        for elem in elems:
-            ret.append(self._build_item(elem, descriptor))
-        return ret
+    def fetch_arrow_batches(self, batch_rows=None):
+        """Yield the remaining rows as ``pyarrow.RecordBatch`` objects, one per batch received
+        from the server or of at most ``batch_rows`` rows. Requires pyarrow.
 
-    def _build_map(self, map, descriptor1, descriptor2):
-        ret = {}
-        for first, second in map.items():
-            k = self._build_item(first, descriptor1)
-            v = self._build_item(second, descriptor2)
-            ret[k] = v
-        return ret
+        Types map as in :py:func:`pysnappydata.columnar.arrow_type`: DECIMAL to decimal128/256
+        of the column precision and scale, BINARY/BLOB to binary, ARRAY/MAP/STRUCT to list, map
+        and struct types of their ``elementTypes``. All batches share one schema; types the
+        metadata leaves open are inferred from the first batch.
+        """
+        if self._metadata is None:
+            raise ProgrammingError("No result set")
+        from pysnappydata import columnar
+        return columnar.fetch_arrow_batches(self, batch_rows)
 
-    def _build_struct(self, fields, descriptors):
-        ret = []
-        for field, descriptor in zip(fields, descriptors):
-            ret.append(self._build_item(field, descriptor))
-        return ret
+    def fetch_arrow_table(self):
+        """Fetch the remaining rows as one ``pyarrow.Table``. Requires pyarrow."""
+        if self._metadata is None:
+            raise ProgrammingError("No result set")
+        from pysnappydata import columnar
+        return columnar.fetch_arrow_table(self)
 
     def cancel(self):
         self._connection.cancel_current_statement()
 
     def _update_rowcount(self):
-        if self._operationHandle is None:
-            return
-        if self._operationHandle.updateCount != 0:
+        if self._operationHandle is not None and self._operationHandle.updateCount is not None:
             self._rowcount = self._operationHandle.updateCount
-        elif self._operationHandle.resultSet is not None:
-            self._rowcount = len(self._operationHandle.resultSet.rows)
-        else:
-            return 0
 
     @property
     def rowcount(self):
+        """Affected rows for DML. For queries, the number of rows received from the server so far,
+        which is the size of the result set once it has been fetched completely.
+        """
         return self._rowcount
 
     def nextset(self):
-        if self._operationHandle.resultSet.RowSet.cursorId > 0:
-            self._operationHandle = self._connection.get_next_result_set()
-            del self._data[:]
-            self._data += self._operationHandle.resultSet.rows
-            self._rownumber = 0
+        """Skip to the next result set of a multi-result statement (e.g. CALL), discarding any
+        unread rows of the current one. Returns ``None`` when there are no more result sets.
+        """
+        if self._rowset is None or not self._rowset.flags & constants.ROWSET_HAS_MORE_ROWSETS:
+            return None
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        rowset, nbytes = self._request(self._connection.get_next_result_set, self._rowset.cursorId)
+        self._rownumber = 0
+        self._set_data([])
+        self._rowcount = 0
+        self._description = None
+        self._set_metadata(rowset.metadata)
+        self._add_rowset(rowset, nbytes)
+        self._start_prefetch()
+        return True
 
     @property
     def handle(self):
@@ -0,0 +1,557 @@
+"""Stub SnappyData server serving synthetic data, for benchmarks and tests
+
+:py:class:`StubServer` answers the requests of the driver with the generated
+``SnappyDataService.Processor``, so every driver path can be exercised and timed on one machine
+without a cluster. Every query returns the same synthetic result set, shaped by:
+
+- ``rows``: rows in the result set
+- ``columns``: SnappyType of each column, or ``ttypes.ColumnDescriptor`` objects. MAP values are
+  always NULL, since the generated ``ttypes.ColumnValue`` keys cannot be hashed on Python 3
+- ``batch_size``: most rows sent per batch, whatever the client asks for
+- ``null_ratio``: share of NULL values, spread deterministically over rows and columns
+- ``lob_size``: bytes or characters of each BLOB/CLOB value; values longer than ``lob_chunk_size``
+  come as a first chunk, the rest being read with ``getBlobChunk``/``getClobChunk``
+- ``latency``: seconds to sleep before answering each request
+- ``parameters``: SnappyType of the parameters of prepared statements, by default those of the
+  result columns in turn
+
+Other statements (``INSERT`` etc.) count one updated row each and are otherwise discarded, as
+are uploaded LOBs. The server also answers the locator calls with ``servers``, by default
+itself, so it can stand in for a locator.
+
+.. code-block:: python
+
+    from pysnappydata import snappydata, testing
+    from SDTCLIService.ttypes import SnappyType
+
+    with testing.StubServer(rows=100000, columns=[SnappyType.INTEGER, SnappyType.VARCHAR],
+                            null_ratio=0.1, latency=0.0005) as server:
+        connection = snappydata.connect('127.0.0.1', server.port)
+
+Rows are generated once and every batch repeats the first rows, so row values are not unique
+across batches. With ``process=True`` the server runs in a child process, so that it does not
+compete with the client for the GIL; its :py:attr:`StubServer.handler` then only shows the
+configuration.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import itertools
+import logging
+import multiprocessing
+import re
+import socket
+import threading
+import time
+
+from builtins import object
+import thrift.protocol.TCompactProtocol
+import thrift.transport.TSocket
+import thrift.transport.TTransport
+from thrift.transport.TTransport import TTransportException
+
+from SDTCLIService import SnappyDataService
+from SDTCLIService import constants
+from SDTCLIService import ttypes
+from pysnappydata import converters
+from pysnappydata import exc
+from pysnappydata import transport as _transport
+
+_logger = logging.getLogger(__name__)
+
+_T = ttypes.SnappyType
+
+# ID, TS, PRICE, NAME, REGION
+DEFAULT_COLUMNS = (_T.INTEGER, _T.BIGINT, _T.DOUBLE, _T.VARCHAR, _T.CHAR)
+
+_PRECISION = {
+    _T.BOOLEAN: 1, _T.TINYINT: 3, _T.SMALLINT: 5, _T.INTEGER: 10, _T.BIGINT: 19, _T.FLOAT: 7,
+    _T.DOUBLE: 15, _T.CHAR: 8, _T.VARCHAR: 32, _T.LONGVARCHAR: 32700, _T.DECIMAL: 12, _T.DATE: 10,
+    _T.TIME: 8, _T.TIMESTAMP: 29,
+}
+
+_ELEMENT_TYPES = {
+    _T.ARRAY: [_T.INTEGER],
+    _T.STRUCT: [_T.INTEGER, _T.DOUBLE],
+}
+
+_REGIONS = ('north', 'south', 'east', 'west')
+_BYTES = bytes(bytearray(range(256)))
+_TEXT = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+_QUERY = re.compile(r'\s*\(*\s*(SELECT|VALUES|WITH|CALL|SHOW|DESCRIBE)\b', re.IGNORECASE)
+_PARTITION_ATTRS = re.compile(r'\s*SELECT\s+PARTITIONATTRS\b', re.IGNORECASE)
+
+
+def column_descriptors(columns):
+    """``ttypes.ColumnDescriptor`` list for ``columns``, SnappyType values being named C0, C1, ..."""
+    descriptors = []
+    for i, column in enumerate(columns):
+        if not isinstance(column, ttypes.ColumnDescriptor):
+            column = ttypes.ColumnDescriptor(type=column, name='C{}'.format(i), precision=_PRECISION.get(column, 0),
+                                             scale=2 if column == _T.DECIMAL else None, nullable=True,
+                                             elementTypes=_ELEMENT_TYPES.get(column))
+        descriptors.append(column)
+    return descriptors
+
+
+def _pattern(data, offset, size):
+    """``size`` items of ``data`` repeated, starting at ``offset``"""
+    start = offset % len(data)
+    return (data * ((start + size) // len(data) + 1))[start:start + size]
+
+
+def _is_null(row, column, null_ratio):
+    return null_ratio > 0 and (row * 7919 + column * 104729) % 1000 < null_ratio * 1000
+
+
+class StubHandler(object):
+    """``SnappyDataService`` handler of :py:class:`StubServer`; see the module documentation for
+    the arguments. :py:attr:`requests` counts the requests received by method name.
+    """
+
+    def __init__(self, rows=1000, columns=DEFAULT_COLUMNS, batch_size=None, null_ratio=0.0, lob_size=1024,
+                 lob_chunk_size=constants.DEFAULT_LOB_CHUNKSIZE, latency=0.0, parameters=None, servers=None,
+                 buckets=113):
+        self.rows = rows
+        self.metadata = column_descriptors(columns)
+        self.parameters = column_descriptors(parameters) if parameters is not None else self.metadata
+        self.batch_size = batch_size
+        self.null_ratio = null_ratio
+        self.lob_size = lob_size
+        self.lob_chunk_size = lob_chunk_size
+        self.latency = latency
+        self.servers = servers
+        self.buckets = buckets
+        # Set by StubServer once it listens
+        self.address = None
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._template = []
+        # Rows left, by cursor id
+        self._cursors = {}
+        self._statements = {}
+        self._lob_bytes = 0
+
+    def _request(self, name):
+        with self._lock:
+            self.requests[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    #
+    # Synthetic values
+    #
+
+    def _value(self, type_, i, element_types=None, lob_column=0):
+        if type_ == _T.BOOLEAN:
+            return ttypes.ColumnValue(bool_val=bool(i & 1))
+        elif type_ == _T.TINYINT:
+            return ttypes.ColumnValue(byte_val=i % 128)
+        elif type_ == _T.SMALLINT:
+            return ttypes.ColumnValue(i16_val=i % 32768)
+        elif type_ == _T.INTEGER:
+            return ttypes.ColumnValue(i32_val=i % 2 ** 31)
+        elif type_ == _T.BIGINT:
+            return ttypes.ColumnValue(i64_val=i * 1000)
+        elif type_ == _T.FLOAT or type_ == _T.DOUBLE:
+            return ttypes.ColumnValue(double_val=i * 0.5)
+        elif type_ == _T.CHAR:
+            return ttypes.ColumnValue(string_val=_REGIONS[i % len(_REGIONS)])
+        elif type_ == _T.VARCHAR or type_ == _T.LONGVARCHAR:
+            return ttypes.ColumnValue(string_val='name-{}'.format(i))
+        elif type_ == _T.DECIMAL:
+            return ttypes.ColumnValue(decimal_val=converters._to_decimal('{}.{:02d}'.format(i // 100, i % 100)))
+        elif type_ == _T.DATE:
+            return ttypes.ColumnValue(date_val=i % 20000 * 86400)
+        elif type_ == _T.TIME:
+            return ttypes.ColumnValue(time_val=i % 86400)
+        elif type_ == _T.TIMESTAMP:
+            return ttypes.ColumnValue(timestamp_val=i * 1000000000)
+        elif type_ in (_T.BINARY, _T.VARBINARY, _T.LONGVARBINARY):
+            return ttypes.ColumnValue(binary_val=_pattern(_BYTES, i, 16))
+        elif type_ == _T.BLOB:
+            return ttypes.ColumnValue(blob_val=self._lob_chunk(ttypes.BlobChunk, _BYTES, lob_column, 0,
+                                                               self.lob_chunk_size))
+        elif type_ in (_T.CLOB, _T.JSON, _T.SQLXML):
+            return ttypes.ColumnValue(clob_val=self._lob_chunk(ttypes.ClobChunk, _TEXT, lob_column, 0,
+                                                               self.lob_chunk_size))
+        elif type_ == _T.ARRAY:
+            element = (element_types or [_T.INTEGER])[0]
+            return ttypes.ColumnValue(array_val=[self._value(element, i + k) for k in range(3)])
+        elif type_ == _T.STRUCT:
+            return ttypes.ColumnValue(struct_val=[self._value(t, i) for t in element_types or [_T.INTEGER]])
+        return ttypes.ColumnValue(null_val=True)
+
+    def _lob_chunk(self, make, data, lob_id, offset, size):
+        """Chunk of a synthetic LOB; all LOBs of a column have the same content and id"""
+        size = max(0, min(size, self.lob_size - offset))
+        last = offset + size >= self.lob_size
+        return make(chunk=_pattern(data, offset, size), last=last, lobId=None if last and offset == 0 else lob_id,
+                    offset=offset, totalLength=self.lob_size)
+
+    def _row(self, i):
+        return ttypes.Row(values=[
+            ttypes.ColumnValue(null_val=True) if _is_null(i, c, self.null_ratio) and column.nullable is not False
+            else self._value(column.type, i, column.elementTypes, c + 1)
+            for c, column in enumerate(self.metadata)])
+
+    def _rows(self, n):
+        """The first ``n`` synthetic rows, generated once"""
+        if len(self._template) < n:
+            with self._lock:
+                if len(self._template) < n:
+                    self._template = self._template + [self._row(i) for i in range(len(self._template), n)]
+        return self._template[:n]
+
+    #
+    # Result sets
+    #
+
+    def _open_cursor(self, sql, attrs):
+        if _PARTITION_ATTRS.match(sql):
+            metadata = [ttypes.ColumnDescriptor(type=_T.VARCHAR, name='PARTITIONATTRS', precision=32672)]
+            rows = [ttypes.Row(values=[ttypes.ColumnValue(string_val='totalNumBuckets={}'.format(self.buckets))])]
+            return ttypes.RowSet(rows=rows, flags=constants.ROWSET_LAST_BATCH, cursorId=constants.INVALID_ID,
+                                 metadata=metadata)
+        total = self.rows
+        if attrs is not None and attrs.bucketIds:
+            # Row i is in bucket i % buckets, so scans of disjoint buckets add up to all rows
+            total = sum((total - b + self.buckets - 1) // self.buckets
+                        for b in attrs.bucketIds if 0 <= b < self.buckets)
+        cursorid = next(self._ids)
+        self._cursors[cursorid] = total
+        rowset = self._batch(cursorid, attrs.batchSize if attrs is not None and attrs.batchSize else None)
+        rowset.metadata = self.metadata
+        return rowset
+
+    def _batch(self, cursorid, size):
+        remaining = self._cursors.get(cursorid)
+        if remaining is None:
+            raise ttypes.SnappyException(exceptionData=ttypes.SnappyExceptionData(
+                reason='No open cursor {}'.format(cursorid), errorCode=20000, sqlState='XCL16'))
+        n = min(size or constants.DEFAULT_RESULTSET_BATCHSIZE, self.batch_size or remaining, remaining)
+        remaining -= n
+        last = remaining <= 0
+        if last:
+            del self._cursors[cursorid]
+        else:
+            self._cursors[cursorid] = remaining
+        return ttypes.RowSet(rows=self._rows(n), flags=constants.ROWSET_LAST_BATCH if last else 0,
+                             cursorId=constants.INVALID_ID if last else cursorid, statementId=1, connId=1)
+
+    def _statement_result(self, sql, attrs):
+        if _QUERY.match(sql):
+            return ttypes.StatementResult(resultSet=self._open_cursor(sql, attrs), updateCount=-1)
+        return ttypes.StatementResult(updateCount=1)
+
+    #
+    # SnappyDataService
+    #
+
+    def getPreferredServer(self, serverTypes, serverGroups, failedServers):
+        self._request('getPreferredServer')
+        return self._addresses(failedServers)[0]
+
+    def getAllServersWithPreferredServer(self, serverTypes, serverGroups, failedServers):
+        self._request('getAllServersWithPreferredServer')
+        return self._addresses(failedServers)
+
+    def _addresses(self, failed):
+        failed = set((address.hostName, address.port) for address in failed or ())
+        servers = [server for server in self.servers or [self.address] if server not in failed]
+        return [ttypes.HostAddress(hostName=host, port=port) for host, port in servers or self.servers or [self.address]]
+
+    def openConnection(self, arguments):
+        self._request('openConnection')
+        # As in SnappyData, the default schema is the user's
+        return ttypes.ConnectionProperties(connId=next(self._ids), clientHostName=arguments.clientHostName,
+                                           clientID=arguments.clientID, userName=arguments.userName,
+                                           token=b'stub-token', defaultSchema=(arguments.userName or 'APP').upper())
+
+    def closeConnection(self, connId, closeSocket, token):
+        self._request('closeConnection')
+
+    def execute(self, connId, sql, outputParams, attrs, token):
+        self._request('execute')
+        return self._statement_result(sql, attrs)
+
+    def executeQuery(self, connId, sql, attrs, token):
+        self._request('executeQuery')
+        return self._open_cursor(sql, attrs)
+
+    def executeUpdate(self, connId, sqls, attrs, token):
+        self._request('executeUpdate')
+        return ttypes.UpdateResult(updateCount=len(sqls), batchUpdateCounts=[1] * len(sqls))
+
+    def scrollCursor(self, cursorId, offset, offsetIsAbsolute, fetchReverse, fetchSize, token):
+        self._request('scrollCursor')
+        return self._batch(cursorId, fetchSize)
+
+    def getNextResultSet(self, cursorId, otherResultSetBehaviour, token):
+        self._request('getNextResultSet')
+        self._cursors.pop(cursorId, None)
+        return ttypes.RowSet(rows=[], flags=constants.ROWSET_LAST_BATCH, cursorId=constants.INVALID_ID,
+                             metadata=self.metadata)
+
+    def closeResultSet(self, cursorId, token):
+        self._request('closeResultSet')
+        self._cursors.pop(cursorId, None)
+
+    def prepareStatement(self, connId, sql, outputParams, attrs, token):
+        self._request('prepareStatement')
+        statementid = next(self._ids)
+        self._statements[statementid] = sql
+        types = self.parameters
+        if _PARTITION_ATTRS.match(sql):
+            types = column_descriptors([_T.VARCHAR])
+        parameters = [types[i % len(types)] for i in range(sql.count('?'))] if types else []
+        query = bool(_QUERY.match(sql))
+        return ttypes.PrepareResult(
+            statementId=statementid,
+            statementType=constants.STATEMENT_TYPE_SELECT if query else constants.STATEMENT_TYPE_INSERT,
+            parameterMetaData=parameters, resultSetMetaData=self.metadata if query else None)
+
+    def _statement(self, stmtId):
+        sql = self._statements.get(stmtId)
+        if sql is None:
+            raise ttypes.SnappyException(exceptionData=ttypes.SnappyExceptionData(
+                reason='No prepared statement {}'.format(stmtId), errorCode=20000, sqlState='XCL07'))
+        return sql
+
+    def executePrepared(self, stmtId, params, outputParams, attrs, token):
+        self._request('executePrepared')
+        return self._statement_result(self._statement(stmtId), attrs)
+
+    def executePreparedQuery(self, stmtId, params, attrs, token):
+        self._request('executePreparedQuery')
+        return self._open_cursor(self._statement(stmtId), attrs)
+
+    def executePreparedUpdate(self, stmtId, params, attrs, token):
+        self._request('executePreparedUpdate')
+        self._statement(stmtId)
+        return ttypes.UpdateResult(updateCount=1)
+
+    def executePreparedBatch(self, stmtId, paramsBatch, attrs, token):
+        self._request('executePreparedBatch')
+        self._statement(stmtId)
+        return ttypes.UpdateResult(updateCount=len(paramsBatch), batchUpdateCounts=[1] * len(paramsBatch))
+
+    def closeStatement(self, stmtId, token):
+        self._request('closeStatement')
+        self._statements.pop(stmtId, None)
+
+    def bulkClose(self, entities):
+        self._request('bulkClose')
+        for entity in entities or ():
+            self._statements.pop(entity.id, None)
+            self._cursors.pop(entity.id, None)
+
+    def getBlobChunk(self, connId, lobId, offset, size, freeLobAtEnd, token):
+        self._request('getBlobChunk')
+        return self._lob_chunk(ttypes.BlobChunk, _BYTES, lobId, offset, size)
+
+    def getClobChunk(self, connId, lobId, offset, size, freeLobAtEnd, token):
+        self._request('getClobChunk')
+        return self._lob_chunk(ttypes.ClobChunk, _TEXT, lobId, offset, size)
+
+    def sendBlobChunk(self, chunk, connId, token):
+        self._request('sendBlobChunk')
+        return self._received_lob(chunk)
+
+    def sendClobChunk(self, chunk, connId, token):
+        self._request('sendClobChunk')
+        return self._received_lob(chunk)
+
+    def _received_lob(self, chunk):
+        self._lob_bytes += len(chunk.chunk or ())
+        return chunk.lobId if chunk.lobId is not None else next(self._ids)
+
+    def freeLob(self, connId, lobId, token):
+        self._request('freeLob')
+
+    def cancelCurrentStatement(self, connId, token):
+        self._request('cancelCurrentStatement')
+
+    def cancelStatement(self, stmtId, token):
+        self._request('cancelStatement')
+
+    def commitTransaction(self, connId, startNewTransaction, flags, token):
+        self._request('commitTransaction')
+
+    def rollbackTransaction(self, connId, startNewTransaction, flags, token):
+        self._request('rollbackTransaction')
+
+    @property
+    def lob_bytes_received(self):
+        """Total size of the LOB chunks uploaded with ``sendBlobChunk``/``sendClobChunk``"""
+        return self._lob_bytes
+
+
+class _ServerSocket(thrift.transport.TSocket.TServerSocket):
+    """Disables Nagle's algorithm like the real server, so pipelined replies are not held back"""
+
+    def accept(self):
+        client = super(_ServerSocket, self).accept()
+        if client is not None:
+            client.handle.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return client
+
+
+class _Listener(object):
+    """Accepts connections and serves each in its own daemon thread"""
+
+    def __init__(self, handler, host, port, transport):
+        if transport == _transport.TRANSPORT_FRAMED:
+            self._tfactory = thrift.transport.TTransport.TFramedTransportFactory()
+        elif transport == _transport.TRANSPORT_BUFFERED:
+            self._tfactory = thrift.transport.TTransport.TBufferedTransportFactory()
+        else:
+            raise exc.ProgrammingError("Unsupported transport: {}".format(transport))
+        self._pfactory = thrift.protocol.TCompactProtocol.TCompactProtocolAcceleratedFactory()
+        self._processor = SnappyDataService.Processor(handler)
+        self._socket = _ServerSocket(host, port)
+        self._socket.listen()
+        self.port = self._socket.handle.getsockname()[1]
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def serve(self):
+        while not self._closed:
+            try:
+                client = self._socket.accept()
+            except Exception:
+                if self._closed:
+                    return
+                _logger.debug("accept failed", exc_info=True)
+                continue
+            if client is None:
+                continue
+            thread = threading.Thread(target=self._serve_client, args=(client,), name='stub-server-client')
+            thread.daemon = True
+            thread.start()
+
+    def _serve_client(self, client):
+        with self._lock:
+            self._clients.add(client)
+        itrans = self._tfactory.getTransport(client)
+        otrans = self._tfactory.getTransport(client)
+        iprot = self._pfactory.getProtocol(itrans)
+        oprot = self._pfactory.getProtocol(otrans)
+        try:
+            while not self._closed:
+                self._processor.process(iprot, oprot)
+        except (TTransportException, EOFError, socket.error):
+            pass
+        except Exception:
+            _logger.warning("stub server request failed", exc_info=True)
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+            itrans.close()
+            otrans.close()
+
+    def drop_connections(self):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.handle.shutdown(socket.SHUT_RDWR)
+            except (AttributeError, socket.error):
+                pass
+
+    def close(self):
+        self._closed = True
+        try:
+            # Wakes up the blocked accept()
+            self._socket.handle.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._socket.close()
+        self.drop_connections()
+
+
+def _serve_in_process(kwargs, host, port, transport, ready):
+    handler = StubHandler(**kwargs)
+    handler.address = host, port
+    listener = _Listener(handler, host, port, transport)
+    ready.set()
+    listener.serve()
+
+
+def _free_port(host):
+    s = socket.socket()
+    s.bind((host, 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class StubServer(object):
+    """Stub SnappyData server on ``host:port`` (port 0 picks a free one) with the ``buffered``
+    or ``framed`` Thrift transport. Other keyword arguments go to :py:class:`StubHandler`.
+
+    Use as a context manager, or call :py:meth:`start` and :py:meth:`close`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, transport=_transport.TRANSPORT_BUFFERED, process=False, **kwargs):
+        self.host = host
+        self.port = port
+        self._transport = transport
+        self._process = process
+        self._kwargs = kwargs
+        self.handler = StubHandler(**kwargs)
+        self._listener = None
+        self._child = None
+
+    @property
+    def address(self):
+        """``(host, port)`` of the server"""
+        return self.host, self.port
+
+    def start(self):
+        """Start listening and serving in the background; returns the server"""
+        if self._process:
+            self.port = self.port or _free_port(self.host)
+            self.handler.address = self.address
+            ready = multiprocessing.Event()
+            self._child = multiprocessing.Process(target=_serve_in_process,
+                                                  args=(self._kwargs, self.host, self.port, self._transport, ready))
+            self._child.daemon = True
+            self._child.start()
+            if not ready.wait(10):
+                self.close()
+                raise exc.OperationalError("Stub server did not start")
+            return self
+        self._listener = _Listener(self.handler, self.host, self.port, self._transport)
+        self.port = self._listener.port
+        self.handler.address = self.address
+        thread = threading.Thread(target=self._listener.serve, name='stub-server-{}'.format(self.port))
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def drop_connections(self):
+        """Close all client connections, as a crashed server would, but keep accepting new ones"""
+        if self._listener is not None:
+            self._listener.drop_connections()
+
+    def close(self):
+        """Stop the server and close all client connections"""
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._child is not None:
+            self._child.terminate()
+            self._child.join()
+            self._child = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,77 @@
+"""Package private Thrift transport helpers. Do not use directly.
+
+The generated ``ttypes`` readers only take the accelerated (C) decoding path when the protocol
+has a ``_fast_decode`` hook and its transport is a ``CReadableTransport``. A bare ``TSocket``
+is not, so every struct would be decoded field by field with one ``recv`` per varint.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import socket
+
+import thrift.protocol.TCompactProtocol
+import thrift.transport.TSocket
+import thrift.transport.TTransport
+
+from pysnappydata import exc
+
+TRANSPORT_SOCKET = 'socket'
+TRANSPORT_BUFFERED = 'buffered'
+TRANSPORT_FRAMED = 'framed'
+
+TRANSPORTS = (TRANSPORT_SOCKET, TRANSPORT_BUFFERED, TRANSPORT_FRAMED)
+
+# Big enough to hold a typical RowSet batch in a couple of reads. Pass a larger ``buffer_size``
+# (e.g. 1 MiB) for wide rows or big batches.
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class CountingSocket(thrift.transport.TSocket.TSocket):
+    """``TSocket`` that keeps a running total of the bytes received on it.
+
+    Nagle's algorithm is disabled: with pipelined requests it would hold back a request until
+    the server acknowledges the previous one, which delayed ACKs put off until its reply.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingSocket, self).__init__(*args, **kwargs)
+        self.bytes_read = 0
+
+    def open(self):
+        super(CountingSocket, self).open()
+        if self.handle.family in (socket.AF_INET, socket.AF_INET6):
+            self.handle.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def read(self, sz):
+        buff = super(CountingSocket, self).read(sz)
+        self.bytes_read += len(buff)
+        return buff
+
+
+def wrap_transport(tsocket, transport=TRANSPORT_BUFFERED, buffer_size=DEFAULT_BUFFER_SIZE):
+    """Wrap an unopened ``TSocket`` in the requested transport.
+
+    ``buffered`` is wire compatible with a plain socket, ``framed`` requires the server to be
+    started with framed transport enabled.
+    """
+    if transport == TRANSPORT_BUFFERED:
+        return thrift.transport.TTransport.TBufferedTransport(tsocket, buffer_size)
+    elif transport == TRANSPORT_FRAMED:
+        return thrift.transport.TTransport.TFramedTransport(tsocket)
+    elif transport == TRANSPORT_SOCKET:
+        return tsocket
+    else:
+        raise exc.ProgrammingError("Unsupported transport: {}".format(transport))
+
+
+def open_transport(host, port, transport=TRANSPORT_BUFFERED, buffer_size=DEFAULT_BUFFER_SIZE):
+    """Connect to ``host:port`` and return the opened transport"""
+    trans = wrap_transport(CountingSocket(host, port), transport, buffer_size)
+    trans.open()
+    return trans
+
+
+def make_protocol(trans):
+    """Compact protocol that uses the C codec when available, else the pure Python one"""
+    return thrift.protocol.TCompactProtocol.TCompactProtocolAccelerated(trans, fallback=True)
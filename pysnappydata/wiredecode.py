@@ -0,0 +1,179 @@
+"""Package private decoding of result rows without ``ttypes.ColumnValue`` objects. Do not use directly.
+
+The generated code reads every cell of a ``RowSet`` into a ``ttypes.ColumnValue``, whose
+constructor sets all twenty fields of the union, and every row into a ``ttypes.Row``. In the
+:py:data:`VALUES` decode mode the accelerated Thrift codec is instead given a copy of the reply
+specs in which a row is read straight into a list holding the value of the field set in each
+cell, ``None`` for NULL. For scalar types that is what
+:py:func:`~pysnappydata.converters.value_converter` would return, so only LOB and nested
+columns need converting afterwards (see :py:func:`~pysnappydata.converters.values_converter`).
+Everything else in the reply is read as usual.
+
+Without the C codec, or over the unbuffered ``socket`` transport, replies are read by the
+generated code and their rows turned into value lists afterwards, which is slower than
+:py:data:`OBJECTS`.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from thrift.Thrift import TType
+from thrift.protocol.TBase import TFrozenBase
+from thrift.transport.TTransport import CReadableTransport
+
+from SDTCLIService import SnappyDataService
+from SDTCLIService import ttypes
+
+# Rows as ttypes.Row holding ttypes.ColumnValue cells
+OBJECTS = 'objects'
+# Rows as lists of bare cell values
+VALUES = 'values'
+MODES = (OBJECTS, VALUES)
+
+
+class _Cell(TFrozenBase):
+    """Read in place of ``ttypes.ColumnValue``: the codec builds frozen structs by calling the
+    class with the fields read, which here returns the value itself.
+    """
+
+    def __new__(cls, v=None, n=None):
+        return v
+
+
+class _Row(TFrozenBase):
+    """Read in place of ``ttypes.Row``, returning the list of cell values"""
+
+    def __new__(cls, values=None):
+        return values
+
+
+def _substitute(ttype, typeargs, old, new, memo):
+    """``typeargs`` of a ``ttype`` field with struct ``old`` read as ``new``; the same object if
+    ``old`` does not occur in it.
+    """
+    if ttype == TType.STRUCT:
+        if typeargs[0] is old:
+            return new
+        spec = _struct_spec(typeargs[0], old, new, memo)
+        return typeargs if spec is None else [typeargs[0], spec]
+    elif ttype == TType.LIST or ttype == TType.SET:
+        element = _substitute(typeargs[0], typeargs[1], old, new, memo)
+        return typeargs if element is typeargs[1] else (typeargs[0], element, typeargs[2])
+    elif ttype == TType.MAP:
+        key = _substitute(typeargs[0], typeargs[1], old, new, memo)
+        value = _substitute(typeargs[2], typeargs[3], old, new, memo)
+        if key is typeargs[1] and value is typeargs[3]:
+            return typeargs
+        return typeargs[0], key, typeargs[2], value, typeargs[4]
+    return typeargs
+
+
+def _struct_spec(klass, old, new, memo):
+    """``klass.thrift_spec`` with struct ``old`` read as ``new``, ``None`` if it does not occur"""
+    if klass in memo:
+        return memo[klass]
+    # Recursive structs refer to themselves while being looked at
+    memo[klass] = None
+    fields = []
+    changed = False
+    for field in klass.thrift_spec or ():
+        if field is not None:
+            typeargs = _substitute(field[1], field[3], old, new, memo)
+            if typeargs is not field[3]:
+                field = field[:3] + (typeargs,) + field[4:]
+                changed = True
+        fields.append(field)
+    memo[klass] = tuple(fields) if changed else None
+    return memo[klass]
+
+
+# All value fields of the cell spec are named 'v', so that the one set is passed to _Cell as
+# v; a NULL only sets null_val, passed as n.
+_CELL = [_Cell, None]
+_CELL[1] = tuple(
+    None if field is None else
+    (field[0], field[1], 'n' if field[2] == 'null_val' else 'v',
+     _substitute(field[1], field[3], ttypes.ColumnValue, _CELL, {}), field[4])
+    for field in ttypes.ColumnValue.thrift_spec)
+
+_ROW = [_Row, (None, (1, TType.LIST, 'values', (TType.STRUCT, _CELL, False), None))]
+
+# Rewritten spec, or None, by struct class
+_specs = {}
+
+
+def result_spec(name):
+    """Spec of ``SnappyDataService.<name>_result`` reading rows as value lists, ``None`` if the
+    reply holds no rows.
+    """
+    return _struct_spec(getattr(SnappyDataService, name + '_result'), ttypes.Row, _ROW, _specs)
+
+
+def read_result(name, iprot, mode=OBJECTS):
+    """Read the reply to request ``name`` into a new ``<name>_result`` struct, with the rows of
+    any ``RowSet`` in it read as value lists in :py:data:`VALUES` mode.
+    """
+    result = getattr(SnappyDataService, name + '_result')()
+    return _read(result, result_spec(name) if mode == VALUES else None, iprot)
+
+
+def read_rowset(iprot, mode=OBJECTS):
+    """Read a ``ttypes.RowSet``, its rows as value lists in :py:data:`VALUES` mode"""
+    spec = _struct_spec(ttypes.RowSet, ttypes.Row, _ROW, _specs) if mode == VALUES else None
+    return _read(ttypes.RowSet(), spec, iprot)
+
+
+def _read(struct, spec, iprot):
+    if spec is None:
+        struct.read(iprot)
+    elif getattr(iprot, '_fast_decode', None) is not None and isinstance(iprot.trans, CReadableTransport):
+        iprot._fast_decode(struct, iprot, [struct.__class__, spec])
+    else:
+        struct.read(iprot)
+        _to_values(struct, spec)
+    return struct
+
+
+#
+# Fallback for replies read by the generated code
+#
+
+_CELL_FIELDS = [field[2] for field in ttypes.ColumnValue.thrift_spec[1:] if field[2] != 'null_val']
+
+
+def cell_value(cell):
+    """The value :py:class:`_Cell` would have been read as, from a ``ttypes.ColumnValue``"""
+    if cell is None or cell.null_val:
+        return None
+    for name in _CELL_FIELDS:
+        value = getattr(cell, name)
+        if value is None:
+            continue
+        if name == 'array_val' or name == 'struct_val':
+            return [cell_value(x) for x in value]
+        elif name == 'map_val':
+            return {cell_value(k): cell_value(v) for k, v in value.items()}
+        return value
+    return None
+
+
+def _to_values(struct, spec):
+    """Turn the ``ttypes.Row`` objects of ``struct``, which ``spec`` reads as value lists, into them"""
+    for field in spec:
+        if field is None:
+            continue
+        value = getattr(struct, field[2])
+        if value is not None:
+            setattr(struct, field[2], _field_values(value, field[1], field[3]))
+
+
+def _field_values(value, ttype, typeargs):
+    if ttype == TType.STRUCT:
+        if typeargs is _ROW:
+            return [cell_value(cell) for cell in value.values or ()]
+        if typeargs[1] is not typeargs[0].thrift_spec:
+            _to_values(value, typeargs[1])
+    elif ttype == TType.LIST and typeargs[0] == TType.STRUCT and \
+            (typeargs[1] is _ROW or typeargs[1][1] is not typeargs[1][0].thrift_spec):
+        return [_field_values(item, typeargs[0], typeargs[1]) for item in value]
+    return value
@@ -31,16 +31,20 @@ setup(
     ],
     install_requires=[
         'future',
+        'thrift>=0.11.0',
     ],
     extras_require={
         "SQLAlchemy": ['sqlalchemy>=0.5.0'],
+        "numpy": ['numpy'],
+        "pandas": ['numpy', 'pandas'],
+        "pyarrow": ['numpy', 'pyarrow'],
     },
     tests_require=[
         'mock>=1.0.0',
         'pytest',
         'pytest-cov',
         'sqlalchemy>=0.5.0',
-        'thrift>=0.8.0',
+        'thrift>=0.11.0',
     ],
     zip_safe=False,
      entry_points = {  
@@ -0,0 +1,34 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from pysnappydata import locator
+from pysnappydata import testing
+
+
+@pytest.fixture
+def stub():
+    """Start a :py:class:`~pysnappydata.testing.StubServer` with the given options, closed after
+    the test
+    """
+    servers = []
+
+    def start(**kwargs):
+        server = testing.StubServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture(autouse=True)
+def server_lists():
+    """Forget the process-wide locator server lists, whose servers only live for one test"""
+    yield
+    with locator._lists_lock:
+        for servers in locator._lists.values():
+            servers.close()
+        locator._lists.clear()
@@ -0,0 +1,143 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+
+import pytest
+
+from pysnappydata import aio
+from pysnappydata import exc
+from pysnappydata import transport
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.mark.parametrize('kind', [transport.TRANSPORT_BUFFERED, transport.TRANSPORT_FRAMED])
+def test_fetch(stub, kind):
+    server = stub(rows=2500, batch_size=1000, transport=kind)
+
+    async def main():
+        async with await aio.connect(server.host, server.port, transport=kind) as connection:
+            cursor = connection.cursor()
+            await cursor.execute('SELECT * FROM t')
+            assert await cursor.fetchone() == (0, 0, 0.0, 'name-0', 'north')
+            rows = await cursor.fetchmany(10)
+            rows += [row async for row in cursor]
+            assert len(rows) == 2499
+            await cursor.execute('INSERT INTO t VALUES (1)')
+            assert cursor.rowcount == 1
+    run(main())
+    assert server.handler.requests['scrollCursor'] == 2
+
+
+@pytest.mark.parametrize('kind', [transport.TRANSPORT_BUFFERED, transport.TRANSPORT_FRAMED])
+def test_large_reply(stub, kind):
+    server = stub(rows=30000, transport=kind)
+
+    async def main():
+        async with await aio.connect(server.host, server.port, transport=kind) as connection:
+            cursor = connection.cursor(batch_size=30000)
+            await cursor.execute('SELECT * FROM t')
+            rows = await cursor.fetchall()
+            assert len(rows) == 30000
+            assert rows[-1][0] == 29999
+            assert connection.bytes_received > 1024 * 1024
+            # The stream is in step for the next request
+            await cursor.execute('VALUES 1')
+            assert len(await cursor.fetchall()) == 30000
+    run(main())
+
+
+def test_cancelled_request_breaks_connection(stub):
+    server = stub(latency=0.2)
+
+    async def main():
+        connection = await aio.connect(server.host, server.port)
+        cursor = connection.cursor()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(cursor.execute('SELECT * FROM t'), 0.05)
+        assert connection.broken
+        # The late reply is never taken for the reply to another request
+        with pytest.raises(exc.OperationalError):
+            await cursor.execute('SELECT * FROM t')
+        await connection.close()
+    run(main())
+
+
+def test_pool_discards_broken_connection(stub):
+    server = stub(rows=10)
+
+    async def main():
+        pool = aio.AsyncConnectionPool(server.host, server.port, max_size=2)
+        async with pool.connection() as connection:
+            cursor = connection.cursor()
+            await cursor.execute('SELECT * FROM t')
+            assert len(await cursor.fetchall()) == 10
+        assert pool.stats['idle'] == 1
+        server.handler.latency = 0.2
+        async with pool.connection() as connection:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(connection.cursor().execute('SELECT * FROM t'), 0.05)
+        server.handler.latency = 0
+        stats = pool.stats
+        assert (stats['size'], stats['idle'], stats['discarded']) == (0, 0, 1)
+        async with pool.connection() as other:
+            assert other is not connection
+            cursor = other.cursor()
+            await cursor.execute('SELECT * FROM t')
+            assert len(await cursor.fetchall()) == 10
+        await pool.close()
+    run(main())
+
+
+def test_pool_release_twice(stub):
+    server = stub(rows=10)
+
+    async def main():
+        pool = aio.AsyncConnectionPool(server.host, server.port, max_size=1)
+        connection = await pool.acquire()
+        await pool.release(connection)
+        with pytest.raises(exc.ProgrammingError):
+            await pool.release(connection)
+        assert pool.stats['idle'] == 1
+        # The single slot was given back once, so a second checkout has to wait
+        assert await pool.acquire() is connection
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.acquire(), 0.05)
+        await pool.release(connection)
+        await pool.close()
+    run(main())
+
+
+def test_close_unopened_connection(stub):
+    server = stub(rows=10)
+
+    async def main():
+        connection = aio.Connection(server.host, server.port)
+        await connection.close()
+        assert not connection.broken
+    run(main())
+
+
+def test_lobs_read_in_full(stub):
+    from SDTCLIService import ttypes
+
+    size = 10000
+    server = stub(rows=3, columns=[ttypes.SnappyType.INTEGER, ttypes.SnappyType.BLOB, ttypes.SnappyType.CLOB],
+                  lob_size=size, lob_chunk_size=4096)
+
+    async def main():
+        async with await aio.connect(server.host, server.port) as connection:
+            cursor = connection.cursor()
+            await cursor.execute('SELECT * FROM t')
+            rows = await cursor.fetchall()
+            assert [(len(blob), len(clob)) for _, blob, clob in rows] == [(size, size)] * 3
+            assert rows[0][1][4090:4100] == bytes(bytearray(range(250, 256))) + bytes(bytearray(range(4)))
+    run(main())
+    assert (server.handler.requests['getBlobChunk'], server.handler.requests['getClobChunk']) == (3, 3)
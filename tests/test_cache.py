@@ -0,0 +1,127 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from pysnappydata import resultcache
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=120, batch_size=50) as server:
+        yield server
+
+
+@pytest.fixture
+def cache():
+    return resultcache.ResultCache(max_bytes=1024 * 1024, ttl=60)
+
+
+def _fetch(connection, sql, parameters=None):
+    cursor = connection.cursor()
+    cursor.execute(sql, parameters)
+    rows = cursor.fetchall()
+    # Hands the statement back to the statement cache
+    cursor.close()
+    return rows
+
+
+def test_statement_cache(server):
+    connection = snappydata.connect(server.host, server.port, statement_cache_size=1)
+    try:
+        prepares = server.handler.requests['prepareStatement']
+        for i in range(3):
+            assert len(_fetch(connection, 'SELECT * FROM t WHERE C0 > %s', (i,))) == 120
+        assert server.handler.requests['prepareStatement'] - prepares == 1
+        _fetch(connection, 'SELECT * FROM t WHERE C1 > %s', (1,))
+        stats = connection.statement_cache_stats
+        assert (stats['size'], stats['capacity']) == (1, 1)
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 1)
+        closes = server.handler.requests['bulkClose']
+        connection.clear_statement_cache()
+        assert connection.statement_cache_stats['size'] == 0
+        # bulkClose is oneway; the server has handled it once it answers the next request
+        _fetch(connection, 'SELECT * FROM t')
+        assert server.handler.requests['bulkClose'] - closes == 1
+    finally:
+        connection.close()
+
+
+def test_statement_cache_disabled(server):
+    connection = snappydata.connect(server.host, server.port, statement_cache_size=0)
+    try:
+        prepares = server.handler.requests['prepareStatement']
+        _fetch(connection, 'SELECT * FROM t WHERE C0 > %s', (1,))
+        assert server.handler.requests['prepareStatement'] == prepares
+    finally:
+        connection.close()
+
+
+def test_result_cache_hit(server, cache):
+    connection = snappydata.connect(server.host, server.port, result_cache=cache)
+    try:
+        executes = server.handler.requests['execute']
+        rows = _fetch(connection, 'SELECT * FROM t')
+        assert len(rows) == 120
+        assert _fetch(connection, ' SELECT *\n  FROM t') == rows
+        assert server.handler.requests['execute'] - executes == 1
+        assert _fetch(connection, 'SELECT * FROM t WHERE C0 > %s', (1,)) == rows
+        assert _fetch(connection, 'SELECT * FROM t WHERE C0 > %s', (2,)) == rows
+        stats = cache.stats
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 3, 3)
+    finally:
+        connection.close()
+
+
+def test_result_cache_invalidated_by_writes(server, cache):
+    connection = snappydata.connect(server.host, server.port, result_cache=cache)
+    try:
+        _fetch(connection, 'SELECT * FROM t')
+        _fetch(connection, 'SELECT * FROM u')
+        connection.cursor().execute('INSERT INTO t VALUES (1)')
+        executes = server.handler.requests['execute']
+        _fetch(connection, 'SELECT * FROM u')
+        assert server.handler.requests['execute'] == executes
+        _fetch(connection, 'SELECT * FROM t')
+        assert server.handler.requests['execute'] - executes == 1
+    finally:
+        connection.close()
+
+
+def test_result_cache_scope(server, cache):
+    connections = [snappydata.connect(server.host, server.port, username=user, result_cache=cache)
+                   for user in ('alice', 'bob', 'alice')]
+    try:
+        assert [c.schema for c in connections] == ['ALICE', 'BOB', 'ALICE']
+        for connection in connections:
+            _fetch(connection, 'SELECT * FROM t')
+        assert (cache.stats['hits'], cache.stats['misses']) == (1, 2)
+        cursor = connections[0].cursor()
+        cursor.execute('SET SCHEMA bob')
+        assert connections[0].schema == 'BOB'
+        _fetch(connections[0], 'SELECT * FROM t')
+        assert (cache.stats['hits'], cache.stats['misses']) == (1, 3)
+        # Switching back finds the results of the first schema, which were not invalidated
+        cursor.execute('SET SCHEMA alice')
+        _fetch(connections[0], 'SELECT * FROM t')
+        assert (cache.stats['hits'], cache.stats['misses']) == (2, 3)
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def test_result_cache_of_unread_result(server, cache):
+    connection = snappydata.connect(server.host, server.port, result_cache=cache)
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM t')
+        cursor.fetchone()
+        cursor.close()
+        # Only complete results are stored
+        assert cache.stats['entries'] == 0
+        assert len(_fetch(connection, 'SELECT * FROM t')) == 120
+        assert cache.stats['entries'] == 1
+    finally:
+        connection.close()
@@ -0,0 +1,224 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import decimal
+
+import numpy
+import pytest
+
+from SDTCLIService import ttypes
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+_T = ttypes.SnappyType
+
+_COLUMNS = [_T.INTEGER, _T.BIGINT, _T.DOUBLE, _T.VARCHAR, _T.DATE, _T.TIMESTAMP, _T.BOOLEAN, _T.SMALLINT]
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=250, batch_size=100, columns=_COLUMNS, null_ratio=0.2) as server:
+        yield server
+
+
+@pytest.fixture(params=['objects', 'values'])
+def connection(request, server):
+    connection = snappydata.connect(server.host, server.port, decode=request.param)
+    yield connection
+    connection.close()
+
+
+def _rows(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    return cursor.fetchall()
+
+
+def test_fetch_numpy(connection):
+    rows = _rows(connection)
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    columns = cursor.fetch_numpy()
+    assert list(columns) == ['C{}'.format(i) for i in range(len(_COLUMNS))]
+    assert [array.dtype for array in columns.values()] == [
+        numpy.int32, numpy.int64, numpy.float64, numpy.object_, numpy.dtype('datetime64[ms]'),
+        numpy.dtype('datetime64[ms]'), numpy.bool_, numpy.int16]
+    for i, array in enumerate(columns.values()):
+        assert len(array) == 250
+        assert array.mask.tolist() == [row[i] is None for row in rows]
+        assert array.mask.any()
+    assert columns['C0'].compressed().tolist() == [row[0] for row in rows if row[0] is not None]
+    assert columns['C3'].compressed().tolist() == [row[3] for row in rows if row[3] is not None]
+    assert cursor.fetch_numpy()['C0'].size == 0
+
+
+def test_fetch_numpy_datetimes(connection):
+    rows = _rows(connection)
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    columns = cursor.fetch_numpy()
+    # DATE values are seconds and TIMESTAMP values nanoseconds since the epoch
+    for array, index, scale in ((columns['C4'], 4, 1000), (columns['C5'], 5, 0.000001)):
+        expected = [int(row[index] * scale) for row in rows if row[index] is not None]
+        assert array.compressed().astype(numpy.int64).tolist() == expected
+    assert str(columns['C4'][1]) == '1970-01-02T00:00:00.000'
+    assert str(columns['C5'][1]) == '1970-01-01T00:00:01.000'
+
+
+def test_fetch_numpy_in_batches(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    cursor.fetchmany(10)
+    sizes = []
+    while True:
+        size = len(cursor.fetch_numpy(batch_rows=64)['C0'])
+        if not size:
+            break
+        sizes.append(size)
+    assert sizes == [64, 64, 64, 48]
+
+
+def test_fetch_numpy_without_result(connection):
+    cursor = connection.cursor()
+    with pytest.raises(snappydata.ProgrammingError):
+        cursor.fetch_numpy()
+
+
+@pytest.fixture(scope='module')
+def frame_server():
+    # One batch, as the stub numbers the rows of each batch from 0
+    columns = [_T.INTEGER, _T.DOUBLE, _T.CHAR, _T.VARCHAR, _T.DATE, _T.DECIMAL, _T.BOOLEAN]
+    with testing.StubServer(rows=200, batch_size=200, columns=columns, null_ratio=0.1) as server:
+        yield server
+
+
+@pytest.fixture(params=['objects', 'values'])
+def frame_connection(request, frame_server):
+    connection = snappydata.connect(frame_server.host, frame_server.port, decode=request.param)
+    yield connection
+    connection.close()
+
+
+def test_fetch_dataframe(frame_connection):
+    import pandas
+
+    rows = _rows(frame_connection)
+    cursor = frame_connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    frame = cursor.fetch_dataframe()
+    assert list(frame.columns) == ['C0', 'C1', 'C2', 'C3', 'C4', 'C5', 'C6']
+    assert len(frame) == 200
+    # pandas 3 keeps strings in its own string dtype rather than object
+    assert [str(dtype) for dtype in frame.dtypes] == ['Int32', 'float64', 'category', str(frame['C3'].dtype),
+                                                      'datetime64[ms]', 'object', 'boolean']
+    assert pandas.api.types.is_string_dtype(frame['C3'])
+    for i, name in enumerate(frame.columns):
+        assert frame[name].isna().tolist() == [row[i] is None for row in rows]
+    assert frame['C0'].dropna().tolist() == [row[0] for row in rows if row[0] is not None]
+    assert set(frame['C2'].cat.categories) == {'north', 'south', 'east', 'west'}
+    assert frame['C4'][1] == pandas.Timestamp('1970-01-02')
+    decimals = [snappydata.converters.decimal_value(row[5]) for row in rows if row[5] is not None]
+    assert frame['C5'].dropna().tolist() == decimals
+    assert all(isinstance(value, decimal.Decimal) for value in decimals)
+    assert [(i, str(value)) for i, value in frame['C5'].dropna().items()][:2] == \
+        [(i, '0.{:02d}'.format(i)) for i in frame['C5'].dropna().index[:2]]
+
+
+@pytest.mark.parametrize('threshold, categorical', [(0.5, True), (0.01, False), (0, False)])
+def test_categorical_threshold(frame_connection, threshold, categorical):
+    cursor = frame_connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    frame = cursor.fetch_dataframe(categorical_threshold=threshold)
+    # C2 has 4 distinct values in 200 rows, C3 a distinct value per row
+    assert (str(frame['C2'].dtype) == 'category') == categorical
+    assert str(frame['C3'].dtype) != 'category'
+
+
+def test_read_sql(frame_connection):
+    from pysnappydata import columnar
+
+    frame = columnar.read_sql('SELECT * FROM t', frame_connection, index_col='C3')
+    assert frame.index.name == 'C3'
+    assert len(frame) == 200
+    frames = list(columnar.read_sql('SELECT * FROM t', frame_connection, chunksize=75))
+    assert [len(f) for f in frames] == [75, 75, 50]
+
+
+_ARROW_COLUMNS = [
+    _T.INTEGER,
+    # The server did not say the precision, so the values decide the width of each batch
+    ttypes.ColumnDescriptor(type=_T.DECIMAL, name='C1', precision=0, scale=2, nullable=True),
+    _T.ARRAY,
+    _T.STRUCT,
+    ttypes.ColumnDescriptor(type=_T.ARRAY, name='C4', nullable=True),
+    _T.DATE,
+    _T.TIMESTAMP,
+    ttypes.ColumnDescriptor(type=_T.INTEGER, name='C7', nullable=False),
+]
+
+
+@pytest.fixture(scope='module')
+def arrow_server():
+    with testing.StubServer(rows=200, batch_size=200, columns=_ARROW_COLUMNS, null_ratio=0.1) as server:
+        yield server
+
+
+@pytest.fixture
+def arrow_connection(arrow_server):
+    connection = snappydata.connect(arrow_server.host, arrow_server.port)
+    yield connection
+    connection.close()
+
+
+def test_arrow_type():
+    import pyarrow as pa
+    from pysnappydata import columnar
+
+    assert columnar.arrow_type(pa, _T.DECIMAL, 10, 3) == pa.decimal128(10, 3)
+    assert columnar.arrow_type(pa, _T.DECIMAL, 0, 2) == pa.decimal128(38, 2)
+    assert columnar.arrow_type(pa, _T.DECIMAL, 50, 0) == pa.decimal256(50, 0)
+    assert columnar.arrow_type(pa, _T.DECIMAL, 100, 0) == pa.decimal256(76, 0)
+    assert columnar.arrow_type(pa, _T.MAP, element_types=[_T.VARCHAR, _T.DOUBLE]) == pa.map_(pa.string(), pa.float64())
+    assert columnar.arrow_type(pa, _T.STRUCT, element_types=[_T.INTEGER, _T.DATE]) == \
+        pa.struct([pa.field('f0', pa.int32()), pa.field('f1', pa.date64())])
+    assert columnar.arrow_type(pa, _T.ARRAY) is None
+
+
+def test_fetch_arrow_batches(arrow_connection):
+    import pyarrow as pa
+
+    rows = _rows(arrow_connection)
+    cursor = arrow_connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    batches = list(cursor.fetch_arrow_batches(batch_rows=100))
+    assert [batch.num_rows for batch in batches] == [100, 100]
+    schema = batches[0].schema
+    assert batches[1].schema == schema
+    assert schema.types == [pa.int32(), pa.decimal128(38, 2), pa.list_(pa.int32()),
+                            pa.struct([pa.field('f0', pa.int32()), pa.field('f1', pa.float64())]),
+                            pa.list_(pa.int64()), pa.date64(), pa.timestamp('ns'), pa.int32()]
+    assert [field.nullable for field in schema] == [True] * 7 + [False]
+    # Decimals below 1 in the first batch, from 1.00 in the second
+    decimals = batches[0].column('C1').to_pylist() + batches[1].column('C1').to_pylist()
+    assert decimals == [snappydata.converters.decimal_value(row[1]) for row in rows]
+    for i, name in enumerate(schema.names):
+        nulls = [row[i] is None for row in rows]
+        assert [batch.column(name).is_null().to_pylist() for batch in batches] == [nulls[:100], nulls[100:]]
+    assert batches[0].column('C2')[1].as_py() == rows[1][2]
+    assert batches[0].column('C3')[1].as_py() == {'f0': rows[1][3][0], 'f1': rows[1][3][1]}
+    assert str(batches[0].column('C5')[1]) == '1970-01-02'
+
+
+def test_fetch_arrow_table(arrow_connection):
+    cursor = arrow_connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    cursor.fetchmany(20)
+    table = cursor.fetch_arrow_table()
+    assert table.num_rows == 180
+    assert table.column('C7').to_pylist() == list(range(20, 200))
+    assert table.schema.field('C7').nullable is False
+    empty = cursor.fetch_arrow_table()
+    assert empty.num_rows == 0
+    assert empty.schema.names == table.schema.names
+    with pytest.raises(snappydata.ProgrammingError):
+        arrow_connection.cursor().fetch_arrow_table()
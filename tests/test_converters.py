@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+from thrift import TSerialization
+from thrift.protocol import TCompactProtocol
+
+from SDTCLIService import ttypes
+from pysnappydata import converters
+from pysnappydata import exc
+from pysnappydata import testing
+
+_T = ttypes.SnappyType
+
+
+@pytest.mark.parametrize('encode', [converters.any_encoder, converters.value_encoder(_T.MAP),
+                                    converters.value_encoder(_T.MAP, [_T.VARCHAR, _T.INTEGER])])
+def test_map_parameters_can_be_written(encode):
+    value = encode({'a': 1, 'b': None})
+    keys = list(value.map_val)
+    assert sorted(key.string_val for key in keys) == ['a', 'b']
+    assert hash(keys[0]) == hash(converters._map_key(keys[0]))
+    assert keys[0] == converters._map_key(ttypes.ColumnValue(string_val=keys[0].string_val))
+    data = TSerialization.serialize(ttypes.Row(values=[value]), TCompactProtocol.TCompactProtocolFactory())
+    assert data == TSerialization.serialize(ttypes.Row(values=[encode({'a': 1, 'b': None})]),
+                                            TCompactProtocol.TCompactProtocolFactory())
+
+
+def test_param_encoder():
+    encode = converters.compile_param_encoder(testing.column_descriptors([_T.INTEGER, _T.MAP]))
+    row = encode([1, {1: 'x'}])
+    assert row.values[0] == ttypes.ColumnValue(i32_val=1)
+    key = converters._map_key(ttypes.ColumnValue(i32_val=1))
+    assert row.values[1].map_val == {key: ttypes.ColumnValue(string_val='x')}
+    with pytest.raises(exc.ProgrammingError):
+        encode([1])
+
+
+def _descriptors(*types, **element_types):
+    descriptors = testing.column_descriptors(types)
+    for i, elements in element_types.items():
+        descriptors[int(i[1:])].elementTypes = elements
+    return descriptors
+
+
+def _cell(**field):
+    return ttypes.ColumnValue(**field)
+
+
+def test_row_decoder_scalars_and_nulls():
+    metadata = _descriptors(_T.INTEGER, _T.VARCHAR, _T.DOUBLE, _T.BOOLEAN)
+    rows = [ttypes.Row(values=[_cell(i32_val=1), _cell(string_val='a'), _cell(double_val=0.5), _cell(bool_val=True)]),
+            ttypes.Row(values=[_cell(null_val=True)] * 4)]
+    decode = converters.compile_row_decoder(metadata)
+    assert [decode(row) for row in rows] == [(1, 'a', 0.5, True), (None, None, None, None)]
+    assert converters.compile_row_decoder(metadata, row_type=list)(rows[0]) == [1, 'a', 0.5, True]
+    assert converters.compile_row_decoder(metadata, row_type=lambda values: values[::-1])(rows[0]) == \
+        (True, 0.5, 'a', 1)
+    single = converters.compile_row_decoder(metadata[:1])
+    assert single(rows[0]) == (1,)
+
+
+def test_row_decoder_nested_types():
+    metadata = _descriptors(_T.ARRAY, _T.MAP, _T.STRUCT, _T.ARRAY, e0=[_T.INTEGER], e1=[_T.VARCHAR, _T.DOUBLE],
+                            e2=[_T.INTEGER, _T.VARCHAR], e3=[])
+    key = converters._map_key(_cell(string_val='k'))
+    row = ttypes.Row(values=[
+        _cell(array_val=[_cell(i32_val=1), _cell(null_val=True), _cell(i32_val=3)]),
+        _cell(map_val={key: _cell(double_val=1.5)}),
+        _cell(struct_val=[_cell(i32_val=7), _cell(string_val='x')]),
+        # Without element types, nested values are converted by the field that is set
+        _cell(array_val=[_cell(array_val=[_cell(i64_val=5)]), _cell(string_val='y')]),
+    ])
+    assert converters.compile_row_decoder(metadata)(row) == ([1, None, 3], {'k': 1.5}, [7, 'x'], [[5], 'y'])
+    nulls = ttypes.Row(values=[_cell(null_val=True)] * 4)
+    assert converters.compile_row_decoder(metadata)(nulls) == (None, None, None, None)
+
+
+def test_row_decoder_lob_hook():
+    metadata = _descriptors(_T.BLOB, _T.CLOB)
+    row = ttypes.Row(values=[_cell(blob_val=ttypes.BlobChunk(chunk=b'ab', last=True)),
+                             _cell(clob_val=ttypes.ClobChunk(chunk='cd', last=True))])
+    assert converters.compile_row_decoder(metadata)(row) == (b'ab', 'cd')
+    decode = converters.compile_row_decoder(metadata, lob=lambda chunk, clob: (chunk.chunk * 2, clob))
+    assert decode(row) == ((b'abab', False), ('cdcd', True))
+
+
+def test_decimal_value():
+    assert converters.decimal_value(None) is None
+    assert str(converters.decimal_value(ttypes.Decimal(signum=1, scale=2, magnitude=b'\x01\x00'))) == '2.56'
+    assert str(converters.decimal_value(ttypes.Decimal(signum=-1, scale=1, magnitude=b'\x07'))) == '-0.7'
+    assert str(converters.decimal_value(ttypes.Decimal(signum=0, scale=0, magnitude=b''))) == '0'
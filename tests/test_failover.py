@@ -0,0 +1,175 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+from thrift.transport.TTransport import TTransportException
+
+from pysnappydata import exc
+from pysnappydata import locator
+from pysnappydata import pool
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture
+def cluster(stub):
+    """Two stub servers and a stub locator listing them"""
+    servers = [stub(rows=100, batch_size=40), stub(rows=100, batch_size=40)]
+    located = stub(servers=[server.address for server in servers])
+    return located, servers
+
+
+def _server_of(connection, servers):
+    return next(server for server in servers if server.address == (connection.hostname, connection.port))
+
+
+def test_locator_connect_spreads_over_servers(cluster):
+    located, servers = cluster
+    connections = [snappydata.connect(located.host, located.port, locator=True, load_balance='round_robin')
+                   for _ in range(4)]
+    try:
+        assert sorted((c.hostname, c.port) for c in connections) == sorted(s.address for s in servers * 2)
+        stats = locator.server_list(located.host, located.port).stats
+        assert stats['connections'] == dict((s.address, 2) for s in servers)
+    finally:
+        for connection in connections:
+            connection.close()
+    assert locator.server_list(located.host, located.port).stats['connections'] == {}
+
+
+def test_locator_connect_skips_dead_server(stub):
+    server = stub()
+    dead = (server.host, testing._free_port(server.host))
+    located = stub(servers=[dead, server.address])
+    for _ in range(3):
+        connection = snappydata.connect(located.host, located.port, locator=True, load_balance='round_robin',
+                                        failover_backoff=0.001)
+        assert (connection.hostname, connection.port) == server.address
+        connection.close()
+    assert locator.server_list(located.host, located.port).stats['failed'] == [dead]
+
+
+def test_locator_connect_fails_without_servers(stub):
+    server = stub()
+    dead = [(server.host, testing._free_port(server.host)) for _ in range(2)]
+    located = stub(servers=dead)
+    with pytest.raises(TTransportException):
+        snappydata.connect(located.host, located.port, locator=True, failover_retries=1, failover_backoff=0.001)
+    assert locator.server_list(located.host, located.port).stats['failed'] == sorted(dead)
+
+
+def test_failover_replays_query(cluster):
+    located, servers = cluster
+    connection = snappydata.connect(located.host, located.port, locator=True, failover_backoff=0.001)
+    try:
+        lost = _server_of(connection, servers)
+        session = connection.session
+        lost.close()
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM t')
+        assert len(cursor.fetchall()) == 100
+        assert connection.session == session + 1
+        assert (connection.hostname, connection.port) != lost.address
+        stats = connection.failover_stats
+        assert stats['failovers'] == 1
+        assert stats['replays'] == 1
+        assert stats['failed_servers'] == [lost.address]
+    finally:
+        connection.close()
+
+
+def test_failover_does_not_repeat_writes(cluster):
+    located, servers = cluster
+    connection = snappydata.connect(located.host, located.port, locator=True, failover_backoff=0.001)
+    try:
+        _server_of(connection, servers).close()
+        cursor = connection.cursor()
+        with pytest.raises(exc.OperationalError):
+            cursor.execute('INSERT INTO t VALUES (1)')
+        # The new session is usable
+        cursor.execute('INSERT INTO t VALUES (1)')
+        assert cursor.rowcount == 1
+    finally:
+        connection.close()
+
+
+def test_failover_prepares_statements_again(cluster):
+    located, servers = cluster
+    connection = snappydata.connect(located.host, located.port, locator=True, failover_backoff=0.001)
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM t WHERE C0 > %s', (1,))
+        cursor.fetchall()
+        _server_of(connection, servers).close()
+        cursor.execute('SELECT * FROM t WHERE C0 > %s', (1,))
+        assert len(cursor.fetchall()) == 100
+        assert connection.failover_stats['failovers'] == 1
+    finally:
+        connection.close()
+
+
+def test_failover_of_open_result_set(cluster):
+    located, servers = cluster
+    connection = snappydata.connect(located.host, located.port, locator=True, failover_backoff=0.001)
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM t')
+        cursor.fetchmany(10)
+        _server_of(connection, servers).close()
+        # The rest of the result set was lost with the server
+        with pytest.raises(exc.OperationalError):
+            cursor.fetchall()
+        cursor.execute('SELECT * FROM t')
+        assert len(cursor.fetchall()) == 100
+    finally:
+        connection.close()
+
+
+def test_pool_over_locator(cluster):
+    located, servers = cluster
+    connections = pool.ConnectionPool(located.host, located.port, locator=True, load_balance='round_robin',
+                                      failover_backoff=0.001)
+    server_list = locator.server_list(located.host, located.port)
+    try:
+        first, second = connections.acquire(), connections.acquire()
+        expected = dict((server.address, 1) for server in servers)
+        assert connections.stats['servers'] == expected
+        assert server_list.stats['connections'] == expected
+        lost = _server_of(first, servers)
+        connections.release(first)
+        connections.release(second)
+
+        lost.close()
+        first, second = connections.acquire(), connections.acquire()
+        for connection in (first, second):
+            cursor = connection.cursor()
+            cursor.execute('SELECT * FROM t')
+            assert len(cursor.fetchall()) == 100
+        (survivor,) = [server.address for server in servers if server is not lost]
+        assert connections.stats['servers'] == {survivor: 2}
+        assert server_list.stats['connections'] == {survivor: 2}
+        assert lost.address in server_list.stats['failed']
+        connections.release(first)
+        connections.release(second)
+    finally:
+        connections.close()
+    assert server_list.stats['connections'] == {}
+
+
+def test_pool_double_release(stub):
+    server = stub()
+    connections = pool.ConnectionPool(server.host, server.port)
+    try:
+        connection = connections.acquire()
+        connections.release(connection)
+        with pytest.raises(exc.ProgrammingError):
+            connections.release(connection)
+        assert connections.stats['idle'] == 1
+        assert connections.acquire() is connection
+        connections.release(connection)
+        other = snappydata.connect(server.host, server.port)
+        with pytest.raises(exc.ProgrammingError):
+            connections.release(other)
+        other.close()
+    finally:
+        connections.close()
@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from SDTCLIService import ttypes
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=2500, batch_size=1000) as server:
+        yield server
+
+
+@pytest.fixture
+def connection(server):
+    connection = snappydata.connect(server.host, server.port)
+    yield connection
+    connection.close()
+
+
+def test_fetch_streams_batches(connection, server):
+    scrolls = server.handler.requests['scrollCursor']
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    assert [d[0] for d in cursor.description] == ['C0', 'C1', 'C2', 'C3', 'C4']
+    assert len(cursor.fetchall()) == 2500
+    assert cursor.rowcount == 2500
+    assert server.handler.requests['scrollCursor'] - scrolls == 2
+    stats = cursor.last_query_stats
+    assert stats['rows'] == 2500
+    assert stats['batches'] == 3
+
+
+def test_fetch_rows(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    assert cursor.fetchone() == (0, 0, 0.0, 'name-0', 'north')
+    assert cursor.fetchmany(2) == [(1, 1000, 0.5, 'name-1', 'south'), (2, 2000, 1.0, 'name-2', 'east')]
+
+
+@pytest.mark.parametrize('prefetch', [1, 2])
+def test_prefetch(connection, prefetch):
+    cursor = connection.cursor(prefetch=prefetch)
+    cursor.execute('SELECT * FROM t')
+    rows = list(cursor)
+    assert len(rows) == 2500
+    assert rows[1000] == rows[0]
+    stats = cursor.prefetch_stats
+    assert stats['depth'] == prefetch
+    assert stats['batches'] == 2
+    assert stats['queued'] == 0
+
+
+def test_prefetch_closed_early(connection, server):
+    closes = server.handler.requests['closeResultSet']
+    cursor = connection.cursor(prefetch=2)
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor.fetchmany(10)) == 10
+    cursor.close()
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor.fetchall()) == 2500
+    assert server.handler.requests['closeResultSet'] - closes <= 1
+
+
+def test_close_open_result_set(connection, server):
+    closes = server.handler.requests['closeResultSet']
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    cursor.fetchone()
+    cursor.close()
+    # Sent without waiting for the reply, which the next request reads
+    connection.cursor().execute('VALUES 1')
+    assert server.handler.requests['closeResultSet'] - closes == 1
+
+
+def test_row_type(connection):
+    cursor = connection.cursor(row_type=snappydata.Row)
+    cursor.execute('SELECT * FROM t')
+    row = cursor.fetchone()
+    assert row['C3'] == row.C3 == row[3] == 'name-0'
+    cursor = connection.cursor(row_type=list)
+    cursor.execute('SELECT * FROM t')
+    assert cursor.fetchone() == [0, 0, 0.0, 'name-0', 'north']
+
+
+def test_decode_values_matches_objects(server):
+    columns = [ttypes.SnappyType.INTEGER, ttypes.SnappyType.DECIMAL, ttypes.SnappyType.TIMESTAMP,
+               ttypes.SnappyType.VARBINARY, ttypes.SnappyType.ARRAY, ttypes.SnappyType.BOOLEAN]
+    with testing.StubServer(rows=300, batch_size=100, columns=columns, null_ratio=0.2) as typed:
+        results = []
+        for decode in ('objects', 'values'):
+            connection = snappydata.connect(typed.host, typed.port, decode=decode)
+            try:
+                cursor = connection.cursor()
+                cursor.execute('SELECT * FROM t')
+                results.append(cursor.fetchall())
+            finally:
+                connection.close()
+    assert len(results[0]) == 300
+    assert results[0] == results[1]
+
+
+def test_executemany_rowcount(connection, server):
+    cursor = connection.cursor(executemany_chunksize=4)
+    cursor.executemany('INSERT INTO t VALUES (%s, %s)', [(i, i * 10) for i in range(10)])
+    assert cursor.rowcount == 10
+
+
+@pytest.mark.parametrize('result, rowcount', [
+    (ttypes.UpdateResult(updateCount=3), 3),
+    (ttypes.UpdateResult(), -1),
+    (ttypes.UpdateResult(updateCount=-1), -1),
+])
+def test_executemany_rowcount_without_batch_counts(connection, server, monkeypatch, result, rowcount):
+    monkeypatch.setattr(server.handler, 'executePreparedBatch', lambda *args: result)
+    cursor = connection.cursor()
+    cursor.executemany('INSERT INTO t VALUES (%s, %s)', [(1, 2), (3, 4), (5, 6)])
+    assert cursor.rowcount == rowcount
+
+
+def test_execute_update(connection):
+    cursor = connection.cursor()
+    cursor.execute('INSERT INTO t VALUES (%s, %s)', (1, 2))
+    assert cursor.rowcount == 1
+    assert cursor.description is None
@@ -0,0 +1,110 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from SDTCLIService import ttypes
+from pysnappydata import hooks
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=250, batch_size=100) as server:
+        yield server
+
+
+class Recorder(hooks.QueryHook):
+    def __init__(self):
+        self.calls = []
+
+    def before_execute(self, cursor, operation, parameters):
+        self.calls.append(('before_execute', operation, parameters))
+
+    def after_execute(self, cursor, stats, error):
+        self.calls.append(('after_execute', stats, error))
+
+    def on_batch(self, cursor, rows, nbytes):
+        self.calls.append(('on_batch', rows, nbytes))
+
+
+def test_connection_hooks(server):
+    recorder = Recorder()
+    connection = snappydata.connect(server.host, server.port, hooks=[recorder])
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM t WHERE C0 > %s', (1,))
+        assert [call[0] for call in recorder.calls] == ['before_execute', 'on_batch', 'after_execute']
+        assert recorder.calls[0][1:] == ('SELECT * FROM t WHERE C0 > %s', (1,))
+        assert recorder.calls[1][1] == 100 and recorder.calls[1][2] > 0
+        stats, error = recorder.calls[2][1:]
+        assert error is None
+        assert set(stats) == {'operation', 'prepared', 'cached', 'escape_time', 'send_time', 'wait_time',
+                              'receive_time', 'build_time', 'elapsed', 'bytes_received', 'rows', 'batches'}
+        assert (stats['operation'], stats['prepared'], stats['cached']) == ('SELECT * FROM t WHERE C0 > %s', True,
+                                                                            False)
+        assert (stats['rows'], stats['batches']) == (100, 1)
+        assert stats['elapsed'] > 0 and stats['bytes_received'] > 0
+        # Fetching the rest adds batches, but no further after_execute
+        assert len(cursor.fetchall()) == 250
+        assert [call[1] for call in recorder.calls if call[0] == 'on_batch'] == [100, 100, 50]
+        assert [call[0] for call in recorder.calls].count('after_execute') == 1
+        stats = cursor.last_query_stats
+        assert (stats['rows'], stats['batches']) == (250, 3)
+        assert stats['bytes_received'] > recorder.calls[2][1]['bytes_received']
+        connection.remove_hook(recorder)
+        cursor.execute('SELECT * FROM t')
+        assert len(recorder.calls) == 5
+    finally:
+        connection.close()
+
+
+def test_after_execute_error(server, monkeypatch):
+    recorder = Recorder()
+    connection = snappydata.connect(server.host, server.port)
+    try:
+        connection.add_hook(recorder)
+        connection.add_hook(recorder)
+        assert connection.hooks == (recorder,)
+
+        def execute(*args):
+            raise ttypes.SnappyException(exceptionData=ttypes.SnappyExceptionData(
+                reason='Syntax error', errorCode=30000, sqlState='42X01'))
+        monkeypatch.setattr(server.handler, 'execute', execute)
+        with pytest.raises(ttypes.SnappyException) as info:
+            connection.cursor().execute('SELEKT 1')
+        assert [call[0] for call in recorder.calls] == ['before_execute', 'after_execute']
+        stats, error = recorder.calls[1][1:]
+        assert error is info.value
+        assert (stats['rows'], stats['batches']) == (0, 0)
+    finally:
+        connection.close()
+
+
+def test_registered_hooks(server):
+    recorder = Recorder()
+
+    class Failing(object):
+        def before_execute(self, cursor, operation, parameters):
+            raise RuntimeError('broken hook')
+
+    failing = Failing()
+    hooks.register(recorder)
+    hooks.register(failing)
+    hooks.register(recorder)
+    try:
+        assert hooks.registered() == (recorder, failing)
+        connection = snappydata.connect(server.host, server.port)
+        try:
+            # A failing hook does not stop the statement nor the other hooks
+            cursor = connection.cursor()
+            cursor.execute('SELECT * FROM t')
+            assert len(cursor.fetchall()) == 250
+            assert [call[0] for call in recorder.calls].count('after_execute') == 1
+        finally:
+            connection.close()
+    finally:
+        hooks.unregister(recorder)
+        hooks.unregister(failing)
+    assert hooks.registered() == ()
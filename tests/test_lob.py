@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+
+import pytest
+
+from SDTCLIService import ttypes
+from pysnappydata import lob
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+_T = ttypes.SnappyType
+
+_SIZE = 10000
+_BLOB = (bytes(bytearray(range(256))) * (_SIZE // 256 + 1))[:_SIZE]
+_CLOB = ('abcdefghijklmnopqrstuvwxyz0123456789' * (_SIZE // 36 + 1))[:_SIZE]
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=3, columns=[_T.INTEGER, _T.BLOB, _T.CLOB], lob_size=_SIZE, lob_chunk_size=4096,
+                            parameters=[_T.INTEGER, _T.BLOB, _T.CLOB]) as server:
+        yield server
+
+
+@pytest.fixture
+def connection(server):
+    connection = snappydata.connect(server.host, server.port)
+    yield connection
+    connection.close()
+
+
+def test_lobs_read_in_full(connection, server):
+    chunks = server.handler.requests['getBlobChunk']
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    rows = cursor.fetchall()
+    assert [row[1:] for row in rows] == [(_BLOB, _CLOB)] * 3
+    # What follows the first chunk is read with one request per value
+    assert server.handler.requests['getBlobChunk'] - chunks == 3
+
+
+def test_lazy_lobs(connection):
+    cursor = connection.cursor(lazy_lobs=True, lob_chunk_size=1000)
+    cursor.execute('SELECT * FROM t')
+    _, blob, clob = cursor.fetchone()
+    assert isinstance(blob, lob.Blob) and isinstance(clob, lob.Clob)
+    assert blob.length == clob.length == _SIZE
+    with blob:
+        assert blob.read(10) == _BLOB[:10]
+        assert blob.read() == _BLOB[10:]
+        assert blob.read() == b''
+    with clob:
+        assert clob.read(5000) == _CLOB[:5000]
+        assert clob.read() == _CLOB[5000:]
+    with pytest.raises(ValueError):
+        blob.read()
+
+
+@pytest.mark.parametrize('source', [
+    lambda: io.BytesIO(b'x' * 10000),
+    lambda: b'x' * 10000,
+    lambda: memoryview(b'x' * 10000),
+])
+def test_blob_upload(connection, server, source):
+    received = server.handler.lob_bytes_received
+    sent = server.handler.requests['sendBlobChunk']
+    cursor = connection.cursor(lob_chunk_size=3000)
+    cursor.execute('INSERT INTO t VALUES (%s, %s, %s)', (1, source(), None))
+    assert cursor.rowcount == 1
+    assert server.handler.lob_bytes_received - received == 10000
+    assert server.handler.requests['sendBlobChunk'] - sent == 4
+
+
+def test_clob_upload(connection, server):
+    received = server.handler.lob_bytes_received
+    sent = server.handler.requests['sendClobChunk']
+    cursor = connection.cursor(lob_chunk_size=3000)
+    cursor.execute('INSERT INTO t VALUES (%(id)s, %(blob)s, %(clob)s)',
+                   {'id': 1, 'blob': None, 'clob': io.StringIO('y' * 7000)})
+    assert server.handler.lob_bytes_received - received == 7000
+    assert server.handler.requests['sendClobChunk'] - sent == 3
+
+
+def test_upload_lob(connection, server):
+    chunk = connection.upload_lob(io.BytesIO(b'z' * 2500), chunk_size=1000)
+    assert chunk.totalLength == 2500
+    assert chunk.lobId is not None
+    assert chunk.last
@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+
+import pytest
+
+from pysnappydata import metrics
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture(autouse=True)
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+_SAMPLE = re.compile(r'^[a-z_]+(\{[a-z]+="(\\.|[^"\\])*"(,[a-z]+="(\\.|[^"\\])*")*\})? -?[0-9.e+-]+$')
+
+
+def test_disabled():
+    metrics.disable()
+    metrics.inc('snappydata_retries_total', kind='failover')
+    metrics.observe('snappydata_pool_wait_seconds', 0.1)
+    metrics.connection_opened(0.1, True)
+    assert metrics.snapshot() == {'counters': {}, 'histograms': {}}
+    lines = metrics.render_prometheus().splitlines()
+    assert len([line for line in lines if line.startswith('# HELP ')]) == 11
+    assert 'snappydata_connections_opened_total 0' in lines
+    assert not any(line.startswith('snappydata_retries_total') for line in lines)
+
+
+@pytest.mark.parametrize('operation, type_', [
+    ('SELECT * FROM t', 'select'), ('  (values 1)', 'select'), ('WITH a AS (VALUES 1) SELECT * FROM a', 'select'),
+    ('insert into t values (1)', 'insert'), ('PUT INTO t VALUES (1)', 'put'), ('CREATE TABLE t (a INT)', 'ddl'),
+    ('CALL SYS.REBALANCE_ALL_BUCKETS()', 'call'), ('SET SCHEMA a', 'other'), ('', 'other'), (None, 'other'),
+])
+def test_statement_type(operation, type_):
+    assert metrics.statement_type(operation) == type_
+
+
+def test_histogram_percentiles():
+    for i in range(1, 1001):
+        metrics.observe('snappydata_pool_wait_seconds', i / 1000.0)
+    summary = metrics.snapshot()['histograms']['snappydata_pool_wait_seconds']
+    assert summary['count'] == 1000
+    assert summary['sum'] == pytest.approx(500.5)
+    assert summary['max'] == 1.0
+    # Buckets are 1/16 of a power of two wide
+    for key, expected in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+        assert abs(summary[key] - expected) <= expected / 16
+
+
+def test_render_prometheus():
+    metrics.inc('snappydata_retries_total', kind='failover')
+    metrics.inc('snappydata_retries_total', kind='failover')
+    metrics.inc('snappydata_retries_total', kind='a"b\\c\n')
+    metrics.observe('snappydata_pool_wait_seconds', 0.003)
+    metrics.observe('snappydata_pool_wait_seconds', 0.2)
+    text = metrics.render_prometheus()
+    assert text.endswith('\n')
+    lines = text.splitlines()
+    for line in lines:
+        assert line.startswith('# HELP ') or line.startswith('# TYPE ') or _SAMPLE.match(line), line
+    names = [line.split()[2] for line in lines if line.startswith('# TYPE ')]
+    assert [line.split()[2] for line in lines if line.startswith('# HELP ')] == names
+    assert '# TYPE snappydata_retries_total counter' in lines
+    assert '# TYPE snappydata_pool_wait_seconds histogram' in lines
+    assert 'snappydata_retries_total{kind="failover"} 2' in lines
+    assert 'snappydata_retries_total{kind="a\\"b\\\\c\\n"} 1' in lines
+    start = lines.index('# TYPE snappydata_pool_wait_seconds histogram') + 1
+    assert lines[start:start + 17] == [
+        'snappydata_pool_wait_seconds_bucket{{le="{}"}} {}'.format(bound, count) for bound, count in (
+            ('0.0005', 0), ('0.001', 0), ('0.0025', 0), ('0.005', 1), ('0.01', 1), ('0.025', 1), ('0.05', 1),
+            ('0.1', 1), ('0.25', 2), ('0.5', 2), ('1.0', 2), ('2.5', 2), ('5.0', 2), ('10.0', 2), ('+Inf', 2))
+    ] + ['snappydata_pool_wait_seconds_sum 0.203', 'snappydata_pool_wait_seconds_count 2']
+    assert metrics.snapshot()['counters']['snappydata_retries_total{kind="failover"}'] == 2
+
+
+def test_statements_recorded():
+    with testing.StubServer(rows=250, batch_size=100) as server:
+        connection = snappydata.connect(server.host, server.port)
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT * FROM t')
+            assert len(cursor.fetchall()) == 250
+            cursor.execute('INSERT INTO t VALUES (1)')
+        finally:
+            connection.close()
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    assert counters['snappydata_connections_opened_total'] == 1
+    assert counters['snappydata_queries_total{outcome="ok",type="select"}'] == 1
+    assert counters['snappydata_queries_total{outcome="ok",type="insert"}'] == 1
+    assert counters['snappydata_rows_fetched_total'] == 250
+    assert counters['snappydata_bytes_received_total'] > 0
+    assert snapshot['histograms']['snappydata_connect_seconds']['count'] == 1
+    assert snapshot['histograms']['snappydata_query_seconds{type="select"}']['count'] == 1
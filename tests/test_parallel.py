@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=10000, batch_size=500) as server:
+        yield server
+
+
+@pytest.fixture
+def connection(server):
+    connection = snappydata.connect(server.host, server.port)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4, 8])
+def test_parallel_scan_returns_all_rows(connection, workers):
+    cursor = connection.cursor()
+    cursor.execute_parallel('SELECT * FROM t', 't', workers=workers)
+    assert len(cursor.fetchall()) == 10000
+    assert cursor.rowcount == 10000
+
+
+def test_parallel_scan_fetchmany_and_iterate(connection):
+    cursor = connection.cursor()
+    cursor.execute_parallel('SELECT * FROM t', 't', workers=4)
+    rows = cursor.fetchmany(1234)
+    rows += list(cursor)
+    assert len(rows) == 10000
+    assert cursor.fetchone() is None
+
+
+def test_parallel_scan_of_some_buckets(connection, server):
+    buckets = [0, 1, 2, 50]
+    cursor = connection.cursor()
+    cursor.execute_parallel('SELECT * FROM t', 't', workers=2, buckets=buckets)
+    expected = sum(1 for i in range(server.handler.rows) if i % server.handler.buckets in buckets)
+    assert len(cursor.fetchall()) == expected
+
+
+def test_parallel_scan_closed_early(connection):
+    cursor = connection.cursor()
+    cursor.execute_parallel('SELECT * FROM t', 't', workers=4)
+    assert len(cursor.fetchmany(10)) == 10
+    cursor.close()
+    # The connection is still usable once the workers are stopped
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor.fetchall()) == 10000
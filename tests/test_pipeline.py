@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import pytest
+from thrift.Thrift import TApplicationException
+
+from SDTCLIService import ttypes
+from pysnappydata import snappydata
+from pysnappydata import testing
+
+
+@pytest.fixture(scope='module')
+def server():
+    with testing.StubServer(rows=50, batch_size=20) as server:
+        yield server
+
+
+@pytest.fixture
+def connection(server):
+    connection = snappydata.connect(server.host, server.port)
+    yield connection
+    connection.close()
+
+
+def test_replies_read_out_of_order(connection):
+    with connection._lock:
+        client = connection.client
+        client.drain()
+        args = connection.connectionid, None, None, connection.token
+        query = client.submit('execute', args[0], 'VALUES 1', *args[1:])
+        update = client.submit('execute', args[0], 'INSERT INTO t VALUES (1)', *args[1:])
+        missing = client.submit('getNextResultSet', 0, 0, connection.token)
+        assert client.in_flight == 3
+        assert client.wait(update).updateCount == 1
+        # The reply to the query was read on the way and set aside
+        assert client.in_flight == 1
+        result = client.wait(query)
+        assert len(result.resultSet.rows) == 20
+        client.ignore(missing)
+        client.drain()
+        assert client.in_flight == 0
+        with pytest.raises(TApplicationException):
+            client.wait(query)
+        client.call('closeResultSet', result.resultSet.cursorId, connection.token)
+
+
+def test_errors_are_raised_by_wait(connection):
+    with connection._lock:
+        client = connection.client
+        seqid = client.submit('scrollCursor', 12345, 0, False, False, 10, connection.token)
+        following = client.submit('execute', connection.connectionid, 'VALUES 1', None, None, connection.token)
+        with pytest.raises(ttypes.SnappyException):
+            client.wait(seqid)
+        client.call('closeResultSet', client.wait(following).resultSet.cursorId, connection.token)
+
+
+@pytest.mark.parametrize('depth', [1, 2, 4])
+def test_executemany_pipeline_depth(server, depth):
+    connection = snappydata.connect(server.host, server.port, pipeline_depth=depth)
+    try:
+        batches = server.handler.requests['executePreparedBatch']
+        cursor = connection.cursor(executemany_chunksize=3)
+        cursor.executemany('INSERT INTO t VALUES (%s)', [(i,) for i in range(20)])
+        assert cursor.rowcount == 20
+        assert server.handler.requests['executePreparedBatch'] - batches == 7
+    finally:
+        connection.close()
+
+
+def test_close_without_waiting(connection, server):
+    closes = server.handler.requests['closeResultSet']
+    cursors = []
+    for _ in range(5):
+        cursor = connection.cursor()
+        cursor.execute('SELECT * FROM t')
+        cursor.fetchone()
+        cursors.append(cursor)
+    for cursor in cursors:
+        cursor.close()
+    # At most pipeline_depth - 1 replies are left unread
+    assert connection.client.in_flight <= 3
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM t')
+    assert len(cursor.fetchall()) == 50
+    assert server.handler.requests['closeResultSet'] - closes == 5